@@ -1,37 +1,133 @@
+import asyncio
 import os
 import random
-import string
-from flask import Flask, request, jsonify, render_template
+from quart import Quart, request, jsonify, render_template, g, make_response
 import redis
-import json
+import redis.asyncio
 import game_logic
 import time
 import simulation
-
-app = Flask(__name__, static_folder='../client/static', template_folder='../client', static_url_path='/static')
+import schedule_jobs
+import schedule_cache
+import schedule_codec
+import lobby_store
+import lobby_codes
+import lobby_deadlines
+import lobby_events
+import lobby_sweeper
+import metrics
+
+app = Quart(__name__, static_folder='../client/static', template_folder='../client', static_url_path='/static')
 USE_SIMULATION_FOR_ROOM_ASSIGNMENT = True  # Set to False to use existing method
+USE_SCHEDULE_CACHE = True  # Reuse schedules from lobbies with the same shape at game start
+# Where simulation jobs are queued: 'redis' (shared by all server processes) or 'local' (this process only)
+SCHEDULE_JOB_BACKEND = os.environ.get('SCHEDULE_JOB_BACKEND', 'redis')
+SCHEDULE_JOB_WORKERS = int(os.environ.get('SCHEDULE_JOB_WORKERS', 2))
+# Simulation engine used for room assignments: 'planner' (builds a schedule in one
+# pass), or 'python' / 'numpy' (random search with restarts)
+SIMULATION_ENGINE = os.environ.get('SIMULATION_ENGINE', 'planner')
+# Number of processes used to search for a schedule (1 = search in the calling thread)
+SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', 1))
+# Schedules the planner streams are saved this many intervals at a time: the first
+# chunk as soon as it is planned, the rest appended after it (0 = plan in one go)
+SCHEDULE_STREAM_INTERVALS = int(os.environ.get('SCHEDULE_STREAM_INTERVALS', 30))
+# How often abandoned lobby keys are checked for (see lobby_sweeper.py)
+LOBBY_SWEEP_SECONDS = int(os.environ.get('LOBBY_SWEEP_SECONDS', lobby_sweeper.SWEEP_INTERVAL_SECONDS))
+# How long a meeting lasts before missing votes count as skips (the client's meetingDurationMs)
+MEETING_DURATION_SECONDS = int(os.environ.get('MEETING_DURATION_SECONDS', 5 * 60))
+# Redis connections per client in each server process; callers wait for a free one beyond that
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 20))
 
 # Set up Redis connection with SSL parameters
 redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379')
 if redis_url.startswith('redis://'):
     redis_url = redis_url.replace('redis://', 'rediss://', 1)
 
-r = redis.Redis.from_url(
+# Requests run on the event loop and use the asyncio client. Simulation jobs
+# run on worker threads and use the blocking client.
+ar = metrics.InstrumentedAsyncRedis(connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
     redis_url,
+    max_connections=REDIS_MAX_CONNECTIONS,
     ssl_cert_reqs=None
-)
-
-def generate_lobby_code():
-    """Generates a unique 6-character lobby code."""
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+))
+r = metrics.InstrumentedRedis(connection_pool=redis.BlockingConnectionPool.from_url(
+    redis_url,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    ssl_cert_reqs=None
+))
+
+# Lobby fields written by a finished simulation job
+SCHEDULE_FIELDS = [
+    'assignments_per_interval', 'assignment_interval', 'assignment_start_time',
+    'current_assignment_index', 'room_assignments'
+]
+# Lobby fields read by recalculate_room_assignments
+SCHEDULE_INPUT_FIELDS = [
+    'player_statuses', 'roles', 'rooms', 'duration', 'assignments_per_interval', 'assignment_interval',
+    'assignment_start_time', 'schedule_version'
+]
+# Lobby fields used by the non-simulation room reassignment
+ROOM_REASSIGNMENT_FIELDS = [
+    'last_check_time', 'meeting_active', 'last_reassignment_time', 'player_names', 'player_statuses',
+    'reassignments', 'rooms', 'next_room_assignments', 'next_room_switch_times'
+]
+# Lobby fields written when a schedule is requested
+SCHEDULE_REQUEST_FIELDS = ['schedule_version', 'schedule_pending']
+# Lobby fields written by check_win_conditions
+GAME_OVER_FIELDS = ['game_over', 'winner', 'game_over_message', 'activity_log']
+# Lobby fields that determine which room each player is in
+ROOM_FIELDS = [
+    'assignment_interval', 'assignment_start_time', 'assignments_per_interval', 'current_assignment_index',
+    'room_assignments', 'schedule_pending', 'schedule_version', 'duration'
+]
+# Lobby fields read and written when a meeting closes and its votes are processed
+MEETING_FIELDS = [
+    'meeting_active', 'meeting_start_time', 'votes', 'has_voted', 'pending_voters', 'meeting_voters',
+    'vote_leader', 'vote_leader_votes', 'vote_leader_tied', 'player_statuses', 'roles', 'game_start_time',
+    'time_in_meetings_ms'
+] + ROOM_FIELDS
+MEETING_RESULT_FIELDS = [
+    'meeting_active', 'meeting_start_time', 'time_in_meetings_ms', 'votes', 'has_voted', 'pending_voters',
+    'player_statuses'
+] + GAME_OVER_FIELDS + SCHEDULE_REQUEST_FIELDS
+# Lobby fields holding the running vote tally (see lobby_store.VOTE_SCRIPT)
+VOTE_TALLY_FIELDS = [
+    'pending_voters', 'meeting_voters', 'vote_counts', 'vote_leader', 'vote_leader_votes', 'vote_leader_tied'
+]
+# Lobby fields clients see through /lobby and the event stream
+CLIENT_LOBBY_FIELDS = [
+    'player_names', 'ready_statuses', 'game_started', 'duration', 'game_start_time', 'meeting_active',
+    'meeting_start_time', 'has_voted', 'player_statuses', 'game_over', 'winner', 'game_over_message'
+]
 
 @app.route('/')
-def index():
-    return render_template('index.html')
+async def index():
+    return await render_template('index.html')
+
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    # Prometheus scrape target; only served when METRICS_ENABLED=1
+    if not metrics.ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.before_request
+async def start_request_timer():
+    if metrics.ENABLED:
+        g.request_start = time.perf_counter()
+
+@app.after_request
+async def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # Label by route pattern rather than path so lobby codes don't each get a series
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.record_request(route, request.method, response.status_code, time.perf_counter() - start)
+    return response
 
 @app.route('/create', methods=['POST'])
-def create_lobby():
-    data = request.get_json()
+async def create_lobby():
+    data = await request.get_json()
     rooms = data.get('rooms')
     players = int(data.get('players'))
     player_name = data.get('player_name')
@@ -45,8 +141,18 @@ def create_lobby():
     if not (3 <= len(rooms) <= 10):
         return jsonify({'error': 'The number of rooms must be between 3 and 9.'}), 400
 
-    # Generate a lobby code
-    lobby_code = generate_lobby_code()
+    # Reject games too short to ever schedule enough kill opportunities
+    settings = simulation.SERVER_SETTINGS
+    try:
+        simulation.check_feasibility(
+            players, len(rooms), int(duration) * 60, settings['assignment_interval'], settings['min_time_per_kill'],
+            simulation.get_difficulty_ratio(settings['difficulty_level']), SIMULATION_ENGINE
+        )
+    except simulation.InfeasibleScheduleError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Claim a free lobby code
+    lobby_code = await lobby_codes.allocate(ar)
     # Create the lobby data
     lobby_data = {
         'rooms': rooms,
@@ -59,7 +165,7 @@ def create_lobby():
         'activity_log': []
     }
     # Store the lobby data in Redis
-    r.set(f"lobby:{lobby_code}", json.dumps(lobby_data))
+    await lobby_store.save_lobby(ar, lobby_code, lobby_data)
     print(f"Lobby {lobby_code} created with rooms {rooms}, {players} players, and duration {duration} minutes. First player: {player_name}")
     return jsonify({
         'message': 'Lobby created',
@@ -71,24 +177,19 @@ def create_lobby():
 
 
 @app.route('/join', methods=['POST'])
-def join_lobby():
-    data = request.get_json()
+async def join_lobby():
+    data = await request.get_json()
     print('Join request data:', data)
     lobby_code = data.get('code')
     player_name = data.get('player_name')
-    lobby_key = f"lobby:{lobby_code}"
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        # Decode the bytes to string
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-        if lobby_data.get('game_started'):
+    # Check the lobby and add the player (not ready yet) in one atomic step
+    status, lobby_data = await lobby_store.join_lobby(ar, lobby_code, player_name)
+    if status != 'not_found':
+        if status == 'started':
             return jsonify({'error': 'Game has already started'}), 400
-        if len(lobby_data['player_names']) < lobby_data['max_players']:
-            lobby_data['player_names'].append(player_name)
-            lobby_data['ready_statuses'].append(False)  # Initialize as not ready
-            # Update the lobby data in Redis
-            r.set(lobby_key, json.dumps(lobby_data))
+        if status == 'ok':
             print(f"Player {player_name} joined lobby {lobby_code}.")
+            await publish_lobby_changes(lobby_code, lobby_data, ['player_names', 'ready_statuses'])
             return jsonify({
                 'message': f'Joined lobby {lobby_code}',
                 'lobby_code': lobby_code,
@@ -102,22 +203,23 @@ def join_lobby():
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/ready/<lobby_code>', methods=['POST'])
-def set_ready_status(lobby_code):
-    data = request.get_json()
+async def set_ready_status(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')
-    lobby_key = f"lobby:{lobby_code}"
-    lobby_data_json = r.get(lobby_key)
-
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-        # Update the ready status for the player
-        for idx, name in enumerate(lobby_data['player_names']):
-            if name == player_name:
-                lobby_data['ready_statuses'][idx] = True
-                print(f"Player {player_name} is ready in lobby {lobby_code}.")
-                break
-        # Check if all players are ready
-        if all(lobby_data['ready_statuses']) and len(lobby_data['player_names']) == lobby_data['max_players']:
+
+    # Update the ready status for the player. Only the request that makes the
+    # full lobby ready gets 'start', so the game is started exactly once.
+    status = await lobby_store.set_ready(ar, lobby_code, player_name)
+    if status != 'not_found':
+        print(f"Player {player_name} is ready in lobby {lobby_code}.")
+        if status != 'start':
+            lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['ready_statuses'])
+            if lobby_data:
+                await publish_lobby_changes(lobby_code, lobby_data, ['ready_statuses'])
+        else:
+            lobby_data = await lobby_store.load_lobby(
+                ar, lobby_code, ['player_names', 'max_players', 'rooms', 'duration', 'schedule_version']
+            )
             # Ensure minimum players have joined
             if len(lobby_data['player_names']) < 4:
                 return jsonify({'error': 'At least 4 players are required to start the game.'}), 400
@@ -128,11 +230,13 @@ def set_ready_status(lobby_code):
             lobby_data['player_statuses'] = {player: 'alive' for player in lobby_data['player_names']}
             # Assign rooms using game_logic
             rooms = lobby_data['rooms']
+            schedule_version = None
             if USE_SIMULATION_FOR_ROOM_ASSIGNMENT:
-                # Use simulation to assign rooms
-                print("Assigning rooms using simulation...")
-                # Now that player_statuses is initialized, this should work
-                recalculate_room_assignments(lobby_data)
+                # Use simulation to assign rooms in the background. Until the
+                # schedule lands, players get a random room to start in.
+                print("Queueing room assignment simulation...")
+                lobby_data['room_assignments'] = game_logic.assign_rooms(lobby_data['player_names'], rooms)
+                schedule_version = request_room_schedule(lobby_data)
             else:
                 # Use existing method
                 room_assignments = game_logic.assign_rooms(lobby_data['player_names'], rooms)
@@ -162,55 +266,118 @@ def set_ready_status(lobby_code):
             lobby_data['reassignments'] = {player: 0 for player in lobby_data['player_names']}
             # Initialize last kill time
             lobby_data['last_kill_time'] = 0
+            # The game clock stops during meetings
+            lobby_data['time_in_meetings_ms'] = 0
             print(f"All players are ready. Game starting in lobby {lobby_code}. Roles and rooms assigned.")
-        # Update the lobby data in Redis
-        r.set(lobby_key, json.dumps(lobby_data))
+            # Update the lobby data in Redis
+            await lobby_store.save_lobby(ar, lobby_code, lobby_data, [
+                'roles', 'player_statuses', 'room_assignments', 'game_start_time', 'last_room_assignment_time',
+                'reassignment_times', 'next_reassignment_index', 'meeting_active', 'meeting_start_time',
+                'game_started', 'reassignments', 'last_kill_time', 'time_in_meetings_ms'
+            ] + SCHEDULE_REQUEST_FIELDS)
+            await lobby_deadlines.schedule(ar, lobby_code, 'game', get_game_end_time(lobby_data))
+            lobby_data['ready_statuses'] = [True] * len(lobby_data['player_names'])
+            await publish_lobby_changes(lobby_code, lobby_data, CLIENT_LOBBY_FIELDS)
+            if schedule_version is not None:
+                await queue_room_schedule(lobby_code, schedule_version)
         return jsonify({'message': 'Player ready status updated'})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/lobby/<lobby_code>', methods=['GET'])
-def get_lobby(lobby_code):
-    lobby_key = f"lobby:{lobby_code}"
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        # Decode the bytes to string
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-        return jsonify({
-            'player_names': lobby_data['player_names'],
-            'ready_statuses': lobby_data['ready_statuses'],
-            'game_started': lobby_data['game_started'],
-            'duration': lobby_data.get('duration'),
-            'game_start_time': lobby_data.get('game_start_time'),
-            'meeting_active': lobby_data.get('meeting_active', False),
-            'meeting_start_time': lobby_data.get('meeting_start_time'),
-            'has_voted': lobby_data.get('has_voted', {}),
-            'player_statuses': lobby_data.get('player_statuses', {}),
-            'game_over': lobby_data.get('game_over', False),
-            'winner': lobby_data.get('winner'),
-            'game_over_message': lobby_data.get('game_over_message')  # Include the message
-        })
+async def get_lobby(lobby_code):
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, CLIENT_LOBBY_FIELDS)
+    if lobby_data:
+        return jsonify(client_lobby_view(lobby_data))
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
+def client_lobby_view(lobby_data):
+    return {
+        'player_names': lobby_data['player_names'],
+        'ready_statuses': lobby_data['ready_statuses'],
+        'game_started': lobby_data['game_started'],
+        'duration': lobby_data.get('duration'),
+        'game_start_time': lobby_data.get('game_start_time'),
+        'meeting_active': lobby_data.get('meeting_active', False),
+        'meeting_start_time': lobby_data.get('meeting_start_time'),
+        'has_voted': lobby_data.get('has_voted', {}),
+        'player_statuses': lobby_data.get('player_statuses', {}),
+        'game_over': lobby_data.get('game_over', False),
+        'winner': lobby_data.get('winner'),
+        'game_over_message': lobby_data.get('game_over_message')  # Include the message
+    }
+
+@app.route('/events/<lobby_code>', methods=['GET'])
+async def lobby_event_stream(lobby_code):
+    player_name = request.args.get('player_name')
+    if not await lobby_store.lobby_exists(ar, lobby_code):
+        return jsonify({'error': 'Lobby not found'}), 404
+    response = await make_response(
+        generate_lobby_events(lobby_code, player_name),
+        {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.timeout = None  # The stream stays open for the whole game
+    return response
+
+async def generate_lobby_events(lobby_code, player_name):
+    # Listen before taking the snapshot so no change falls in between
+    events = event_hub.listen(lobby_code)
+    try:
+        await event_hub.wait_subscribed()
+        snapshot = await load_snapshot(lobby_code)
+        if snapshot is None:
+            return
+        yield snapshot
+
+        while True:
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=lobby_events.HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield lobby_events.format_heartbeat()
+                continue
+            if event['event'] == 'deleted':
+                return
+            if event['event'] == 'resync':
+                # Events may have been missed while Redis was unreachable; start over from a snapshot
+                snapshot = await load_snapshot(lobby_code)
+                if snapshot is None:
+                    return
+                yield snapshot
+                continue
+            yield lobby_events.format_event(event['event'], event['data'])
+    finally:
+        event_hub.unlisten(lobby_code, events)
+
+async def load_snapshot(lobby_code):
+    # The full lobby state as a 'snapshot' event, or None if the lobby is gone
+    lobby_data = await lobby_store.load_lobby(
+        ar, lobby_code, CLIENT_LOBBY_FIELDS + ['activity_log', 'schedule_version', 'schedule_pending']
+    )
+    if not lobby_data:
+        return None
+    # A player (re)connecting counts as activity
+    await lobby_store.touch_lobby(ar, lobby_code, lobby_store.lobby_ttl(lobby_data))
+    snapshot = client_lobby_view(lobby_data)
+    snapshot['activity_log'] = lobby_data['activity_log']
+    snapshot['timeline_version'] = get_timeline_version(lobby_data)
+    return lobby_events.format_event('snapshot', snapshot)
+
 @app.route('/check_lobby', methods=['POST'])
-def check_lobby():
-    data = request.get_json()
+async def check_lobby():
+    data = await request.get_json()
     lobby_code = data.get('code')
-    lobby_key = f"lobby:{lobby_code}"
-    if r.exists(lobby_key):
+    if await lobby_store.lobby_exists(ar, lobby_code):
         return jsonify({'message': 'Lobby found'})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/get_role/<lobby_code>', methods=['POST'])
-def get_role(lobby_code):
-    data = request.get_json()
+async def get_role(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')
-    lobby_key = f"lobby:{lobby_code}"
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['roles'])
+    if lobby_data:
         if lobby_data.get('roles'):
             role = lobby_data['roles'].get(player_name)
             if role:
@@ -223,48 +390,14 @@ def get_role(lobby_code):
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/get_room/<lobby_code>', methods=['POST'])
-def get_room(lobby_code):
-    data = request.get_json()
+async def get_room(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')
-    lobby_key = f"lobby:{lobby_code}"
-
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-
-        # Check if it's time to update room assignments
-        assignment_interval = lobby_data.get('assignment_interval')
-        assignment_start_time = lobby_data.get('assignment_start_time')
-        assignments_per_interval = lobby_data.get('assignments_per_interval')
-        current_assignment_index = lobby_data.get('current_assignment_index', 0)
-        current_time_ms = int(round(time.time() * 1000))
-
-        if assignment_interval and assignment_start_time and assignments_per_interval:
-            print(f"Assignment interval: {assignment_interval}")
-            print(f"Assignment start time: {assignment_start_time}")
-            print(f"Number of assignments per interval: {len(assignments_per_interval)}")
-            print(f"Current assignment index: {current_assignment_index}")
-
-            elapsed_time_ms = current_time_ms - assignment_start_time
-            interval_number = int(elapsed_time_ms / (assignment_interval * 1000))
-
-            print(f"Elapsed time (ms): {elapsed_time_ms}")
-            print(f"Calculated interval number: {interval_number}")
-
-            if interval_number >= len(assignments_per_interval):
-                interval_number = len(assignments_per_interval) - 1  # Stay at last assignment
-
-            if interval_number != current_assignment_index:
-                # Update room assignments
-                lobby_data['current_assignment_index'] = interval_number
-                lobby_data['room_assignments'] = assignments_per_interval[interval_number]
-                # Update lobby data in Redis
-                r.set(lobby_key, json.dumps(lobby_data))
-        else:
-            print("Assignment interval, start time, or assignments per interval not found.")
 
-        # Fetch current room
-        room = lobby_data['room_assignments'].get(player_name)
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, ROOM_FIELDS)
+    if lobby_data:
+        # The room follows from the precomputed schedule and the clock, so nothing is written back
+        room = get_room_assignments(lobby_data).get(player_name)
 
         if room is not None:
             return jsonify({'room': room})
@@ -273,19 +406,30 @@ def get_room(lobby_code):
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
+@app.route('/timeline/<lobby_code>/<player_name>', methods=['GET'])
+async def get_timeline(lobby_code, player_name):
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, ROOM_FIELDS)
+    if lobby_data:
+        timeline = get_room_timeline(lobby_data, player_name)
+        if timeline is not None:
+            return jsonify(timeline)
+        else:
+            return jsonify({'error': 'Player not found in lobby'}), 404
+    else:
+        return jsonify({'error': 'Lobby not found'}), 404
+
 @app.route('/call_meeting/<lobby_code>', methods=['POST'])
-def call_meeting(lobby_code):
-    data = request.get_json()
+async def call_meeting(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')
     body_found = data.get('body_found')
     dead_player = data.get('dead_player')
     room_found = data.get('room_found')
-    lobby_key = f"lobby:{lobby_code}"
-
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
 
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, [
+        'game_started', 'meeting_active', 'player_names', 'player_statuses', 'rooms', 'game_start_time', 'duration'
+    ])
+    if lobby_data:
         if not lobby_data.get('game_started'):
             return jsonify({'error': 'Game has not started yet'}), 400
 
@@ -322,8 +466,21 @@ def call_meeting(lobby_code):
             # No body found; proceed normally
             pass
 
-        # Update the lobby data in Redis
-        r.set(lobby_key, json.dumps(lobby_data))
+        # Everyone still alive gets a vote; the tally is kept up to date as votes come in
+        alive_players = [player for player, status in lobby_data['player_statuses'].items() if status == 'alive']
+        reset_vote_tally(lobby_data, alive_players)
+
+        # Update the lobby data in Redis; only the found player's status is written,
+        # so a kill recorded meanwhile isn't undone
+        await lobby_store.save_lobby(ar, lobby_code, lobby_data, [
+            'meeting_active', 'meeting_start_time', 'votes', 'has_voted', 'activity_log'
+        ] + VOTE_TALLY_FIELDS, items={'player_statuses': {dead_player: 'dead'} if body_found else {}})
+        await lobby_deadlines.schedule(
+            ar, lobby_code, 'meeting', lobby_data['meeting_start_time'] + MEETING_DURATION_SECONDS * 1000
+        )
+        await publish_lobby_changes(lobby_code, lobby_data, [
+            'meeting_active', 'meeting_start_time', 'has_voted', 'player_statuses', 'activity_log'
+        ])
 
         print(f"Player {player_name} called a meeting in lobby {lobby_code}.")
 
@@ -332,172 +489,163 @@ def call_meeting(lobby_code):
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/submit_vote/<lobby_code>', methods=['POST'])
-def submit_vote(lobby_code):
-    data = request.get_json()
+async def submit_vote(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')
     voted_player = data.get('voted_player')
-    lobby_key = f"lobby:{lobby_code}"
-
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
 
-        if not lobby_data.get('meeting_active'):
+    # Record the vote atomically; the vote that completes the meeting closes it
+    status = await lobby_store.record_vote(ar, lobby_code, player_name, voted_player)
+    if status != 'not_found':
+        if status == 'no_meeting':
             return jsonify({'error': 'No meeting in progress'}), 400
 
-        if lobby_data['has_voted'].get(player_name):
+        if status == 'already_voted':
             return jsonify({'error': 'Player has already voted'}), 400
 
         # Check if player is alive
-        if lobby_data['player_statuses'].get(player_name) != 'alive':
+        if status == 'dead':
             return jsonify({'error': 'Dead players cannot vote'}), 400
 
-        # Record the vote
-        lobby_data['votes'][player_name] = voted_player
-        lobby_data['has_voted'][player_name] = True
+        await lobby_events.publish(ar, lobby_code, 'vote', {'player_name': player_name})
 
         # Check if all alive players have voted or skipped
-        alive_players = [player for player, status in lobby_data['player_statuses'].items() if status == 'alive']
-        if all(lobby_data['has_voted'].get(player, False) for player in alive_players):
-            # End the meeting
-            lobby_data['meeting_active'] = False
-            lobby_data['meeting_start_time'] = None
-            # Process votes
-            process_votes(lobby_data)
+        if status == 'closed':
+            await process_closed_meeting(lobby_code)
             print(f"All players have voted or skipped in lobby {lobby_code}.")
 
-        # Update the lobby data in Redis (moved outside the if block)
-        r.set(lobby_key, json.dumps(lobby_data))
-
         return jsonify({'message': 'Vote submitted'})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/skip_vote/<lobby_code>', methods=['POST'])
-def skip_vote(lobby_code):
-    data = request.get_json()
+async def skip_vote(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')
-    lobby_key = f"lobby:{lobby_code}"
-
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
 
-        if not lobby_data.get('meeting_active'):
+    # Record the skip atomically; the vote that completes the meeting closes it
+    status = await lobby_store.record_vote(ar, lobby_code, player_name, 'skip')
+    if status != 'not_found':
+        if status == 'no_meeting':
             return jsonify({'error': 'No meeting in progress'}), 400
 
-        if lobby_data['has_voted'].get(player_name):
+        if status == 'already_voted':
             return jsonify({'error': 'Player has already voted or skipped'}), 400
 
         # Check if player is alive
-        if lobby_data['player_statuses'].get(player_name) != 'alive':
+        if status == 'dead':
             return jsonify({'error': 'Dead players cannot vote'}), 400
 
-        # Record the skip
-        lobby_data['votes'][player_name] = 'skip'
-        lobby_data['has_voted'][player_name] = True
+        await lobby_events.publish(ar, lobby_code, 'vote', {'player_name': player_name})
 
         # Check if all alive players have voted or skipped
-        alive_players = [player for player, status in lobby_data['player_statuses'].items() if status == 'alive']
-        if all(lobby_data['has_voted'].get(player, False) for player in alive_players):
-            # End the meeting
-            lobby_data['meeting_active'] = False
-            lobby_data['meeting_start_time'] = None
-            # Process votes
-            process_votes(lobby_data)
+        if status == 'closed':
+            await process_closed_meeting(lobby_code)
             print(f"All players have voted or skipped in lobby {lobby_code}.")
 
-        # Update the lobby data in Redis (moved outside the if block)
-        r.set(lobby_key, json.dumps(lobby_data))
-
         return jsonify({'message': 'Vote submitted'})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/activity_log/<lobby_code>', methods=['GET'])
-def get_activity_log(lobby_code):
-    lobby_key = f"lobby:{lobby_code}"
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-        activity_log = lobby_data.get('activity_log', [])
+async def get_activity_log(lobby_code):
+    # ?since=<entry id> returns only the entries after that one
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({'error': 'since must be an entry id'}), 400
+    activity_log = await lobby_store.load_activity_log(ar, lobby_code, since)
+    if activity_log is not None:
         return jsonify({'activity_log': activity_log})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/meeting_expired/<lobby_code>', methods=['POST'])
-def meeting_expired(lobby_code):
-    data = request.get_json()
+async def meeting_expired(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')  # Not strictly necessary here
-    lobby_key = f"lobby:{lobby_code}"
-
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
 
-        if not lobby_data.get('meeting_active'):
+    # The server ends meetings on time by itself (see expire_meeting); this is
+    # only for clients that still report the expiry
+    status = await expire_meeting(lobby_code)
+    if status != 'not_found':
+        if status == 'no_meeting':
             return jsonify({'error': 'No meeting in progress'}), 400
 
-        # For all alive players who haven't voted, mark their vote as 'skip'
-        alive_players = [player for player, status in lobby_data['player_statuses'].items() if status == 'alive']
-        for player in alive_players:
-            if not lobby_data['has_voted'].get(player):
-                lobby_data['votes'][player] = 'skip'
-                lobby_data['has_voted'][player] = True
-
-        # End the meeting
-        lobby_data['meeting_active'] = False
-        lobby_data['meeting_start_time'] = None
-
-        # Process votes
-        process_votes(lobby_data)
-        print(f"Meeting timer expired. Votes processed in lobby {lobby_code}.")
-
-        # Update the lobby data in Redis
-        r.set(lobby_key, json.dumps(lobby_data))
-
         return jsonify({'message': 'Meeting expired and votes processed'})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/game_time_expired/<lobby_code>', methods=['POST'])
-def game_time_expired(lobby_code):
-    lobby_key = f"lobby:{lobby_code}"
-    lobby_data_json = r.get(lobby_key)
-
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-
-        if lobby_data.get('game_over'):
+async def game_time_expired(lobby_code):
+    # The server ends games on time by itself (see expire_game); this is only
+    # for clients that still report the expiry
+    status = await expire_game(lobby_code)
+    if status != 'not_found':
+        if status == 'over':
             return jsonify({'message': 'Game already over'})
-
-        # Set game over and impostor wins
-        lobby_data['game_over'] = True
-        lobby_data['winner'] = 'impostor'
-        message = "Game time has run out. Impostor wins!"
-        lobby_data['game_over_message'] = message  # Store the message
-        print(message)
-        append_activity_log(lobby_data, message)
-
-        # Update the lobby data in Redis
-        r.set(lobby_key, json.dumps(lobby_data))
+        if status == 'not_started':
+            return jsonify({'error': 'Game has not started yet'}), 400
+        if status == 'meeting':
+            return jsonify({'error': 'A meeting is in progress'}), 400
 
         return jsonify({'message': 'Game time expired, impostor wins'})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
+async def expire_meeting(lobby_code):
+    # Called when a meeting's time is up. Only the first call closes it.
+    status = await lobby_store.close_meeting(ar, lobby_code)
+    if status == 'closed':
+        # Process votes, counting everyone who didn't vote as a skip
+        try:
+            await process_closed_meeting(lobby_code, skip_missing_votes=True)
+        except Exception as e:
+            raise lobby_deadlines.DeadlineAppliedError(f"Meeting closed but not processed in lobby {lobby_code}") from e
+        print(f"Meeting timer expired. Votes processed in lobby {lobby_code}.")
+    return status
+
+async def expire_game(lobby_code):
+    # Called when the game clock runs out. Only the first call ends the game.
+    # During a meeting the deadline is moved past the meeting's end instead.
+    status = await lobby_store.end_game(
+        ar, lobby_code, lobby_deadlines.DEADLINES_KEY, lobby_deadlines.member(lobby_code, 'game'),
+        MEETING_DURATION_SECONDS * 1000
+    )
+    if status == 'ended':
+        try:
+            await record_game_time_out(lobby_code)
+        except Exception as e:
+            raise lobby_deadlines.DeadlineAppliedError(f"Game ended but result not saved in lobby {lobby_code}") from e
+    return status
+
+async def record_game_time_out(lobby_code):
+    # Write and push the result of a game end_game has just ended
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['game_start_time', 'duration'])
+
+    # Set game over and impostor wins
+    lobby_data['game_over'] = True
+    lobby_data['winner'] = 'impostor'
+    message = "Game time has run out. Impostor wins!"
+    lobby_data['game_over_message'] = message  # Store the message
+    print(message)
+    append_activity_log(lobby_data, message)
+
+    # Update the lobby data in Redis
+    await lobby_store.save_lobby(ar, lobby_code, lobby_data, GAME_OVER_FIELDS)
+    await publish_lobby_changes(lobby_code, lobby_data, GAME_OVER_FIELDS)
+
 @app.route('/leave_lobby/<lobby_code>', methods=['POST'])
-def leave_lobby(lobby_code):
+async def leave_lobby(lobby_code):
     print(f"leave_lobby called with lobby_code: {lobby_code}")
-    data = request.get_json()
+    data = await request.get_json()
     player_name = data.get('player_name')
-    lobby_key = f"lobby:{lobby_code}"
     print(f"Player name received: {player_name}")
 
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, [
+        'player_names', 'ready_statuses', 'player_statuses', 'roles', 'room_assignments'
+    ])
+    if lobby_data:
         if player_name in lobby_data['player_names']:
             idx = lobby_data['player_names'].index(player_name)
             # Remove the player from the player_names and ready_statuses
@@ -516,11 +664,17 @@ def leave_lobby(lobby_code):
             # If the game hasn't started yet, check if lobby is empty
             if not lobby_data['player_names']:
                 # Delete the lobby
-                r.delete(lobby_key)
+                await lobby_store.delete_lobby(ar, lobby_code)
+                await lobby_codes.release(ar, lobby_code)
+                await lobby_events.publish(ar, lobby_code, 'deleted')
                 return jsonify({'message': 'Player left and lobby deleted because it was empty'})
             else:
                 # Update the lobby data in Redis
-                r.set(lobby_key, json.dumps(lobby_data))
+                await lobby_store.save_lobby(ar, lobby_code, lobby_data)
+                await publish_lobby_changes(lobby_code, lobby_data, ['player_names', 'ready_statuses', 'player_statuses'])
+                # Take them off the voter roll if a meeting is on
+                if await lobby_store.withdraw_voter(ar, lobby_code, player_name) == 'closed':
+                    await process_closed_meeting(lobby_code)
                 return jsonify({'message': 'Player left the lobby'})
         else:
             return jsonify({'error': 'Player not found in lobby'}), 404
@@ -528,20 +682,14 @@ def leave_lobby(lobby_code):
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/reset_lobby/<lobby_code>', methods=['POST'])
-def reset_lobby(lobby_code):
+async def reset_lobby(lobby_code):
     print(f"reset_lobby called with lobby_code: {lobby_code}")
-    lobby_data['assignment_start_time'] = None
-    lobby_data['assignment_interval'] = None
-    lobby_data['current_assignment_index'] = 0
-    data = request.get_json()
+    data = await request.get_json()
     player_name = data.get('player_name')
     print(f"Player name received: {player_name}")
 
-    lobby_key = f"lobby:{lobby_code}"
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['player_names', 'schedule_version'])
+    if lobby_data:
         # Reset game-specific data while keeping the player list intact
         lobby_data['ready_statuses'] = [False] * len(lobby_data['player_names'])
         lobby_data['game_started'] = False
@@ -551,46 +699,52 @@ def reset_lobby(lobby_code):
         lobby_data['player_statuses'] = {}
         lobby_data['roles'] = {}
         lobby_data['room_assignments'] = {}
-        lobby_data['activity_log'] = []
         lobby_data['votes'] = {}
         lobby_data['has_voted'] = {}
+        reset_vote_tally(lobby_data, [])
+        lobby_data['game_starting'] = False
         lobby_data['game_over'] = False
         lobby_data['winner'] = None
         lobby_data['game_over_message'] = None
+        # Drop the old schedule so the next game plans from scratch
+        lobby_data['assignments_per_interval'] = None
+        lobby_data['assignment_start_time'] = None
+        lobby_data['assignment_interval'] = None
+        lobby_data['current_assignment_index'] = 0
+        # Any simulation job still running belongs to the old game
+        lobby_data['schedule_version'] = lobby_data.get('schedule_version', 0) + 1
+        lobby_data['schedule_pending'] = False
 
         # Update the lobby data in Redis
-        r.set(lobby_key, json.dumps(lobby_data))
+        await lobby_store.save_lobby(ar, lobby_code, lobby_data)
+        await lobby_store.clear_fields(ar, lobby_code, ['activity_log'])
+        await publish_lobby_changes(lobby_code, lobby_data, CLIENT_LOBBY_FIELDS)
         return jsonify({'message': 'Lobby has been reset'})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/get_rooms/<lobby_code>', methods=['GET'])
-def get_rooms(lobby_code):
-    lobby_key = f"lobby:{lobby_code}"
-    lobby_data_json = r.get(lobby_key)
+async def get_rooms(lobby_code):
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['rooms'])
 
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
+    if lobby_data:
         rooms = lobby_data.get('rooms', [])
         return jsonify({'rooms': rooms})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/get_next_room/<lobby_code>', methods=['POST'])
-def get_next_room(lobby_code):
-    data = request.get_json()
+async def get_next_room(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')
-    lobby_key = f"lobby:{lobby_code}"
-
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
 
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, ROOM_REASSIGNMENT_FIELDS)
+    if lobby_data:
         # Update room assignments if needed
         rooms_reassigned = update_room_assignments_if_needed(lobby_data)
         if rooms_reassigned:
             # Update lobby data in Redis
-            r.set(lobby_key, json.dumps(lobby_data))
+            await lobby_store.save_lobby(ar, lobby_code, lobby_data, ROOM_REASSIGNMENT_FIELDS)
 
         # Check if the player has a next room assigned
         next_room = lobby_data.get('next_room_assignments', {}).get(player_name)
@@ -610,46 +764,38 @@ def get_next_room(lobby_code):
         return jsonify({'error': 'Lobby not found'}), 404
 
 @app.route('/mark_dead/<lobby_code>', methods=['POST'])
-def mark_yourself_dead(lobby_code):
-    data = request.get_json()
+async def mark_yourself_dead(lobby_code):
+    data = await request.get_json()
     player_name = data.get('player_name')
-    lobby_key = f"lobby:{lobby_code}"
-
-    lobby_data_json = r.get(lobby_key)
-    if lobby_data_json:
-        lobby_data = json.loads(lobby_data_json.decode('utf-8'))
 
+    # Check and record the kill atomically, so concurrent kills are all kept
+    current_time = int(round(time.time() * 1000))
+    status, player_statuses = await lobby_store.mark_dead(ar, lobby_code, player_name, current_time, 30 * 1000)
+    if status != 'not_found':
         # Check if game has started
-        if not lobby_data.get('game_started'):
+        if status == 'not_started':
             return jsonify({'error': 'Game has not started yet'}), 400
 
         # Check if player is already dead
-        if lobby_data['player_statuses'].get(player_name) != 'alive':
+        if status == 'dead':
             return jsonify({'error': 'You are already dead'}), 400
 
         # Check if player is the impostor
-        if lobby_data['roles'].get(player_name) == 'impostor':
+        if status == 'impostor':
             return jsonify({'error': 'Impostor cannot mark themselves as dead'}), 400
 
-        # Get the timestamp of the last kill
-        last_kill_time = lobby_data.get('last_kill_time', 0)
-        current_time = int(round(time.time() * 1000))
-
         # Check if 30 seconds have passed since the last kill
-        if current_time - last_kill_time < 30 * 1000:
+        if status == 'cooldown':
             return jsonify({'error': 'Impostor has recently killed someone and cannot kill you. Quickly call a meeting to expose the impostor!'}), 400
 
-        # Mark the player as dead
-        lobby_data['player_statuses'][player_name] = 'dead'
-        # Update the last kill time
+        lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['roles', 'game_start_time'] + ROOM_FIELDS)
+        lobby_data['player_statuses'] = player_statuses
         lobby_data['last_kill_time'] = current_time
 
         # Update room assignments if using simulation
+        schedule_version = None
         if USE_SIMULATION_FOR_ROOM_ASSIGNMENT:
-            recalculate_room_assignments(lobby_data)
-
-        # Update lobby data in Redis
-        r.set(lobby_key, json.dumps(lobby_data))
+            schedule_version = request_room_schedule(lobby_data)
 
         # # Optionally, add to activity log
         # message = f"{player_name} has been killed."
@@ -658,54 +804,93 @@ def mark_yourself_dead(lobby_code):
         # Check win conditions
         check_win_conditions(lobby_data)
 
-        # Update lobby data again after win condition check
-        r.set(lobby_key, json.dumps(lobby_data))
+        # Update lobby data in Redis (the kill itself is already stored)
+        fields = GAME_OVER_FIELDS + SCHEDULE_REQUEST_FIELDS
+        if schedule_version is not None:
+            fields.append('room_assignments')  # Pinned by request_room_schedule
+        await lobby_store.save_lobby(ar, lobby_code, lobby_data, fields)
+        await publish_lobby_changes(lobby_code, lobby_data, ['player_statuses'] + GAME_OVER_FIELDS)
+        if schedule_version is not None:
+            await queue_room_schedule(lobby_code, schedule_version)
+
+        # Dead players don't vote; if everyone else already has, this closes the meeting
+        if await lobby_store.withdraw_voter(ar, lobby_code, player_name) == 'closed':
+            await process_closed_meeting(lobby_code)
 
         return jsonify({'message': 'You are now marked as dead'})
     else:
         return jsonify({'error': 'Lobby not found'}), 404
 
+async def process_closed_meeting(lobby_code, skip_missing_votes=False):
+    # Called by whoever closed the meeting: a request, or the deadline scheduler
+    # when its time ran out, so this must not depend on the request context
+    lobby_data = await lobby_store.load_lobby(ar, lobby_code, MEETING_FIELDS)
+
+    if skip_missing_votes:
+        # Mark the vote of every player still to vote as 'skip'
+        for player in lobby_data['pending_voters']:
+            lobby_data['votes'][player] = 'skip'
+            lobby_data['has_voted'][player] = True
+        lobby_data['pending_voters'] = []
+
+    alive_before = [player for player, status in lobby_data['player_statuses'].items() if status == 'alive']
+    schedule_version = process_votes(lobby_data)
+    # Only the eliminated player's status is written, so a kill recorded meanwhile isn't undone
+    eliminated = {
+        player: lobby_data['player_statuses'][player] for player in alive_before
+        if lobby_data['player_statuses'][player] != 'alive'
+    }
+
+    # The game clock was stopped for the meeting, so the game now ends that much later
+    current_time = int(round(time.time() * 1000))
+    if lobby_data.get('meeting_start_time'):
+        lobby_data['time_in_meetings_ms'] = (
+            lobby_data.get('time_in_meetings_ms', 0) + current_time - lobby_data['meeting_start_time']
+        )
+    lobby_data['meeting_start_time'] = None
+
+    # Update the lobby data in Redis
+    fields = [field for field in MEETING_RESULT_FIELDS if field != 'player_statuses']
+    if schedule_version is not None:
+        fields.append('room_assignments')  # Pinned by request_room_schedule
+    await lobby_store.save_lobby(ar, lobby_code, lobby_data, fields, items={'player_statuses': eliminated})
+    if not lobby_data.get('game_over'):
+        await lobby_deadlines.schedule(ar, lobby_code, 'game', get_game_end_time(lobby_data))
+    await publish_lobby_changes(lobby_code, lobby_data, MEETING_RESULT_FIELDS)
+    if schedule_version is not None:
+        await queue_room_schedule(lobby_code, schedule_version)
+
 def process_votes(lobby_data):
+    # Returns the new schedule version if the result needs a new room schedule, else None
     # Initialize a flag to check if a player was eliminated
     player_eliminated = False
+    schedule_version = None
 
-    votes = lobby_data['votes']
     player_statuses = lobby_data['player_statuses']
     # game_start_time = lobby_data.get('game_start_time')
     # game_duration_minutes = lobby_data.get('duration')
     # game_duration_ms = game_duration_minutes * 60 * 1000  # Convert minutes to milliseconds
 
-    # Only consider votes from alive players
-    alive_players = [player for player, status in player_statuses.items() if status == 'alive']
-    alive_votes = {player: vote for player, vote in votes.items() if player_statuses[player] == 'alive'}
-    
-    # Count votes for each player
-    vote_counts = {}
-    for vote in alive_votes.values():
-        if vote != 'skip':
-            vote_counts[vote] = vote_counts.get(vote, 0) + 1
+    # The votes were tallied as they came in (only alive players' votes count)
+    max_votes = lobby_data.get('vote_leader_votes', 0)
 
     # Initialize message
     message = ""
 
-    if not vote_counts:
+    if not max_votes:
         # No votes cast
         message = "No votes were cast."
         print(message)
     else:
-        # Find the player(s) with the highest votes
-        max_votes = max(vote_counts.values())
-        players_with_max_votes = [player for player, count in vote_counts.items() if count == max_votes]
-        
         # Check for tie
-        if len(players_with_max_votes) > 1:
+        if lobby_data.get('vote_leader_tied'):
             message = "Tie detected. No one is eliminated."
             print(message)
         else:
             # Check if majority is achieved
-            if max_votes >= (len(alive_players) // 2) + 1:
+            if max_votes >= (lobby_data['meeting_voters'] // 2) + 1:
                 # Eliminate the player
-                eliminated_player = players_with_max_votes[0]
+                eliminated_player = lobby_data['vote_leader']
                 player_statuses[eliminated_player] = 'dead'
                 message = f"Player {eliminated_player} has been eliminated."
                 print(message)
@@ -719,10 +904,20 @@ def process_votes(lobby_data):
 
     # If a player was eliminated and using simulation, recalculate room assignments
     if player_eliminated and USE_SIMULATION_FOR_ROOM_ASSIGNMENT:
-        recalculate_room_assignments(lobby_data)
+        schedule_version = request_room_schedule(lobby_data)
 
     # Check for win conditions after processing votes
     check_win_conditions(lobby_data)
+    return schedule_version
+
+def reset_vote_tally(lobby_data, voters):
+    # Start an empty tally with these players still to vote
+    lobby_data['pending_voters'] = list(voters)
+    lobby_data['meeting_voters'] = len(voters)
+    lobby_data['vote_counts'] = {}
+    lobby_data['vote_leader'] = None
+    lobby_data['vote_leader_votes'] = 0
+    lobby_data['vote_leader_tied'] = False
 
 def update_room_assignments_if_needed(lobby_data):
     # Only proceed if not using simulation for room assignments
@@ -782,6 +977,11 @@ def update_room_assignments_if_needed(lobby_data):
 
     return False  # No reassignment needed
 
+def get_game_end_time(lobby_data):
+    # When the game clock runs out, in epoch milliseconds
+    return (lobby_data['game_start_time'] + lobby_data['duration'] * 60 * 1000
+            + lobby_data.get('time_in_meetings_ms', 0))
+
 def format_time_ms(milliseconds):
     seconds = (milliseconds // 1000) % 60
     minutes = (milliseconds // (1000 * 60)) % 60
@@ -807,8 +1007,15 @@ def append_activity_log(lobby_data, message):
         'time': remaining_time_str,
         'message': message
     }
-    lobby_data['activity_log'].append(activity_entry)
+    lobby_data.setdefault('activity_log', []).append(activity_entry)
 
+async def publish_lobby_changes(lobby_code, lobby_data, fields):
+    # Push the client-visible fields that were just saved, plus any new log lines
+    changes = {field: lobby_data[field] for field in fields if field in CLIENT_LOBBY_FIELDS and field in lobby_data}
+    if changes:
+        await lobby_events.publish(ar, lobby_code, 'lobby', changes)
+    if 'activity_log' in fields and lobby_data.get('activity_log'):
+        await lobby_events.publish(ar, lobby_code, 'log', lobby_data['activity_log'])
 
 def check_win_conditions(lobby_data):
     player_statuses = lobby_data['player_statuses']
@@ -839,8 +1046,89 @@ def check_win_conditions(lobby_data):
     lobby_data['game_over'] = False
     lobby_data['game_over_message'] = None
 
+def get_current_interval(lobby_data):
+    # Work out which interval of the precomputed schedule the game is in
+    assignment_interval = lobby_data.get('assignment_interval')
+    assignment_start_time = lobby_data.get('assignment_start_time')
+    assignments_per_interval = lobby_data.get('assignments_per_interval')  # Packed, see schedule_codec
+    if not (assignment_interval and assignment_start_time and assignments_per_interval):
+        return None
+
+    current_time_ms = int(round(time.time() * 1000))
+    elapsed_time_ms = current_time_ms - assignment_start_time
+    interval_number = int(elapsed_time_ms / (assignment_interval * 1000))
+    total_intervals = schedule_codec.num_intervals(assignments_per_interval)
+    if interval_number >= total_intervals:
+        interval_number = total_intervals - 1  # Stay at last assignment
+    return max(0, interval_number)
+
+def get_room_assignments(lobby_data):
+    # The assignments get_room would serve right now, without writing anything back
+    interval_number = get_current_interval(lobby_data)
+    if not lobby_data.get('schedule_pending') and interval_number is not None:
+        if interval_number > lobby_data.get('current_assignment_index', 0):
+            return schedule_codec.assignment_at(lobby_data['assignments_per_interval'], interval_number)
+    return lobby_data.get('room_assignments') or {}
+
+def get_timeline_version(lobby_data):
+    # Changes whenever the rooms served to players change: every schedule
+    # request bumps schedule_version (pending, rooms frozen) and the job
+    # landing clears schedule_pending (new schedule)
+    return lobby_data.get('schedule_version', 0) * 2 + (0 if lobby_data.get('schedule_pending') else 1)
+
+def get_room_timeline(lobby_data, player_name):
+    """
+    Build a player's room timeline from the current schedule.
+    Args:
+        lobby_data (dict): Lobby data with the ROOM_FIELDS.
+        player_name (str): The player.
+    Returns:
+        dict or None: The timeline, or None if the player has no room.
+            runs is a run-length encoded list of [room, number of intervals]
+            starting at first_interval; the last room holds until the game ends,
+            unless complete is False: the rest of the schedule is still being
+            planned and the timeline should be fetched again when the runs end.
+    """
+    room_assignments = get_room_assignments(lobby_data)
+    if player_name not in room_assignments:
+        return None
+    timeline = {
+        'version': get_timeline_version(lobby_data),
+        'server_time': int(round(time.time() * 1000)),
+        'assignment_start_time': None,
+        'assignment_interval_ms': None,
+        'first_interval': 0,
+        'runs': [[room_assignments[player_name], 1]],
+        'complete': True
+    }
+    interval_number = get_current_interval(lobby_data)
+    if lobby_data.get('schedule_pending') or interval_number is None:
+        return timeline  # Rooms are frozen until a schedule lands
+
+    # Intervals up to current_assignment_index keep the room being served now
+    first_interval = max(interval_number, lobby_data.get('current_assignment_index', 0))
+    runs = [[room_assignments[player_name], 1]]
+    packed = lobby_data['assignments_per_interval']
+    for room, count in schedule_codec.player_runs(packed, player_name, first_interval + 1):
+        if room == runs[-1][0]:
+            runs[-1][1] += count
+        else:
+            runs.append([room, count])
+    total_intervals = lobby_data.get('duration', 0) * 60 // lobby_data['assignment_interval']
+    timeline.update({
+        'assignment_start_time': lobby_data['assignment_start_time'],
+        'assignment_interval_ms': lobby_data['assignment_interval'] * 1000,
+        'first_interval': first_interval,
+        'runs': runs,
+        'complete': schedule_codec.num_intervals(packed) >= total_intervals
+    })
+    return timeline
+
 def recalculate_room_assignments(lobby_data):
+    # Returns the stream for the rest of the schedule if only its first chunk was
+    # saved in lobby_data (see extend_schedule), otherwise None
     print("Recalculating room assignments using simulation...")
+    recalculation_start = time.perf_counter()
 
     # Get alive players
     alive_players = [player for player, status in lobby_data['player_statuses'].items() if status == 'alive']
@@ -854,61 +1142,124 @@ def recalculate_room_assignments(lobby_data):
     # Simulation parameters
     num_rooms = len(lobby_data['rooms'])
     simulation_time = lobby_data['duration'] * 60  # Convert minutes to seconds
-    assignment_interval = 10  # Room assignments change every 10 seconds
-    min_time_in_room_minutes = 2  # Players must stay in the same room for at least 2 minutes
-    min_time_in_room_seconds = min_time_in_room_minutes * 60
+    settings = simulation.SERVER_SETTINGS
+    assignment_interval = settings['assignment_interval']
+    min_time_in_room_minutes = settings['min_time_in_room_minutes']
 
     # Set other simulation parameters
-    min_time_per_kill = 30  # Kill opportunity must persist for at least 30 seconds
-    require_same_room = True
-    min_seconds_until_discovery = 240
-    max_seconds_until_discovery = 1000
-    difficulty_level = 'medium'  # Or adjust based on user settings
-    difficulty_ratio = simulation.get_difficulty_ratio(difficulty_level)
-
-    # Run the simulation
-    result = simulation.run_simulation(
-        players=players,
-        num_rooms=num_rooms,
-        simulation_time=simulation_time,
-        assignment_interval=assignment_interval,
-        min_time_in_room_minutes=min_time_in_room_minutes,
-        difficulty_ratio=difficulty_ratio,
-        min_time_per_kill=min_time_per_kill,
-        require_same_room=require_same_room,
-        min_seconds_until_discovery=min_seconds_until_discovery,
-        max_seconds_until_discovery=max_seconds_until_discovery,
-        num_initial_assignments=10,
-        max_attempts_per_assignment=10
-    )
+    min_time_per_kill = settings['min_time_per_kill']
+    require_same_room = settings['require_same_room']
+    min_seconds_until_discovery = settings['min_seconds_until_discovery']
+    max_seconds_until_discovery = settings['max_seconds_until_discovery']
+    difficulty_ratio = simulation.get_difficulty_ratio(settings['difficulty_level'])
+
+    room_names = lobby_data['rooms']
+
+    # If a schedule is already running, keep everything up to and including the
+    # current interval and only re-simulate the intervals that are still to come
+    scheduled_prefix = []
+    initial_room_assignment = None
+    current_interval = get_current_interval(lobby_data)
+    if current_interval is not None:
+        scheduled_prefix = schedule_codec.decode(lobby_data['assignments_per_interval'], current_interval + 1)
+        # The stored schedule may still be being extended, so count from the game length
+        total_intervals = int(lobby_data['duration'] * 60 // assignment_interval)
+        remaining_intervals = total_intervals - len(scheduled_prefix)
+        if remaining_intervals <= 0:
+            print("No intervals left to re-simulate. Keeping existing room assignments.")
+            return
+        simulation_time = remaining_intervals * assignment_interval
+
+        # Resume from where the alive players currently are
+        current_assignment = scheduled_prefix[-1]
+        initial_room_assignment = {}
+        for player in alive_players:
+            if current_assignment.get(player) in room_names:
+                initial_room_assignment[player] = room_names.index(current_assignment[player])
+            else:
+                initial_room_assignment[player] = random.randrange(num_rooms)
+
+    # A fresh schedule only depends on the lobby shape, so try the cache first.
+    # schedule_pool.py can fill it ahead of time for common shapes.
+    result = None
+    cache_key = None
+    if USE_SCHEDULE_CACHE and initial_room_assignment is None:
+        cache_key = schedule_cache.server_shape_key(len(players), num_rooms, simulation_time, SIMULATION_ENGINE)
+        result = schedule_cache.lookup(r, cache_key, players, num_rooms)
+        if result is not None:
+            print("Using a cached schedule for this lobby shape.")
+    source = 'cache'
+
+    stream = None
+    if result is None and cache_key is None and SIMULATION_ENGINE == 'planner' and SCHEDULE_STREAM_INTERVALS > 0:
+        # Nothing will be cached, so plan lazily: save the first chunk now and
+        # let the job append the rest once players have their rooms
+        source = 'stream'
+        stream = simulation.stream_simulation(
+            players=players,
+            num_rooms=num_rooms,
+            simulation_time=simulation_time,
+            assignment_interval=assignment_interval,
+            min_time_in_room_minutes=min_time_in_room_minutes,
+            difficulty_ratio=difficulty_ratio,
+            min_time_per_kill=min_time_per_kill,
+            require_same_room=require_same_room,
+            min_seconds_until_discovery=min_seconds_until_discovery,
+            max_seconds_until_discovery=max_seconds_until_discovery,
+            initial_room_assignment=initial_room_assignment
+        )
+        rows = simulation.next_intervals(stream, SCHEDULE_STREAM_INTERVALS)
+        if rows:
+            result = {'assignments_per_interval': [row['assignment'] for row in rows]}
+    elif result is None:
+        # Run the simulation
+        source = 'search'
+        simulation_start = time.perf_counter()
+        try:
+            result = simulation.run_simulation(
+                players=players,
+                num_rooms=num_rooms,
+                simulation_time=simulation_time,
+                assignment_interval=assignment_interval,
+                min_time_in_room_minutes=min_time_in_room_minutes,
+                difficulty_ratio=difficulty_ratio,
+                min_time_per_kill=min_time_per_kill,
+                require_same_room=require_same_room,
+                min_seconds_until_discovery=min_seconds_until_discovery,
+                max_seconds_until_discovery=max_seconds_until_discovery,
+                num_initial_assignments=10,
+                max_attempts_per_assignment=10,
+                initial_room_assignment=initial_room_assignment,
+                engine=SIMULATION_ENGINE,
+                workers=SIMULATION_WORKERS
+            )
+        except simulation.InfeasibleScheduleError as e:
+            # E.g. too little of the game left for the kill opportunities the alive players need
+            print(f"No schedule can satisfy these settings: {e}")
+        metrics.record_simulation(SIMULATION_ENGINE, result, time.perf_counter() - simulation_start)
+        if result is not None and cache_key is not None:
+            schedule_cache.store(r, cache_key, players, result)
 
     if result is not None:
         print("Simulation successful. Updating room assignments.")
 
         # Map room numbers to room names
-        room_names = lobby_data['rooms']
-        assignments_per_interval_with_names = []
+        assignments_per_interval_with_names = list(scheduled_prefix)
         for assignment in result['assignments_per_interval']:
             assignments_with_names = {player: room_names[room_number] for player, room_number in assignment.items()}
             assignments_per_interval_with_names.append(assignments_with_names)
 
-        # Store the assignments per interval in lobby_data
-        lobby_data['assignments_per_interval'] = assignments_per_interval_with_names
+        # Store the assignments per interval in lobby_data, packed for Redis
+        lobby_data['assignments_per_interval'] = schedule_codec.encode(assignments_per_interval_with_names, room_names)
 
         # Store assignment_interval in lobby_data
         lobby_data['assignment_interval'] = assignment_interval
 
-        # Initialize or update assignment_start_time and current_assignment_index
-        assignment_start_time = lobby_data.get('assignment_start_time')
-        if assignment_start_time:
-            # Calculate current interval based on existing assignment_start_time
-            current_time_ms = int(round(time.time() * 1000))
-            elapsed_time_ms = current_time_ms - assignment_start_time
-            interval_number = int(elapsed_time_ms / (assignment_interval * 1000))
-            if interval_number >= len(assignments_per_interval_with_names):
-                interval_number = len(assignments_per_interval_with_names) - 1
-            lobby_data['current_assignment_index'] = interval_number
-            lobby_data['room_assignments'] = assignments_per_interval_with_names[interval_number]
+        if current_interval is not None:
+            # The replanned suffix starts right after the current interval, so
+            # advance straight onto it with the alive players only
+            lobby_data['current_assignment_index'] = current_interval
+            lobby_data['room_assignments'] = assignments_per_interval_with_names[current_interval + 1]
         else:
             # Initialize assignment_start_time
             lobby_data['assignment_start_time'] = int(round(time.time() * 1000))
@@ -916,6 +1267,87 @@ def recalculate_room_assignments(lobby_data):
             lobby_data['room_assignments'] = assignments_per_interval_with_names[0]
     else:
         print("Simulation failed to find a suitable assignment. Keeping existing room assignments.")
+    metrics.record_schedule(
+        source, 'found' if result is not None else 'failed', time.perf_counter() - recalculation_start
+    )
+    return stream if result is not None else None
+
+def extend_schedule(lobby_code, version, lobby_data, stream):
+    # Plan the rest of a streamed schedule a chunk at a time and append each chunk to
+    # the stored one. Stops as soon as a newer schedule is requested (a death or a
+    # vote), so a plan that is about to be replaced isn't worked out to the end.
+    room_names = lobby_data['rooms']
+    packed = lobby_data['assignments_per_interval']
+    while True:
+        rows = simulation.next_intervals(stream, SCHEDULE_STREAM_INTERVALS)
+        if not rows:
+            break
+        chunk = schedule_codec.encode_rows(packed, [
+            {player: room_names[room_number] for player, room_number in row['assignment'].items()}
+            for row in rows
+        ])
+        if lobby_store.append_schedule(r, lobby_code, version, chunk) != 'ok':
+            print(f"Schedule {version} for lobby {lobby_code} was superseded while being extended. Stopping.")
+            return
+    print(f"Schedule {version} for lobby {lobby_code} fully planned.")
+
+def request_room_schedule(lobby_data):
+    # Mark the schedule as pending. Returns the new schedule version; pass it to
+    # queue_room_schedule once the lobby has been written back to Redis, along
+    # with room_assignments. Needs the ROOM_FIELDS.
+    # Rooms are served from room_assignments until the job lands, so pin it to
+    # the interval being played now rather than whichever row it last held
+    lobby_data['room_assignments'] = get_room_assignments(lobby_data)
+    lobby_data['schedule_version'] = lobby_data.get('schedule_version', 0) + 1
+    lobby_data['schedule_pending'] = True
+    return lobby_data['schedule_version']
+
+async def queue_room_schedule(lobby_code, version):
+    # Queue the simulation job for a schedule version saved by request_room_schedule
+    await schedule_queue.enqueue(lobby_code, version)
+    # Rooms are frozen until the job lands; clients refetch their timeline
+    await lobby_events.publish(ar, lobby_code, 'timeline', {
+        'version': get_timeline_version({'schedule_version': version, 'schedule_pending': True})
+    })
+
+def run_schedule_job(lobby_code, version):
+    lobby_data = lobby_store.load_lobby(r, lobby_code, SCHEDULE_INPUT_FIELDS)
+    if not lobby_data:
+        return
+    if lobby_data.get('schedule_version') != version:
+        print(f"Schedule job {version} for lobby {lobby_code} was superseded. Skipping.")
+        return
+
+    stream = recalculate_room_assignments(lobby_data)
+
+    # Only write the schedule back if nothing requested a newer one meanwhile; the
+    # check and the write are one transaction, so a request can't slip in between
+    lobby_data['schedule_pending'] = False
+    fields = [field for field in SCHEDULE_FIELDS if field in lobby_data] + ['schedule_pending']
+    if not lobby_store.save_lobby_if(r, lobby_code, lobby_data, fields, 'schedule_version', version):
+        print(f"Schedule job {version} for lobby {lobby_code} finished after a newer request. Discarding.")
+        return
+    lobby_events.publish(r, lobby_code, 'timeline', {'version': get_timeline_version(lobby_data)})
+    print(f"Schedule {version} ready for lobby {lobby_code}.")
+    if stream is not None:
+        extend_schedule(lobby_code, version, lobby_data, stream)
+
+schedule_queue = schedule_jobs.ScheduleJobQueue(
+    r, ar, run_schedule_job, backend=SCHEDULE_JOB_BACKEND, num_workers=SCHEDULE_JOB_WORKERS
+)
+schedule_queue.start()
+
+lobby_sweeper.LobbySweeper(r, LOBBY_SWEEP_SECONDS).start()
+lobby_codes.LobbyCodePool(r).start()
+
+event_hub = lobby_events.LobbyEventHub(ar)
+
+# Ends meetings and games when their time is up, so clients don't have to report it
+deadline_scheduler = lobby_deadlines.DeadlineScheduler(ar, {'meeting': expire_meeting, 'game': expire_game})
+
+@app.before_serving
+async def start_deadline_scheduler():
+    deadline_scheduler.start()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,230 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+import simulation
+
+# Benchmark for the room schedule simulation. Each configuration is a lobby
+# shape (players, rooms, game length, difficulty, minimum time in a room);
+# the rest of the settings match what the server uses. Every configuration
+# is run with a fixed set of seeds so results can be compared between runs:
+#   python benchmark.py --output benchmark_baseline.json
+#   python benchmark.py --compare benchmark_baseline.json
+#
+# By default one setting is varied at a time around the server's default
+# lobby; --full runs every combination instead (slow).
+
+# The default lobby: 6 players, 4 rooms, 10 minutes, medium, 2 minutes per room
+BASE_CONFIG = {'players': 6, 'rooms': 4, 'duration': 10, 'difficulty': 'medium', 'min_time_in_room': 2}
+SWEEP = {
+    'players': [4, 6, 10, 15, 25, 50],
+    'rooms': [3, 4, 6, 8, 10],
+    'duration': [5, 10, 20, 30],
+    'difficulty': ['easy', 'medium', 'hard'],
+    'min_time_in_room': [1, 2, 4]
+}
+# Settings the server uses for every lobby
+ASSIGNMENT_INTERVAL = 10
+MIN_TIME_PER_KILL = 30
+MIN_SECONDS_UNTIL_DISCOVERY = 240
+MAX_SECONDS_UNTIL_DISCOVERY = 1000
+MAX_ATTEMPTS = 100  # num_initial_assignments * max_attempts_per_assignment, as on the server
+
+def sweep_configs(full=False):
+    """
+    List the configurations to benchmark.
+    Args:
+        full (bool): Every combination of the sweep values instead of one setting at a time.
+    Returns:
+        list: Config dicts with the same keys as BASE_CONFIG.
+    """
+    if full:
+        return [dict(zip(SWEEP.keys(), values)) for values in itertools.product(*SWEEP.values())]
+    configs = []
+    for field, values in SWEEP.items():
+        for value in values:
+            config = dict(BASE_CONFIG, **{field: value})
+            if config not in configs:
+                configs.append(config)
+    return configs
+
+def config_name(config):
+    return (f"p{config['players']}-r{config['rooms']}-d{config['duration']}-"
+            f"{config['difficulty']}-m{config['min_time_in_room']}")
+
+def run_once(config, seed, engine):
+    """
+    Run one seeded simulation for a configuration.
+    Returns:
+        dict or None: The simulation result, or None if no schedule was found.
+    Raises:
+        InfeasibleScheduleError: If the settings are rejected before any attempt.
+    """
+    # Roles come from the seed too, so a configuration always gets the same lobby
+    rng = random.Random(seed)
+    roles = ['impostor'] + ['crew'] * (config['players'] - 1)
+    rng.shuffle(roles)
+    players = [simulation.Player(name=f"Player{idx + 1}", role=role) for idx, role in enumerate(roles)]
+    # The simulation prints when it gives up; keep the benchmark table readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        return simulation.run_simulation(
+            players=players,
+            num_rooms=config['rooms'],
+            simulation_time=config['duration'] * 60,
+            assignment_interval=ASSIGNMENT_INTERVAL,
+            min_time_in_room_minutes=config['min_time_in_room'],
+            difficulty_ratio=simulation.get_difficulty_ratio(config['difficulty']),
+            min_time_per_kill=MIN_TIME_PER_KILL,
+            require_same_room=True,
+            min_seconds_until_discovery=MIN_SECONDS_UNTIL_DISCOVERY,
+            max_seconds_until_discovery=MAX_SECONDS_UNTIL_DISCOVERY,
+            num_initial_assignments=10,
+            max_attempts_per_assignment=10,
+            engine=engine,
+            seed=seed
+        )
+
+def benchmark_config(config, runs, seed, engine):
+    """
+    Benchmark one configuration.
+    Wall times come from untraced runs; peak memory is measured on one extra
+    traced run, since tracemalloc slows the simulation down a lot.
+    A configuration the simulation rejects up front makes no attempts, so it
+    is marked infeasible rather than counted as a failed search.
+    Returns:
+        dict: Timing, attempts, success rate, peak memory and whether the
+            configuration was rejected as infeasible.
+    """
+    times = []
+    attempts = []
+    successes = 0
+    infeasible = False
+    for run_index in range(runs):
+        start = time.perf_counter()
+        try:
+            result = run_once(config, seed + run_index, engine)
+        except simulation.InfeasibleScheduleError:
+            infeasible = True
+            result = None
+        times.append(time.perf_counter() - start)
+        if result is not None:
+            successes += 1
+            attempts.append(result['attempts'])
+        elif not infeasible:
+            # A failed search used every attempt; the planner only ever makes one
+            attempts.append(1 if engine == 'planner' else MAX_ATTEMPTS)
+
+    tracemalloc.start()
+    try:
+        run_once(config, seed, engine)
+    except simulation.InfeasibleScheduleError:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'name': config_name(config),
+        'config': config,
+        'runs': runs,
+        'median_seconds': round(statistics.median(times), 4),
+        'max_seconds': round(max(times), 4),
+        'mean_attempts': round(statistics.mean(attempts), 2) if attempts else 0,
+        'success_rate': round(successes / runs, 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'infeasible': infeasible
+    }
+
+def compare(results, baseline, time_tolerance, min_slowdown, success_tolerance, memory_tolerance):
+    """
+    Compare results against a baseline file's results.
+    Infeasible configurations are rejected without running, so their timings
+    are not compared; a configuration that becomes infeasible is a regression.
+    Returns:
+        list: One message per regression, empty if there are none.
+    """
+    baseline_by_name = {entry['name']: entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        before = baseline_by_name.get(entry['name'])
+        if before is None:
+            continue
+        if entry.get('infeasible') and not before.get('infeasible'):
+            regressions.append(f"{entry['name']}: rejected as infeasible (baseline ran it)")
+        if entry.get('infeasible') or before.get('infeasible'):
+            continue
+        # Tiny configurations are noisy, so a slowdown must also be large in absolute terms
+        slowdown = entry['median_seconds'] - before['median_seconds']
+        if entry['median_seconds'] > before['median_seconds'] * (1 + time_tolerance) and slowdown > min_slowdown:
+            regressions.append(f"{entry['name']}: median {entry['median_seconds']}s "
+                               f"(baseline {before['median_seconds']}s)")
+        if entry['peak_memory_kb'] > before['peak_memory_kb'] * (1 + memory_tolerance):
+            regressions.append(f"{entry['name']}: peak memory {entry['peak_memory_kb']} KB "
+                               f"(baseline {before['peak_memory_kb']} KB)")
+        if entry['success_rate'] < before['success_rate'] - success_tolerance:
+            regressions.append(f"{entry['name']}: success rate {entry['success_rate']} "
+                               f"(baseline {before['success_rate']})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the room schedule simulation across lobby shapes.')
+    parser.add_argument('--runs', type=int, default=5, help='Seeded runs per configuration')
+    parser.add_argument('--seed', type=int, default=1000, help='First seed; run i uses seed + i')
+    parser.add_argument('--engine', default='python', choices=['python', 'numpy', 'planner'])
+    parser.add_argument('--full', action='store_true', help='Run every combination of the sweep values')
+    parser.add_argument('--only', help='Only run configurations whose name contains this text')
+    parser.add_argument('--output', help='Write the results as JSON to this file (e.g. a new baseline)')
+    parser.add_argument('--compare', help='Baseline JSON file to check for regressions')
+    parser.add_argument('--time-tolerance', type=float, default=0.5,
+                        help='Allowed slowdown of the median time before it counts as a regression')
+    parser.add_argument('--min-slowdown', type=float, default=0.05,
+                        help='Seconds a median must also grow by before it counts as a regression')
+    parser.add_argument('--success-tolerance', type=float, default=0.2,
+                        help='Allowed drop in success rate before it counts as a regression')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                        help='Allowed growth of peak memory before it counts as a regression')
+    args = parser.parse_args()
+
+    configs = sweep_configs(args.full)
+    if args.only:
+        configs = [config for config in configs if args.only in config_name(config)]
+
+    results = []
+    print(f"{'config':<28} {'median s':>9} {'max s':>8} {'attempts':>9} {'success':>8} {'peak KB':>9}")
+    for config in configs:
+        entry = benchmark_config(config, args.runs, args.seed, args.engine)
+        results.append(entry)
+        print(f"{entry['name']:<28} {entry['median_seconds']:>9} {entry['max_seconds']:>8} "
+              f"{entry['mean_attempts']:>9} {entry['success_rate']:>8} {entry['peak_memory_kb']:>9}"
+              f"{'  infeasible' if entry['infeasible'] else ''}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'engine': args.engine,
+                'runs': args.runs,
+                'seed': args.seed,
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.time_tolerance, args.min_slowdown, args.success_tolerance,
+                             args.memory_tolerance)
+        for message in regressions:
+            print(f"Regression: {message}")
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against the baseline.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import json
+import time
+
+# Load test for a running server: how many lobbies can one server process
+# keep going at once? Each step starts that many lobbies side by side. Every
+# player holds an event stream open while the lobby fills up, readies, calls a
+# meeting and votes. A step passes if nothing failed, every player saw the
+# meeting start and end on their stream, and the 95th percentile request
+# latency stayed under the limit.
+#
+# Needs nothing beyond the standard library, so the same script can be run
+# against the old Flask server and the ASGI one:
+#   python load_test.py --url http://localhost:5000 --steps 5 10 20 40 80
+
+STREAM_TIMEOUT = 10  # Seconds a lobby waits for its players' event streams to connect
+
+class LoadTestClient:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.latencies = []  # Seconds per request
+        self.errors = 0
+
+    async def request(self, method, path, body=None):
+        """
+        Send one HTTP request on a fresh connection.
+        Returns:
+            tuple: (status code, decoded JSON body or None).
+        """
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            payload = json.dumps(body).encode('utf-8') if body is not None else b''
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode('utf-8') + payload
+            )
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        except (OSError, asyncio.IncompleteReadError) as e:
+            print(f"Request {method} {path} failed: {e}")
+            self.errors += 1
+            return None, None
+        self.latencies.append(time.perf_counter() - start)
+
+        head, _, content = response.partition(b'\r\n\r\n')
+        status = int(head.split(b' ', 2)[1])
+        if b'transfer-encoding: chunked' in head.lower():
+            content = dechunk(content)
+        if status >= 400:
+            self.errors += 1
+        try:
+            return status, json.loads(content)
+        except ValueError:
+            return status, None
+
+    async def open_stream(self, lobby_code, player_name):
+        """Open an event stream and return (reader, writer)."""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(
+            f"GET /events/{lobby_code}?player_name={player_name} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Accept: text/event-stream\r\n\r\n".encode('utf-8')
+        )
+        await writer.drain()
+        return reader, writer
+
+def dechunk(content):
+    body = b''
+    while content:
+        size_line, _, content = content.partition(b'\r\n')
+        size = int(size_line, 16)
+        if size == 0:
+            break
+        body += content[:size]
+        content = content[size + 2:]
+    return body
+
+async def watch_stream(reader, seen_events, connected):
+    # Record the event names a player receives until the stream is closed.
+    # connected is set once the snapshot arrives, i.e. the stream is listening.
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b'event: '):
+                seen_events.append(line[7:].strip().decode('utf-8'))
+                connected.set()
+    except (OSError, asyncio.CancelledError):
+        return
+    finally:
+        connected.set()  # Don't keep the lobby waiting on a stream that died
+
+async def run_lobby(client, lobby_index, num_players, rooms, duration, hold_seconds):
+    """
+    Play one lobby through to a finished meeting.
+    Returns:
+        bool: Whether every player saw the meeting start and end on their stream.
+    """
+    names = [f"load{lobby_index}_{i}" for i in range(num_players)]
+    status, created = await client.request('POST', '/create', {
+        'rooms': rooms, 'players': num_players, 'player_name': names[0], 'duration': duration
+    })
+    if status != 200:
+        return False
+    lobby_code = created['lobby_code']
+    await asyncio.gather(*[
+        client.request('POST', '/join', {'code': lobby_code, 'player_name': name}) for name in names[1:]
+    ])
+
+    streams = []
+    watchers = []
+    seen = []
+    connections = []
+    for name in names:
+        try:
+            reader, writer = await client.open_stream(lobby_code, name)
+        except OSError as e:
+            print(f"Could not open event stream for {name}: {e}")
+            client.errors += 1
+            continue
+        seen_events = []
+        connected = asyncio.Event()
+        streams.append(writer)
+        seen.append(seen_events)
+        connections.append(connected)
+        watchers.append(asyncio.ensure_future(watch_stream(reader, seen_events, connected)))
+
+    try:
+        # Like the browser client, play on once every stream has had its snapshot
+        try:
+            await asyncio.wait_for(asyncio.gather(*[connected.wait() for connected in connections]), STREAM_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Event streams of lobby {lobby_code} took over {STREAM_TIMEOUT}s to connect")
+            client.errors += 1
+        await asyncio.gather(*[
+            client.request('POST', f'/ready/{lobby_code}', {'player_name': name}) for name in names
+        ])
+        await client.request('POST', f'/call_meeting/{lobby_code}', {'player_name': names[0]})
+        await asyncio.gather(*[
+            client.request('POST', f'/skip_vote/{lobby_code}', {'player_name': name}) for name in names
+        ])
+        # Keep the streams open for a while, like players walking between rooms
+        await asyncio.sleep(hold_seconds)
+    finally:
+        for writer in streams:
+            writer.close()
+        for watcher in watchers:
+            watcher.cancel()
+
+    # The meeting start and end both arrive as 'lobby' events after the snapshot
+    return len(seen) == num_players and all(events.count('lobby') >= 2 for events in seen)
+
+async def run_step(host, port, num_lobbies, num_players, rooms, duration, hold_seconds):
+    client = LoadTestClient(host, port)
+    start = time.perf_counter()
+    delivered = await asyncio.gather(*[
+        run_lobby(client, idx, num_players, rooms, duration, hold_seconds) for idx in range(num_lobbies)
+    ])
+    elapsed = time.perf_counter() - start
+    latencies = sorted(client.latencies)
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+    return {
+        'lobbies': num_lobbies,
+        'requests': len(latencies),
+        'errors': client.errors,
+        'delivered': sum(delivered),
+        'p50_ms': round(p50 * 1000, 1),
+        'p95_ms': round(p95 * 1000, 1),
+        'seconds': round(elapsed, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Find how many concurrent lobbies one server process sustains.')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--steps', type=int, nargs='+', default=[5, 10, 20, 40, 80, 160])
+    parser.add_argument('--players', type=int, default=6, help='Players per lobby')
+    parser.add_argument('--hold', type=float, default=5, help='Seconds each lobby keeps its streams open')
+    parser.add_argument('--max-p95-ms', type=float, default=500, help='Latency limit for a passing step')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    host, _, port = args.url.split('://', 1)[-1].partition(':')
+    port = int(port or 80)
+    rooms = ['Kitchen', 'Library', 'Hall', 'Study']
+
+    results = []
+    max_lobbies = 0
+    print(f"{'lobbies':>8} {'requests':>9} {'errors':>7} {'delivered':>10} {'p50 ms':>8} {'p95 ms':>8} {'seconds':>8}")
+    for num_lobbies in args.steps:
+        result = asyncio.run(run_step(host, port, num_lobbies, args.players, rooms, 10, args.hold))
+        results.append(result)
+        print(f"{result['lobbies']:>8} {result['requests']:>9} {result['errors']:>7} "
+              f"{result['delivered']:>5}/{num_lobbies:<4} {result['p50_ms']:>8} {result['p95_ms']:>8} {result['seconds']:>8}")
+        passed = result['errors'] == 0 and result['delivered'] == num_lobbies and result['p95_ms'] <= args.max_p95_ms
+        if not passed:
+            break
+        max_lobbies = num_lobbies
+
+    print(f"Concurrent lobbies sustained by this process: {max_lobbies}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'players_per_lobby': args.players, 'max_lobbies': max_lobbies,
+                       'steps': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import random
+import string
+import threading
+import time
+
+import lobby_store
+
+# Lobby codes are handed out from a pool of free codes kept in a Redis set.
+# SPOP takes a random member, so the pool needs no shuffling of its own.
+# Claiming a code is HSETNX on its lobby hash (the SET NX of a hash), so a
+# code that is live, however it got there, is never handed out twice: the
+# claim script just pops the next one. Codes come back to the pool when
+# their lobby is deleted or its leftovers are swept; codes of lobbies that
+# simply expired are free again anyway and turn up in later refills.
+CODE_ALPHABET = string.ascii_lowercase + string.digits
+CODE_LENGTH = 6
+POOL_KEY = 'lobby_codes:free'
+POOL_TARGET = 1000  # Codes kept in the pool
+POOL_REFILL_BELOW = 250  # Refill once the pool is this small
+REFILL_INTERVAL_SECONDS = 30
+MAX_POOL_TRIES = 10  # Live codes skipped per claim before falling back to a random code
+
+def random_code():
+    """A random 6-character lobby code (not checked against live lobbies)."""
+    return ''.join(random.choices(CODE_ALPHABET, k=CODE_LENGTH))
+
+async def allocate(ar):
+    """
+    Claim a free lobby code.
+    The lobby hash is created with game_started = false and the usual expiry,
+    so save the lobby straight after.
+    Args:
+        ar: asyncio Redis client.
+    Returns:
+        str: The claimed code.
+    """
+    code = await lobby_store.claim_pooled_code(ar, POOL_KEY, MAX_POOL_TRIES)
+    if code:
+        return code
+    # The pool is empty (e.g. right after a deploy): claim random codes until one is free
+    while True:
+        code = random_code()
+        if await ar.hsetnx(lobby_store.lobby_key(code), 'game_started', 'false'):
+            await ar.expire(lobby_store.lobby_key(code), lobby_store.LOBBY_TTL_SECONDS)
+            return code
+
+def release(r, lobby_code):
+    """Put a deleted lobby's code back in the pool."""
+    return r.sadd(POOL_KEY, lobby_code)
+
+def refill(r, target=POOL_TARGET):
+    """
+    Top the pool up to target codes, skipping codes with a live lobby.
+    Returns:
+        int: Codes added.
+    """
+    added = 0
+    while True:
+        missing = target - r.scard(POOL_KEY)
+        if missing <= 0:
+            return added
+        candidates = list({random_code() for _ in range(missing)})
+        pipe = r.pipeline(transaction=False)
+        for code in candidates:
+            pipe.exists(lobby_store.lobby_key(code))
+        free = [code for code, live in zip(candidates, pipe.execute()) if not live]
+        if free:
+            added += r.sadd(POOL_KEY, *free)
+
+class LobbyCodePool:
+    """Keeps the free code pool topped up from a background thread."""
+    def __init__(self, redis_client, interval=REFILL_INTERVAL_SECONDS):
+        self.redis_client = redis_client
+        self.interval = interval
+        self.started = False
+
+    def start(self):
+        """Start the refill thread (once per process)."""
+        if self.started:
+            return
+        self.started = True
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            try:
+                if self.redis_client.scard(POOL_KEY) < POOL_REFILL_BELOW:
+                    added = refill(self.redis_client)
+                    print(f"Added {added} lobby codes to the free pool.")
+            except Exception as e:
+                print(f"Lobby code pool refill failed: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import lobby_store
+
+# Meeting and game timers run on the server. Each pending deadline is a member
+# "{code}:{event}" of one sorted set, scored by its time in epoch milliseconds.
+# Every server process polls the set, but popping due members is atomic, so
+# each deadline is handled by exactly one process, once. Scheduling the same
+# event for a lobby again moves its deadline (ZADD overwrites the score), so a
+# lobby never has more than one pending deadline per event. The handlers check
+# the lobby's state before acting, so a deadline that no longer applies (the
+# meeting already closed, the lobby was reset or deleted) does nothing.
+DEADLINES_KEY = 'lobby_deadlines'
+POLL_SECONDS = 0.25
+BATCH_SIZE = 100  # Deadlines popped per round trip
+RETRY_MS = 2000  # Delay before a deadline whose handler failed is tried again
+
+class DeadlineAppliedError(Exception):
+    """
+    Raised by a handler that failed after it had already changed the lobby
+    (e.g. closed the meeting). Trying again would find nothing left to do, so
+    these deadlines are not retried.
+    """
+
+def schedule(r, lobby_code, event, deadline_ms):
+    """
+    Set (or move) the deadline of a lobby event.
+    Args:
+        r: Redis client.
+        lobby_code (str): The lobby code.
+        event (str): Event name, e.g. 'meeting' or 'game'.
+        deadline_ms (int): When it is due, in epoch milliseconds.
+    """
+    return r.zadd(DEADLINES_KEY, {member(lobby_code, event): deadline_ms})
+
+def cancel(r, lobby_code, event):
+    return r.zrem(DEADLINES_KEY, member(lobby_code, event))
+
+def member(lobby_code, event):
+    # The deadline set member of a lobby event
+    return f"{lobby_code}:{event}"
+
+class DeadlineScheduler:
+    """
+    Pops due deadlines and runs their handlers on the server's event loop.
+    handlers maps an event name to an async function taking the lobby code.
+    """
+    def __init__(self, redis_client, handlers, interval=POLL_SECONDS):
+        self.redis_client = redis_client  # A redis.asyncio client
+        self.handlers = handlers
+        self.interval = interval
+        self.task = None
+
+    def start(self):
+        """Start polling. Must be called from the event loop."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            try:
+                due = await lobby_store.pop_due_deadlines(
+                    self.redis_client, DEADLINES_KEY, int(round(time.time() * 1000)), BATCH_SIZE
+                )
+                for member in due:
+                    await self._fire(member)
+                if len(due) == BATCH_SIZE:
+                    continue  # More may be due already
+            except Exception as e:
+                print(f"Deadline polling failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _fire(self, member):
+        lobby_code, event = member.rsplit(':', 1)
+        handler = self.handlers.get(event)
+        if handler is None:
+            print(f"No handler for {event} deadlines (lobby {lobby_code}).")
+            return
+        try:
+            await handler(lobby_code)
+        except DeadlineAppliedError as e:
+            print(f"Handling the {event} deadline of lobby {lobby_code} failed part way: {e.__cause__ or e}")
+        except Exception as e:
+            print(f"Handling the {event} deadline of lobby {lobby_code} failed: {e}")
+            # Nothing was applied: try again shortly, unless it was rescheduled in the meantime
+            await self.redis_client.zadd(
+                DEADLINES_KEY, {member: int(round(time.time() * 1000)) + RETRY_MS}, nx=True
+            )
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+# Every change to a lobby is published on lobby_events:{code} as
+# {'event': name, 'data': payload}. Event streams turn these into
+# Server-Sent Events for the players in that lobby.
+CHANNEL_PREFIX = 'lobby_events'
+HEARTBEAT_SECONDS = 15  # Comment line sent on idle streams so dead connections get noticed
+
+def channel(lobby_code):
+    return f"{CHANNEL_PREFIX}:{lobby_code}"
+
+def publish(r, lobby_code, event, data=None):
+    """
+    Publish a lobby change to every event stream listening on the lobby.
+    Args:
+        r: Redis client.
+        lobby_code (str): The lobby code.
+        event (str): Event name, e.g. 'lobby', 'vote', 'log' or 'timeline'.
+        data: JSON-serializable payload.
+    Returns:
+        The PUBLISH reply, or a coroutine for an asyncio client.
+    """
+    return r.publish(channel(lobby_code), json.dumps({'event': event, 'data': data}))
+
+def format_event(event, data):
+    """Format one Server-Sent Event as bytes."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+def format_heartbeat():
+    return b": keepalive\n\n"
+
+class LobbyEventHub:
+    """
+    Shares one Redis pub/sub connection between all event streams in this process.
+    A single pattern subscription, read by a task on the server's event loop,
+    receives every lobby's events; each one is handed to the queues of the
+    streams open on that lobby in this process. Events published while the
+    subscription is down are lost, so after a reconnect every open stream gets
+    a {'event': 'resync'} to reload the lobby.
+    """
+    def __init__(self, redis_client):
+        self.redis_client = redis_client  # A redis.asyncio client
+        self.listeners = {}  # lobby_code -> set of asyncio.Queue
+        self.task = None
+        self.subscribed = asyncio.Event()  # Set while the subscription is active
+
+    def listen(self, lobby_code):
+        """
+        Register a stream for a lobby. Must be called from the event loop.
+        Await wait_subscribed before reading the lobby, so no change falls in between.
+        Returns:
+            asyncio.Queue: Receives {'event': name, 'data': payload} dicts.
+        """
+        events = asyncio.Queue()
+        self.listeners.setdefault(lobby_code, set()).add(events)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._listen_loop())
+        return events
+
+    async def wait_subscribed(self):
+        """Wait until Redis has confirmed the subscription."""
+        await self.subscribed.wait()
+
+    def unlisten(self, lobby_code, events):
+        lobby_listeners = self.listeners.get(lobby_code)
+        if lobby_listeners is not None:
+            lobby_listeners.discard(events)
+            if not lobby_listeners:
+                del self.listeners[lobby_code]
+
+    def _dispatch(self, lobby_code, event):
+        for events in self.listeners.get(lobby_code, ()):
+            events.put_nowait(event)
+
+    async def _listen_loop(self):
+        prefix_length = len(CHANNEL_PREFIX) + 1
+        reconnecting = False
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}:*")
+                async for message in pubsub.listen():
+                    if message['type'] == 'psubscribe':
+                        # Redis confirmed the subscription: every event from now on arrives
+                        self.subscribed.set()
+                        if reconnecting:
+                            for lobby_code in list(self.listeners):
+                                self._dispatch(lobby_code, {'event': 'resync', 'data': None})
+                        continue
+                    if message['type'] != 'pmessage':
+                        continue
+                    lobby_code = message['channel'].decode('utf-8')[prefix_length:]
+                    if lobby_code in self.listeners:
+                        self._dispatch(lobby_code, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error reading lobby events from Redis: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self.subscribed.clear()
+                reconnecting = True
+                await pubsub.reset()
@@ -0,0 +1,645 @@
+import inspect
+import json
+import time
+
+import redis
+
+import metrics
+
+# Every function here works with both redis.Redis and redis.asyncio.Redis
+# (save_lobby_if only with the former). With the asyncio client they return a
+# coroutine, so callers await them.
+
+# A lobby is spread over several Redis keys so each endpoint can read and
+# write only the parts it needs:
+#   lobby:{code}                 hash of scalar fields (JSON-encoded values)
+#   lobby:{code}:<list field>    list, one JSON value per item
+#   lobby:{code}:<hash field>    hash of player -> JSON value
+#   lobby:{code}:<set field>     set, one JSON value per member
+#   lobby:{code}:<blob field>    one JSON string
+#   lobby:{code}:<binary field>  raw bytes, e.g. the packed schedule (see schedule_codec)
+LIST_FIELDS = ['player_names', 'ready_statuses']
+HASH_FIELDS = [
+    'player_statuses', 'roles', 'votes', 'has_voted', 'vote_counts', 'room_assignments', 'reassignments',
+    'next_room_assignments', 'next_room_switch_times'
+]
+# Alive players who still have to vote in the current meeting
+SET_FIELDS = ['pending_voters']
+BLOB_FIELDS = []
+BINARY_FIELDS = ['assignments_per_interval']
+# The activity log is append-only: saving it pushes the entries held in
+# lobby_data['activity_log'] onto the end of the stored list. Each entry gets
+# the next id from the activity_log_last_id counter in the lobby hash, and
+# only the newest ACTIVITY_LOG_MAX_ENTRIES are kept, so clients can poll
+# for what is new (load_activity_log(since=...)) at a constant cost.
+APPEND_FIELDS = ['activity_log']
+ACTIVITY_LOG_ID_FIELD = 'activity_log_last_id'
+ACTIVITY_LOG_MAX_ENTRIES = 200
+PART_FIELDS = LIST_FIELDS + HASH_FIELDS + SET_FIELDS + BLOB_FIELDS + BINARY_FIELDS + APPEND_FIELDS
+
+# Every key of a lobby expires together. Each save slides the expiry forward, so
+# a lobby only disappears once nobody has done anything in it for this long;
+# finished games are kept just long enough to read the result or play again.
+# lobby_sweeper.py catches keys that end up without an expiry.
+LOBBY_TTL_SECONDS = 2 * 60 * 60
+FINISHED_LOBBY_TTL_SECONDS = 15 * 60
+
+def lobby_key(lobby_code):
+    return f"lobby:{lobby_code}"
+
+def part_key(lobby_code, field):
+    return f"lobby:{lobby_code}:{field}"
+
+def _decode(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    return json.loads(value)
+
+def _then(reply, parse):
+    # Apply parse to a Redis reply, awaiting it first if the client is asyncio
+    if inspect.isawaitable(reply):
+        async def finish():
+            return parse(await reply)
+        return finish()
+    return parse(reply)
+
+def _payload_bytes(value):
+    # Size of the strings in a Redis reply or command, for the payload metrics
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_payload_bytes(name) + _payload_bytes(item) for name, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_bytes(item) for item in value)
+    return 0
+
+def load_lobby(r, lobby_code, fields=None):
+    """
+    Read a lobby in one round trip.
+    Args:
+        r: Redis client.
+        lobby_code (str): The lobby code.
+        fields (list): Fields to read. None reads everything but the activity log.
+    Returns:
+        dict or None: The requested fields (missing scalars are left out), or None if the lobby does not exist.
+    """
+    key = lobby_key(lobby_code)
+    pipe = r.pipeline(transaction=False)
+    if fields is None:
+        pipe.hgetall(key)
+        parts = LIST_FIELDS + HASH_FIELDS + SET_FIELDS + BLOB_FIELDS + BINARY_FIELDS
+        scalar_fields = None
+    else:
+        pipe.exists(key)
+        parts = [field for field in fields if field in PART_FIELDS]
+        scalar_fields = [field for field in fields if field not in PART_FIELDS]
+        if scalar_fields:
+            pipe.hmget(key, scalar_fields)
+    for field in parts:
+        if field in HASH_FIELDS:
+            pipe.hgetall(part_key(lobby_code, field))
+        elif field in SET_FIELDS:
+            pipe.smembers(part_key(lobby_code, field))
+        elif field in BLOB_FIELDS or field in BINARY_FIELDS:
+            pipe.get(part_key(lobby_code, field))
+        else:
+            pipe.lrange(part_key(lobby_code, field), 0, -1)
+
+    def parse(replies):
+        if metrics.ENABLED:
+            start = time.perf_counter()
+            num_bytes = _payload_bytes(replies)
+        lobby_data = _parse(replies)
+        if metrics.ENABLED:
+            metrics.record_lobby_payload('read', num_bytes, time.perf_counter() - start)
+        return lobby_data
+
+    def _parse(replies):
+        lobby_data = {}
+        if fields is None:
+            scalars = replies.pop(0)
+            if not scalars:
+                return None
+            for field, value in scalars.items():
+                lobby_data[field.decode('utf-8')] = _decode(value)
+        else:
+            if not replies.pop(0):
+                return None
+            if scalar_fields:
+                for field, value in zip(scalar_fields, replies.pop(0)):
+                    if value is not None:
+                        lobby_data[field] = _decode(value)
+
+        for field, value in zip(parts, replies):
+            if field in HASH_FIELDS:
+                lobby_data[field] = {name.decode('utf-8'): _decode(item) for name, item in value.items()}
+            elif field in SET_FIELDS:
+                lobby_data[field] = [_decode(item) for item in value]
+            elif field in BLOB_FIELDS:
+                lobby_data[field] = _decode(value) if value is not None else None
+            elif field in BINARY_FIELDS:
+                lobby_data[field] = value
+            else:
+                lobby_data[field] = [_decode(item) for item in value]
+        return lobby_data
+
+    return _then(pipe.execute(), parse)
+
+def save_lobby(r, lobby_code, lobby_data, fields=None, items=None):
+    """
+    Write lobby fields in one atomic round trip.
+    Args:
+        r: Redis client.
+        lobby_code (str): The lobby code.
+        lobby_data (dict): Lobby data holding the values to write.
+        fields (list): Fields to write if present in lobby_data. None writes every field in lobby_data.
+        items (dict): Hash field -> {name: value} entries to set without rewriting the rest of the
+            hash, e.g. {'player_statuses': {'bob': 'dead'}}, so concurrent changes to other entries stay.
+    """
+    pipe = r.pipeline()
+    log_reply_index = _queue_save(pipe, lobby_code, lobby_data, fields, items)
+    return _then(pipe.execute(), lambda replies: _set_log_ids(lobby_data, log_reply_index, replies))
+
+def save_lobby_if(r, lobby_code, lobby_data, fields, guard_field, expected):
+    """
+    Like save_lobby, but only writes while a scalar field of the lobby still holds the
+    expected value, e.g. so a schedule job doesn't overwrite a newer request.
+    Uses WATCH, so it takes a blocking client (the schedule workers run on threads).
+    Returns:
+        bool: Whether the fields were written.
+    """
+    key = lobby_key(lobby_code)
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                current = pipe.hget(key, guard_field)
+                if current is None or _decode(current) != expected:
+                    return False
+                pipe.multi()
+                log_reply_index = _queue_save(pipe, lobby_code, lobby_data, fields)
+                _set_log_ids(lobby_data, log_reply_index, pipe.execute())
+                return True
+            except redis.WatchError:
+                continue  # The lobby changed in between; check again
+
+def _queue_save(pipe, lobby_code, lobby_data, fields=None, items=None):
+    # Queue the commands of a save on pipe. Returns the index of the activity log
+    # reply, or None if no entries are appended.
+    if fields is None:
+        fields = list(lobby_data.keys())
+    start = time.perf_counter() if metrics.ENABLED else None
+    key = lobby_key(lobby_code)
+    scalars = {}
+    written_parts = []
+    for field, entries in (items or {}).items():
+        if entries:
+            pipe.hset(part_key(lobby_code, field), mapping={name: json.dumps(item) for name, item in entries.items()})
+            written_parts.append(field)
+    log_reply_index = None
+    for field in fields:
+        if field not in lobby_data or field == ACTIVITY_LOG_ID_FIELD:
+            # The log id counter only ever moves in APPEND_LOG_SCRIPT
+            continue
+        value = lobby_data[field]
+        if field in PART_FIELDS:
+            written_parts.append(field)
+        if field in HASH_FIELDS:
+            pipe.delete(part_key(lobby_code, field))
+            if value:
+                pipe.hset(part_key(lobby_code, field), mapping={name: json.dumps(item) for name, item in value.items()})
+        elif field in LIST_FIELDS:
+            pipe.delete(part_key(lobby_code, field))
+            if value:
+                pipe.rpush(part_key(lobby_code, field), *[json.dumps(item) for item in value])
+        elif field in SET_FIELDS:
+            pipe.delete(part_key(lobby_code, field))
+            if value:
+                pipe.sadd(part_key(lobby_code, field), *[json.dumps(item) for item in value])
+        elif field in BLOB_FIELDS or field in BINARY_FIELDS:
+            if value is None:
+                pipe.delete(part_key(lobby_code, field))
+            else:
+                pipe.set(part_key(lobby_code, field), value if field in BINARY_FIELDS else json.dumps(value))
+        elif field in APPEND_FIELDS:
+            if value:
+                # Sent with EVAL: a registered script can't be queued without awaiting it
+                log_reply_index = len(pipe.command_stack)
+                pipe.eval(
+                    APPEND_LOG_SCRIPT, 2, key, part_key(lobby_code, field), ACTIVITY_LOG_MAX_ENTRIES,
+                    *[json.dumps({name: item for name, item in entry.items() if name != 'id'}) for entry in value]
+                )
+        else:
+            scalars[field] = json.dumps(value)
+    if scalars:
+        pipe.hset(key, mapping=scalars)
+    # Only the lobby hash and the parts written here get their expiry moved on; the
+    # event stream and lobby_sweeper keep the other parts in line with the hash.
+    # Ending the game shortens the expiry, so then every key is done at once.
+    _expire_lobby(pipe, lobby_code, lobby_ttl(lobby_data), PART_FIELDS if 'game_over' in scalars else written_parts)
+    if start is not None:
+        metrics.record_lobby_payload(
+            'write', _payload_bytes([args for args, _ in pipe.command_stack]), time.perf_counter() - start
+        )
+    return log_reply_index
+
+def _set_log_ids(lobby_data, log_reply_index, replies):
+    # Give the new entries their ids so they can be published as they are stored
+    if log_reply_index is not None:
+        entries = lobby_data['activity_log']
+        for idx, entry in enumerate(entries):
+            entry['id'] = replies[log_reply_index] - len(entries) + idx + 1
+    return replies
+
+def lobby_ttl(lobby_data):
+    """Expiry for a lobby: short once its game is over."""
+    return FINISHED_LOBBY_TTL_SECONDS if lobby_data.get('game_over') else LOBBY_TTL_SECONDS
+
+def _expire_lobby(pipe, lobby_code, ttl, fields=PART_FIELDS):
+    # Keys that don't exist yet are skipped by Redis
+    pipe.expire(lobby_key(lobby_code), ttl)
+    for field in fields:
+        pipe.expire(part_key(lobby_code, field), ttl)
+
+def touch_lobby(r, lobby_code, ttl=LOBBY_TTL_SECONDS):
+    """Slide the expiry of every key of a lobby forward, e.g. when a player reconnects."""
+    pipe = r.pipeline()
+    _expire_lobby(pipe, lobby_code, ttl)
+    return pipe.execute()
+
+def set_list_item(r, lobby_code, field, index, value):
+    """Overwrite one item of a list field, e.g. a single ready status."""
+    return r.lset(part_key(lobby_code, field), index, json.dumps(value))
+
+def load_activity_log(r, lobby_code, since=0):
+    """
+    Read the activity log entries newer than an entry id.
+    Args:
+        r: Redis client.
+        lobby_code (str): The lobby code.
+        since (int): Id of the last entry the caller has. 0 reads every kept entry.
+    Returns:
+        list or None: The entries, oldest first, or None if the lobby does not exist.
+    """
+    return _then(
+        _run_script(r, READ_LOG_SCRIPT, [lobby_key(lobby_code), part_key(lobby_code, 'activity_log')], [since]),
+        lambda reply: None if reply is None else [_decode(entry) for entry in reply]
+    )
+
+def clear_fields(r, lobby_code, fields):
+    """Remove list, hash, set, blob, binary or log fields entirely."""
+    return r.delete(*[part_key(lobby_code, field) for field in fields])
+
+def lobby_exists(r, lobby_code):
+    return _then(r.exists(lobby_key(lobby_code)), bool)
+
+def delete_lobby(r, lobby_code):
+    return r.delete(lobby_key(lobby_code), *[part_key(lobby_code, field) for field in PART_FIELDS])
+
+# State transitions that several players can trigger at once run as Lua
+# scripts, so each one is a single atomic round trip.
+# KEYS: lobby hash, player_names list, ready_statuses list. ARGV: player name (JSON).
+JOIN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return {'not_found'} end
+if redis.call('HGET', KEYS[1], 'game_started') == 'true' then return {'started'} end
+local max_players = tonumber(redis.call('HGET', KEYS[1], 'max_players'))
+if redis.call('LLEN', KEYS[2]) >= max_players then return {'full'} end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+redis.call('RPUSH', KEYS[3], 'false')
+return {'ok', redis.call('LRANGE', KEYS[2], 0, -1), redis.call('LRANGE', KEYS[3], 0, -1), max_players}
+"""
+
+# KEYS: lobby hash, player_names list, ready_statuses list. ARGV: player name (JSON).
+# Returns 'start' to exactly one caller once everyone is ready.
+READY_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'not_found' end
+local names = redis.call('LRANGE', KEYS[2], 0, -1)
+for idx, name in ipairs(names) do
+    if name == ARGV[1] then
+        redis.call('LSET', KEYS[3], idx - 1, 'true')
+        break
+    end
+end
+local max_players = tonumber(redis.call('HGET', KEYS[1], 'max_players'))
+if #names ~= max_players or redis.call('HGET', KEYS[1], 'game_started') == 'true' then return 'ok' end
+for _, ready in ipairs(redis.call('LRANGE', KEYS[3], 0, -1)) do
+    if ready ~= 'true' then return 'ok' end
+end
+if redis.call('HGET', KEYS[1], 'game_starting') == 'true' then return 'ok' end
+redis.call('HSET', KEYS[1], 'game_starting', 'true')
+return 'start'
+"""
+
+# Votes are tallied as they come in, so neither recording a vote nor closing
+# the meeting looks at more than the voter and their candidate:
+#   pending_voters     set of alive players who haven't voted (filled when the meeting is called)
+#   meeting_voters     how many players may vote, for the majority threshold
+#   vote_counts        candidate -> votes
+#   vote_leader        candidate with the most votes, vote_leader_votes their votes and
+#                      vote_leader_tied whether another candidate has as many
+# Counts only go up while voting, so the leader can be kept up to date from the
+# one count that changed.
+# KEYS: lobby hash, has_voted hash, pending_voters set, votes hash, vote_counts hash.
+# ARGV: voter, vote (JSON, '"skip"' to skip), candidate ('' when skipping), voter (JSON).
+# Returns 'closed' to exactly one caller: the one whose vote completes the meeting.
+VOTE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'not_found' end
+if redis.call('HGET', KEYS[1], 'meeting_active') ~= 'true' then return 'no_meeting' end
+if redis.call('HGET', KEYS[2], ARGV[1]) == 'true' then return 'already_voted' end
+if redis.call('SREM', KEYS[3], ARGV[4]) == 0 then return 'dead' end
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[1], 'true')
+if ARGV[3] ~= '' then
+    local votes = redis.call('HINCRBY', KEYS[5], ARGV[3], 1)
+    local leader_votes = tonumber(redis.call('HGET', KEYS[1], 'vote_leader_votes')) or 0
+    if votes > leader_votes then
+        redis.call('HSET', KEYS[1], 'vote_leader', ARGV[2], 'vote_leader_votes', votes, 'vote_leader_tied', 'false')
+    elseif votes == leader_votes then
+        redis.call('HSET', KEYS[1], 'vote_leader_tied', 'true')
+    end
+end
+if redis.call('SCARD', KEYS[3]) > 0 then return 'ok' end
+redis.call('HSET', KEYS[1], 'meeting_active', 'false')
+return 'closed'
+"""
+
+# KEYS: lobby hash, has_voted hash, pending_voters set, votes hash, vote_counts hash.
+# ARGV: player (name), player (JSON).
+# Takes a player who died or left during a meeting off the voter roll, dropping
+# their vote if they already cast one. The leader is worked out again from
+# vote_counts, the only time a count goes down. Returns 'closed' if they were
+# the last player still to vote.
+WITHDRAW_VOTER_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'meeting_active') ~= 'true' then return 'no_meeting' end
+if redis.call('SREM', KEYS[3], ARGV[2]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'meeting_voters', -1)
+    if redis.call('SCARD', KEYS[3]) > 0 then return 'ok' end
+    redis.call('HSET', KEYS[1], 'meeting_active', 'false')
+    return 'closed'
+end
+local vote = redis.call('HGET', KEYS[4], ARGV[1])
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= 'true' or not vote then return 'ok' end
+redis.call('HDEL', KEYS[4], ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'meeting_voters', -1)
+if vote == '"skip"' then return 'ok' end
+redis.call('HINCRBY', KEYS[5], cjson.decode(vote), -1)
+local leader, leader_votes, tied = 'null', 0, 'false'
+local counts = redis.call('HGETALL', KEYS[5])
+for i = 1, #counts, 2 do
+    local votes = tonumber(counts[i + 1])
+    if votes > leader_votes then
+        leader, leader_votes, tied = cjson.encode(counts[i]), votes, 'false'
+    elseif votes == leader_votes and votes > 0 then
+        tied = 'true'
+    end
+end
+redis.call('HSET', KEYS[1], 'vote_leader', leader, 'vote_leader_votes', leader_votes, 'vote_leader_tied', tied)
+return 'ok'
+"""
+
+# KEYS: lobby hash, player_statuses hash, roles hash. ARGV: player (name), now (epoch ms),
+# ms the impostor has to wait between kills. Returns the status, and on 'ok' the player statuses
+# with this kill in, so concurrent kills each see the other.
+MARK_DEAD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return {'not_found'} end
+if redis.call('HGET', KEYS[1], 'game_started') ~= 'true' then return {'not_started'} end
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= '"alive"' then return {'dead'} end
+if redis.call('HGET', KEYS[3], ARGV[1]) == '"impostor"' then return {'impostor'} end
+local last_kill_time = tonumber(redis.call('HGET', KEYS[1], 'last_kill_time')) or 0
+if tonumber(ARGV[2]) - last_kill_time < tonumber(ARGV[3]) then return {'cooldown'} end
+redis.call('HSET', KEYS[2], ARGV[1], '"dead"')
+redis.call('HSET', KEYS[1], 'last_kill_time', ARGV[2])
+return {'ok', redis.call('HGETALL', KEYS[2])}
+"""
+
+# Closing a meeting leaves meeting_start_time set: whoever processes the
+# meeting uses it to work out how long the game was paused, then clears it.
+# KEYS: lobby hash. Returns 'closed' to exactly one caller while a meeting is active.
+CLOSE_MEETING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'not_found' end
+if redis.call('HGET', KEYS[1], 'meeting_active') ~= 'true' then return 'no_meeting' end
+redis.call('HSET', KEYS[1], 'meeting_active', 'false')
+return 'closed'
+"""
+
+# KEYS: lobby hash, deadline set. ARGV: the game's deadline member, meeting length in ms.
+# Returns 'ended' to exactly one caller once the game clock has run out.
+# The game clock stops during meetings, so it can't run out while one is active: the game
+# deadline moves to the latest the meeting can end plus the game time it left. Closing the
+# meeting can only happen after this, so its exact reschedule always wins.
+END_GAME_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'not_found' end
+if redis.call('HGET', KEYS[1], 'game_started') ~= 'true' then return 'not_started' end
+if redis.call('HGET', KEYS[1], 'game_over') == 'true' then return 'over' end
+if redis.call('HGET', KEYS[1], 'meeting_active') == 'true' then
+    local fields = redis.call('HMGET', KEYS[1], 'game_start_time', 'duration', 'time_in_meetings_ms')
+    local game_end = tonumber(fields[1]) + tonumber(fields[2]) * 60000 + (tonumber(fields[3]) or 0)
+    redis.call('ZADD', KEYS[2], string.format('%d', game_end + tonumber(ARGV[2])), ARGV[1])
+    return 'meeting'
+end
+redis.call('HSET', KEYS[1], 'game_over', 'true')
+return 'ended'
+"""
+
+# KEYS: lobby hash, packed schedule. ARGV: schedule version (JSON), bytes to append.
+# Only appends while the schedule being extended is still the lobby's latest.
+APPEND_SCHEDULE_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'schedule_version') ~= ARGV[1] then return 'superseded' end
+redis.call('APPEND', KEYS[2], ARGV[2])
+return 'ok'
+"""
+
+# KEYS: lobby hash, activity log list. ARGV: entries to keep, entries (JSON objects without an id).
+# Numbers the entries from the lobby's counter, pushes them and trims the list. Returns the last id.
+APPEND_LOG_SCRIPT = """
+local count = #ARGV - 1
+local last = redis.call('HINCRBY', KEYS[1], 'activity_log_last_id', count)
+for i = 2, #ARGV do
+    local id = last - count + i - 1
+    redis.call('RPUSH', KEYS[2], '{"id": ' .. id .. ', ' .. string.sub(ARGV[i], 2))
+end
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[1]), -1)
+return last
+"""
+
+# KEYS: lobby hash, activity log list. ARGV: id of the last entry the caller has.
+# Ids are consecutive, so the first new entry's index follows from the last id and the list length.
+READ_LOG_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return false end
+local last = tonumber(redis.call('HGET', KEYS[1], 'activity_log_last_id')) or 0
+local first = last - redis.call('LLEN', KEYS[2]) + 1
+return redis.call('LRANGE', KEYS[2], math.max(0, tonumber(ARGV[1]) - first + 1), -1)
+"""
+
+# KEYS: deadline sorted set. ARGV: now (epoch ms), most members to pop.
+# Removes and returns the members that are due, so each is handed to one caller only.
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then redis.call('ZREM', KEYS[1], unpack(due)) end
+return due
+"""
+
+# KEYS: free lobby code set. ARGV: codes to try, lobby TTL.
+# Pops codes until one has no lobby and claims it by creating its lobby hash.
+# The lobby key is built from the popped code, which is fine on a single Redis server.
+CLAIM_CODE_SCRIPT = """
+for i = 1, tonumber(ARGV[1]) do
+    local code = redis.call('SPOP', KEYS[1])
+    if not code then return false end
+    local key = 'lobby:' .. code
+    if redis.call('HSETNX', key, 'game_started', 'false') == 1 then
+        redis.call('EXPIRE', key, ARGV[2])
+        return code
+    end
+end
+return false
+"""
+
+_scripts = {}
+
+def _decode_status(reply):
+    return reply.decode('utf-8') if isinstance(reply, bytes) else reply
+
+def _run_script(r, source, keys, args=()):
+    # Sync and asyncio clients need their own Script objects
+    script_key = (type(r), source)
+    if script_key not in _scripts:
+        _scripts[script_key] = r.register_script(source)
+    return _scripts[script_key](keys=keys, args=args, client=r)
+
+def join_lobby(r, lobby_code, player_name):
+    """
+    Atomically add a player to a lobby that has not started and is not full.
+    Returns:
+        tuple: (status, lobby_data) where status is 'ok', 'not_found', 'started' or 'full'.
+    """
+    def parse(reply):
+        status = _decode_status(reply[0])
+        if status != 'ok':
+            return status, None
+        return status, {
+            'player_names': [_decode(name) for name in reply[1]],
+            'ready_statuses': [_decode(ready) for ready in reply[2]],
+            'max_players': reply[3]
+        }
+
+    return _then(_run_script(r, JOIN_SCRIPT, [
+        lobby_key(lobby_code), part_key(lobby_code, 'player_names'), part_key(lobby_code, 'ready_statuses')
+    ], [json.dumps(player_name)]), parse)
+
+def set_ready(r, lobby_code, player_name):
+    """
+    Atomically mark a player ready.
+    Returns:
+        str: 'start' for the one call that made the full lobby ready, otherwise 'ok' or 'not_found'.
+    """
+    return _then(_run_script(r, READY_SCRIPT, [
+        lobby_key(lobby_code), part_key(lobby_code, 'player_names'), part_key(lobby_code, 'ready_statuses')
+    ], [json.dumps(player_name)]), _decode_status)
+
+def record_vote(r, lobby_code, player_name, vote):
+    """
+    Atomically record a vote (or 'skip') and update the tally.
+    Returns:
+        str: 'ok', 'closed' (this vote completed the meeting), 'not_found', 'no_meeting', 'already_voted' or 'dead'.
+    """
+    return _then(_run_script(r, VOTE_SCRIPT, _vote_keys(lobby_code), [
+        player_name, json.dumps(vote), '' if vote == 'skip' else vote, json.dumps(player_name)
+    ]), _decode_status)
+
+def withdraw_voter(r, lobby_code, player_name):
+    """
+    Atomically take a player who died or left off the current meeting's voter roll.
+    Returns:
+        str: 'ok', 'closed' (they were the last player still to vote) or 'no_meeting'.
+    """
+    return _then(
+        _run_script(r, WITHDRAW_VOTER_SCRIPT, _vote_keys(lobby_code), [player_name, json.dumps(player_name)]),
+        _decode_status
+    )
+
+def mark_dead(r, lobby_code, player_name, now_ms, kill_cooldown_ms):
+    """
+    Atomically mark a crew member as killed, unless the impostor killed within kill_cooldown_ms.
+    Returns:
+        tuple: (status, player_statuses) where status is 'ok', 'not_found', 'not_started', 'dead'
+            (already), 'impostor' or 'cooldown', and player_statuses is only given with 'ok'.
+    """
+    def parse(reply):
+        status = _decode_status(reply[0])
+        if status != 'ok':
+            return status, None
+        statuses = reply[1]
+        return status, {
+            _decode_status(statuses[i]): _decode(statuses[i + 1]) for i in range(0, len(statuses), 2)
+        }
+
+    return _then(_run_script(r, MARK_DEAD_SCRIPT, [
+        lobby_key(lobby_code), part_key(lobby_code, 'player_statuses'), part_key(lobby_code, 'roles')
+    ], [player_name, now_ms, kill_cooldown_ms]), parse)
+
+def _vote_keys(lobby_code):
+    return [lobby_key(lobby_code)] + [
+        part_key(lobby_code, field) for field in ('has_voted', 'pending_voters', 'votes', 'vote_counts')
+    ]
+
+def close_meeting(r, lobby_code):
+    """
+    Atomically end the active meeting.
+    Returns:
+        str: 'closed' for the one call that ended it, otherwise 'no_meeting' or 'not_found'.
+    """
+    return _then(_run_script(r, CLOSE_MEETING_SCRIPT, [lobby_key(lobby_code)]), _decode_status)
+
+def end_game(r, lobby_code, deadlines_key, deadline_member, meeting_duration_ms):
+    """
+    Atomically mark a running game as over because its time ran out.
+    If a meeting is active the game isn't over yet; its deadline is moved past the meeting instead.
+    Args:
+        r: Redis client.
+        lobby_code (str): The lobby code.
+        deadlines_key (str): The deadline set (see lobby_deadlines).
+        deadline_member (str): The game's member in the deadline set.
+        meeting_duration_ms (int): The longest a meeting can run.
+    Returns:
+        str: 'ended' for the one call that ended it, otherwise 'not_found', 'not_started', 'over' or 'meeting'.
+    """
+    return _then(
+        _run_script(r, END_GAME_SCRIPT, [lobby_key(lobby_code), deadlines_key], [deadline_member, meeting_duration_ms]),
+        _decode_status
+    )
+
+def append_schedule(r, lobby_code, version, rows):
+    """
+    Atomically add packed rows to the end of the lobby's schedule.
+    Args:
+        version (int): The schedule version the rows belong to.
+        rows (bytes): Rows from schedule_codec.encode_rows.
+    Returns:
+        str: 'ok', or 'superseded' if a newer schedule was requested (or the lobby is gone).
+    """
+    return _then(_run_script(r, APPEND_SCHEDULE_SCRIPT, [
+        lobby_key(lobby_code), part_key(lobby_code, 'assignments_per_interval')
+    ], [json.dumps(version), rows]), _decode_status)
+
+def claim_pooled_code(r, pool_key, tries):
+    """
+    Atomically pop a free lobby code from a pool set and claim it.
+    Returns:
+        str or None: The code, or None if the pool ran dry within tries codes.
+    """
+    return _then(
+        _run_script(r, CLAIM_CODE_SCRIPT, [pool_key], [tries, LOBBY_TTL_SECONDS]),
+        lambda reply: _decode_status(reply) if reply else None
+    )
+
+def pop_due_deadlines(r, deadlines_key, now_ms, limit):
+    """
+    Atomically take the deadlines that are due out of a deadline set (see lobby_deadlines).
+    Returns:
+        list: The due members, e.g. 'abc123:meeting', earliest first.
+    """
+    return _then(
+        _run_script(r, POP_DUE_SCRIPT, [deadlines_key], [now_ms, limit]),
+        lambda reply: [_decode_status(member) for member in reply]
+    )
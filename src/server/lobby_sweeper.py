@@ -0,0 +1,152 @@
+import argparse
+import os
+import threading
+import time
+
+import redis
+
+import lobby_codes
+import lobby_store
+import metrics
+
+# Keeps Redis memory bounded when players close their tabs instead of leaving.
+# Lobby keys expire on their own (see lobby_store.LOBBY_TTL_SECONDS), but a save
+# only moves on the expiry of the keys it writes. The sweeper brings the other
+# parts up to their lobby hash's expiry, and is the safety net for keys that end
+# up without an expiry (e.g. a hash first created by a Lua script), finished
+# games still on the long expiry, and parts left behind after their lobby hash
+# expired. Each pass also reports how many lobbies, keys and bytes are held:
+#   python lobby_sweeper.py            report only
+#   python lobby_sweeper.py --sweep    report and fix expiries
+SWEEP_INTERVAL_SECONDS = 60
+SWEEP_LOCK_KEY = 'lobby_sweeper_lock'  # So only one server process sweeps per interval
+SCAN_BATCH_SIZE = 500
+
+# KEYS: lobby hash, part key. Deletes the part only if its lobby is gone.
+DELETE_ORPHAN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+return redis.call('DEL', KEYS[2])
+"""
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+def sweep(r, fix=True):
+    """
+    Walk every lobby key once.
+    Args:
+        r: Redis client.
+        fix (bool): Set missing, too short or too long expiries and delete orphaned parts. False only reports.
+    Returns:
+        dict: lobbies, keys and bytes held, plus expiries_set and orphans_deleted.
+    """
+    report = {'lobbies': 0, 'keys': 0, 'bytes': 0, 'expiries_set': 0, 'orphans_deleted': 0}
+    batch = []
+    for key in r.scan_iter(match='lobby:*', count=SCAN_BATCH_SIZE):
+        batch.append(_text(key))
+        if len(batch) >= SCAN_BATCH_SIZE:
+            _sweep_batch(r, batch, report, fix)
+            batch = []
+    if batch:
+        _sweep_batch(r, batch, report, fix)
+    return report
+
+def _sweep_batch(r, keys, report, fix):
+    codes = sorted({key.split(':')[1] for key in keys})
+
+    # One round trip for every TTL, size and game_over flag in the batch
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.ttl(key)
+        pipe.memory_usage(key)
+    for code in codes:
+        pipe.ttl(lobby_store.lobby_key(code))
+        pipe.hget(lobby_store.lobby_key(code), 'game_over')
+    replies = pipe.execute(raise_on_error=False)
+    key_replies = replies[:2 * len(keys)]
+    lobby_replies = replies[2 * len(keys):]
+    lobbies = {
+        code: {'ttl': lobby_replies[2 * idx], 'game_over': _text(lobby_replies[2 * idx + 1]) == 'true'}
+        for idx, code in enumerate(codes)
+    }
+
+    fixes = r.pipeline(transaction=False)
+    orphaned_codes = set()
+    for idx, key in enumerate(keys):
+        ttl, size = key_replies[2 * idx], key_replies[2 * idx + 1]
+        lobby = lobbies[key.split(':')[1]]
+        report['keys'] += 1
+        if isinstance(size, int):  # MEMORY USAGE is not available everywhere
+            report['bytes'] += size
+
+        if key == lobby_store.lobby_key(key.split(':')[1]):
+            report['lobbies'] += 1
+            wanted = lobby_store.FINISHED_LOBBY_TTL_SECONDS if lobby['game_over'] else lobby_store.LOBBY_TTL_SECONDS
+            if ttl == -1 or (lobby['game_over'] and ttl > wanted):
+                report['expiries_set'] += 1
+                if fix:
+                    lobby_store.touch_lobby(r, key.split(':')[1], wanted)
+        elif lobby['ttl'] == -2:
+            # The lobby hash is gone (expired or deleted) but this part was left behind
+            report['orphans_deleted'] += 1
+            orphaned_codes.add(key.split(':')[1])
+            if fix:
+                fixes.eval(DELETE_ORPHAN_SCRIPT, 2, lobby_store.lobby_key(key.split(':')[1]), key)
+        elif ttl == -1 or ttl < lobby['ttl']:
+            # Expire with its lobby, not before it
+            report['expiries_set'] += 1
+            if fix:
+                fixes.expire(key, lobby['ttl'] if lobby['ttl'] > 0 else lobby_store.LOBBY_TTL_SECONDS)
+    if fix:
+        if orphaned_codes:
+            # Their lobbies are gone, so the codes are free again
+            fixes.sadd(lobby_codes.POOL_KEY, *orphaned_codes)
+        fixes.execute(raise_on_error=False)
+
+class LobbySweeper:
+    """
+    Runs sweep() on a background thread every SWEEP_INTERVAL_SECONDS.
+    Every server process starts one; a Redis lock lets only one of them sweep per interval.
+    """
+    def __init__(self, redis_client, interval=SWEEP_INTERVAL_SECONDS):
+        self.redis_client = redis_client
+        self.interval = interval
+        self.last_report = None
+        self.started = False
+
+    def start(self):
+        """Start the sweeper thread (once per process)."""
+        if self.started:
+            return
+        self.started = True
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if self.redis_client.set(SWEEP_LOCK_KEY, 1, nx=True, ex=max(1, self.interval - 1)):
+                    self.last_report = sweep(self.redis_client)
+                    metrics.record_lobby_storage(self.last_report)
+                    print(f"Lobby sweep: {self.last_report}")
+            except Exception as e:
+                print(f"Lobby sweep failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Report (and optionally fix) the Redis keys held by lobbies.')
+    parser.add_argument('--sweep', action='store_true', help='Fix expiries and delete orphaned keys too')
+    parser.add_argument('--redis-url', default=os.environ.get('REDIS_URL', 'redis://localhost:6379'))
+    args = parser.parse_args()
+
+    # Same connection setup as app.py
+    redis_url = args.redis_url
+    if redis_url.startswith('redis://'):
+        redis_url = redis_url.replace('redis://', 'rediss://', 1)
+    report = sweep(redis.Redis.from_url(redis_url, ssl_cert_reqs=None), fix=args.sweep)
+    print(f"{report['lobbies']} lobbies in {report['keys']} keys, {report['bytes'] / 1024:.1f} KB")
+    action = 'Set' if args.sweep else 'Would set'
+    print(f"{action} {report['expiries_set']} expiries, "
+          f"{'deleted' if args.sweep else 'would delete'} {report['orphans_deleted']} orphaned keys")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+
+import redis
+import redis.asyncio
+
+# In-process metrics, served in the Prometheus text format at /metrics.
+# Recording is switched off unless METRICS_ENABLED=1, and every record_*
+# helper returns straight away when it is off, so the hot paths pay for a
+# single flag check. Each server process keeps its own numbers; scrape
+# every process (or run one) to see them all.
+ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+ATTEMPT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    """A labelled count that only goes up."""
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}  # label values -> count
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+class Gauge:
+    """A labelled value that is set rather than counted."""
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}  # label values -> value
+        self.lock = threading.Lock()
+
+    def set(self, value, *label_values):
+        with self.lock:
+            self.values[label_values] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+class Histogram:
+    """A labelled histogram with fixed buckets."""
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}  # label values -> [count per bucket..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [0] * (len(self.buckets) + 2)
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[idx] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, series in sorted(self.values.items()):
+                # Buckets are cumulative in the exposition format
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ['+Inf'], series):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, label_values, [('le', bound)])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {series[-1]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request.', ('route', 'method', 'status')
+)
+REDIS_COMMANDS = Counter('redis_commands_total', 'Redis commands sent, pipelined ones included.', ('command',))
+REDIS_SECONDS = Histogram(
+    'redis_round_trip_seconds', 'Time per Redis round trip (one command or one pipeline).', ('operation',)
+)
+LOBBY_PAYLOAD_BYTES = Histogram(
+    'lobby_payload_bytes', 'Bytes of lobby data read from or written to Redis per call.', ('direction',),
+    SIZE_BUCKETS
+)
+LOBBY_CODEC_SECONDS = Histogram(
+    'lobby_codec_seconds', 'Time spent encoding or decoding lobby fields per call.', ('direction',)
+)
+SCHEDULE_SECONDS = Histogram(
+    'schedule_recalculation_seconds', 'Time spent in recalculate_room_assignments.', ('source', 'outcome')
+)
+SIMULATION_SECONDS = Histogram('simulation_duration_seconds', 'Time per run_simulation call.', ('engine', 'outcome'))
+SIMULATION_ATTEMPTS = Histogram(
+    'simulation_attempts', 'Attempts run_simulation needed to find a schedule.', ('engine',), ATTEMPT_BUCKETS
+)
+LOBBY_STORAGE = Gauge(
+    'lobby_storage', 'Lobbies, Redis keys and bytes held by lobbies at the last sweep.', ('measure',)
+)
+ALL_METRICS = [
+    REQUEST_SECONDS, REDIS_COMMANDS, REDIS_SECONDS, LOBBY_PAYLOAD_BYTES, LOBBY_CODEC_SECONDS, SCHEDULE_SECONDS,
+    SIMULATION_SECONDS, SIMULATION_ATTEMPTS, LOBBY_STORAGE
+]
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def record_request(route, method, status, seconds):
+    if ENABLED:
+        REQUEST_SECONDS.observe(seconds, route, method, status)
+
+def record_lobby_payload(direction, num_bytes, seconds):
+    if ENABLED:
+        LOBBY_PAYLOAD_BYTES.observe(num_bytes, direction)
+        LOBBY_CODEC_SECONDS.observe(seconds, direction)
+
+def record_schedule(source, outcome, seconds):
+    if ENABLED:
+        SCHEDULE_SECONDS.observe(seconds, source, outcome)
+
+def record_simulation(engine, result, seconds):
+    if ENABLED:
+        SIMULATION_SECONDS.observe(seconds, engine, 'found' if result is not None else 'failed')
+        if result is not None and 'attempts' in result:
+            SIMULATION_ATTEMPTS.observe(result['attempts'], engine)
+
+def record_lobby_storage(report):
+    if ENABLED:
+        for measure in ('lobbies', 'keys', 'bytes'):
+            LOBBY_STORAGE.set(report[measure], measure)
+
+def _command_name(args):
+    name = args[0]
+    return name.decode('utf-8') if isinstance(name, bytes) else str(name).upper()
+
+def _record_commands(operation, command_stack, seconds):
+    for args, _ in command_stack:
+        REDIS_COMMANDS.inc(_command_name(args))
+    REDIS_SECONDS.observe(seconds, operation)
+
+# Redis clients that count their commands and time their round trips. With
+# metrics off they are plain clients apart from one flag check per call.
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        if not ENABLED:
+            return super().execute(raise_on_error)
+        command_stack = list(self.command_stack)
+        start = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            _record_commands('pipeline', command_stack, time.perf_counter() - start)
+
+class InstrumentedRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        if not ENABLED:
+            return super().execute_command(*args, **options)
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            _record_commands(_command_name(args), [(args, None)], time.perf_counter() - start)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class InstrumentedAsyncPipeline(redis.asyncio.client.Pipeline):
+    async def execute(self, raise_on_error=True):
+        if not ENABLED:
+            return await super().execute(raise_on_error)
+        command_stack = list(self.command_stack)
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _record_commands('pipeline', command_stack, time.perf_counter() - start)
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    async def execute_command(self, *args, **options):
+        if not ENABLED:
+            return await super().execute_command(*args, **options)
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _record_commands(_command_name(args), [(args, None)], time.perf_counter() - start)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import random
+import simulation
+
+CACHE_KEY_PREFIX = 'schedule_cache'
+CACHE_TTL_SECONDS = 24 * 60 * 60  # Refreshed on every hit, so unused shapes age out
+MAX_VARIANTS = 8  # Schedules kept per lobby shape
+MIN_VARIANTS = 3  # Keep searching until a shape has this many, so games don't all look alike
+# Part of every shape key: bump it when an engine change makes the schedules
+# already cached wrong or unreadable, so they are left to expire
+SCHEDULE_FORMAT_VERSION = 2
+
+def shape_key(num_players, engine, **simulation_params):
+    """
+    Build the cache key for a lobby shape.
+    Args:
+        num_players (int): Number of alive players (one of them the impostor).
+        engine (str): Simulation engine the schedules come from.
+        **simulation_params: The remaining run_simulation parameters.
+    Returns:
+        str: A content-addressed Redis key.
+    """
+    shape = dict(
+        simulation_params, num_players=num_players, engine=engine, format_version=SCHEDULE_FORMAT_VERSION
+    )
+    digest = hashlib.sha1(json.dumps(shape, sort_keys=True).encode('utf-8')).hexdigest()
+    return f"{CACHE_KEY_PREFIX}:{digest}"
+
+def server_shape_key(num_players, num_rooms, simulation_time, engine):
+    """The cache key for a lobby shape played with the server's SERVER_SETTINGS."""
+    settings = simulation.SERVER_SETTINGS
+    return shape_key(
+        num_players,
+        engine,
+        num_rooms=num_rooms,
+        simulation_time=simulation_time,
+        assignment_interval=settings['assignment_interval'],
+        min_time_in_room_minutes=settings['min_time_in_room_minutes'],
+        difficulty_ratio=simulation.get_difficulty_ratio(settings['difficulty_level']),
+        min_time_per_kill=settings['min_time_per_kill'],
+        min_seconds_until_discovery=settings['min_seconds_until_discovery'],
+        max_seconds_until_discovery=settings['max_seconds_until_discovery']
+    )
+
+def anonymize(players, result):
+    """
+    Turn a run_simulation result into an integer-indexed schedule.
+    Slot 0 is the impostor and slots 1..n-1 are the crew, in player order.
+    """
+    impostor = [p.name for p in players if p.role == 'impostor']
+    crew = [p.name for p in players if p.role != 'impostor']
+    slot_names = impostor + crew
+    return {
+        'num_players': len(slot_names),
+        'matrix': [[assignment[name] for name in slot_names] for assignment in result['assignments_per_interval']],
+        'total_kill_opportunities_same_room': result['total_kill_opportunities_same_room'],
+        'required_kill_opportunities': result['required_kill_opportunities'],
+        'has_kill_opportunity_per_interval_same_room': result['has_kill_opportunity_per_interval_same_room'],
+        'kill_opportunity_per_interval_same_room': result['kill_opportunity_per_interval_same_room'],
+        'kill_opportunity_duration_per_interval_same_room': result['kill_opportunity_duration_per_interval_same_room']
+    }
+
+def relabel(players, entry, num_rooms):
+    """
+    Map a cached schedule onto real players.
+    Crew names are shuffled onto the crew slots and room numbers are permuted,
+    so two games served from the same entry still look different.
+    """
+    impostor = [p.name for p in players if p.role == 'impostor']
+    crew = [p.name for p in players if p.role != 'impostor']
+    random.shuffle(crew)
+    slot_names = impostor + crew
+    room_permutation = list(range(num_rooms))
+    random.shuffle(room_permutation)
+
+    # Keep the players' own order in each assignment so slot order doesn't leak roles
+    player_slots = [(p.name, slot_names.index(p.name)) for p in players]
+    assignments_per_interval = [
+        {name: room_permutation[row[slot]] for name, slot in player_slots}
+        for row in entry['matrix']
+    ]
+    for player in players:
+        player.status = 'alive'
+    return {
+        'assignments_per_interval': assignments_per_interval,
+        'total_kill_opportunities_same_room': entry['total_kill_opportunities_same_room'],
+        'players': players,
+        'kill_rooms': {},
+        'has_kill_opportunity_per_interval_same_room': entry['has_kill_opportunity_per_interval_same_room'],
+        'kill_opportunity_per_interval_same_room': entry['kill_opportunity_per_interval_same_room'],
+        'kill_opportunity_duration_per_interval_same_room': entry['kill_opportunity_duration_per_interval_same_room'],
+        'required_kill_opportunities': entry['required_kill_opportunities']
+    }
+
+def lookup(redis_client, key, players, num_rooms):
+    """
+    Fetch a random cached schedule for this shape, relabelled for the given players.
+    Returns:
+        dict or None: A run_simulation style result, or None on a miss.
+    """
+    pipe = redis_client.pipeline()
+    pipe.scard(key)
+    pipe.srandmember(key)
+    pipe.expire(key, CACHE_TTL_SECONDS)
+    num_variants, entry_json, _ = pipe.execute()
+    if num_variants < MIN_VARIANTS or not entry_json:
+        return None
+    entry = json.loads(entry_json)
+    if entry['num_players'] != len(players):
+        return None
+    return relabel(players, entry, num_rooms)
+
+def store(redis_client, key, players, result, max_variants=MAX_VARIANTS):
+    """Add a successful run_simulation result to the cache for this shape."""
+    store_entry(redis_client, key, anonymize(players, result), max_variants)
+
+def store_entry(redis_client, key, entry, max_variants=MAX_VARIANTS):
+    """
+    Add an anonymized schedule to the cache for this shape.
+    Returns:
+        bool: False if the shape already holds max_variants schedules.
+    """
+    if redis_client.scard(key) >= max_variants:
+        return False
+    pipe = redis_client.pipeline()
+    pipe.sadd(key, json.dumps(entry))
+    pipe.expire(key, CACHE_TTL_SECONDS)
+    pipe.execute()
+    return True
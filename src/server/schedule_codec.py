@@ -0,0 +1,132 @@
+import json
+import struct
+
+# Packed form of a lobby's assignments_per_interval, stored in Redis as one
+# binary value instead of a JSON list of {player_name: room_name} dicts:
+#   b'SCH1'                      magic
+#   uint16 header length         big-endian
+#   header                       JSON {"players": [...], "rooms": [...]}
+#   matrix                       one row per interval, one byte per player:
+#                                the room's index in "rooms", or 255 if the
+#                                player has no room in that interval
+# Lookups only unpack the rows they need.
+MAGIC = b'SCH1'
+NO_ROOM = 255
+_HEADER_LENGTH = struct.Struct('>H')
+
+def encode(assignments_per_interval, room_names=()):
+    """
+    Pack a list of {player_name: room_name} dicts.
+    Args:
+        assignments_per_interval (list): One assignment dict per interval.
+        room_names (list): Rooms in lobby order; rooms not listed are added after them.
+    Returns:
+        bytes: The packed schedule.
+    """
+    player_names = []
+    player_index = {}
+    rooms = list(room_names)
+    room_index = {room: idx for idx, room in enumerate(rooms)}
+    for assignment in assignments_per_interval:
+        for player_name, room in assignment.items():
+            if player_name not in player_index:
+                player_index[player_name] = len(player_names)
+                player_names.append(player_name)
+            if room not in room_index:
+                room_index[room] = len(rooms)
+                rooms.append(room)
+    if len(rooms) >= NO_ROOM:
+        raise ValueError(f"A packed schedule holds at most {NO_ROOM - 1} rooms")
+
+    matrix = bytearray([NO_ROOM]) * (len(assignments_per_interval) * len(player_names))
+    for interval, assignment in enumerate(assignments_per_interval):
+        row_start = interval * len(player_names)
+        for player_name, room in assignment.items():
+            matrix[row_start + player_index[player_name]] = room_index[room]
+
+    header = json.dumps({'players': player_names, 'rooms': rooms}, separators=(',', ':')).encode('utf-8')
+    return MAGIC + _HEADER_LENGTH.pack(len(header)) + header + bytes(matrix)
+
+def encode_rows(packed, assignments_per_interval):
+    """
+    Pack more intervals for an existing packed schedule.
+    Args:
+        packed (bytes): The packed schedule, or just its start (the header is all that is read).
+        assignments_per_interval (list): One {player_name: room_name} dict per interval.
+    Returns:
+        bytes: Matrix rows to add to the end of the packed schedule.
+    """
+    player_names, rooms, _ = _read_header(packed)
+    player_index = {player_name: idx for idx, player_name in enumerate(player_names)}
+    room_index = {room: idx for idx, room in enumerate(rooms)}
+    matrix = bytearray([NO_ROOM]) * (len(assignments_per_interval) * len(player_names))
+    for interval, assignment in enumerate(assignments_per_interval):
+        row_start = interval * len(player_names)
+        for player_name, room in assignment.items():
+            if player_name not in player_index or room not in room_index:
+                raise ValueError(f"{player_name} in {room} is not in the packed schedule")
+            matrix[row_start + player_index[player_name]] = room_index[room]
+    return bytes(matrix)
+
+def _read_header(packed):
+    # Returns (player names, room names, offset of the matrix)
+    if packed[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a packed schedule")
+    header_start = len(MAGIC) + _HEADER_LENGTH.size
+    (header_length,) = _HEADER_LENGTH.unpack_from(packed, len(MAGIC))
+    header = json.loads(packed[header_start:header_start + header_length])
+    return header['players'], header['rooms'], header_start + header_length
+
+def _row(packed, player_names, rooms, offset, interval):
+    start = offset + interval * len(player_names)
+    return {
+        player_name: rooms[room]
+        for player_name, room in zip(player_names, packed[start:start + len(player_names)])
+        if room != NO_ROOM
+    }
+
+def num_intervals(packed):
+    """Number of intervals in a packed schedule."""
+    player_names, _, offset = _read_header(packed)
+    if not player_names:
+        return 0
+    return (len(packed) - offset) // len(player_names)
+
+def assignment_at(packed, interval):
+    """The {player_name: room_name} dict for one interval."""
+    player_names, rooms, offset = _read_header(packed)
+    return _row(packed, player_names, rooms, offset, interval)
+
+def decode(packed, end=None):
+    """
+    Unpack the schedule back into a list of {player_name: room_name} dicts.
+    Args:
+        packed (bytes): The packed schedule.
+        end (int): Stop before this interval. None unpacks every interval.
+    """
+    player_names, rooms, offset = _read_header(packed)
+    total = (len(packed) - offset) // len(player_names) if player_names else 0
+    end = total if end is None else min(end, total)
+    return [_row(packed, player_names, rooms, offset, interval) for interval in range(end)]
+
+def player_runs(packed, player_name, first_interval):
+    """
+    Run-length encode one player's rooms from first_interval on.
+    Returns:
+        list: [room_name, number of intervals] runs, ending early at the first
+            interval where the player has no room. Empty if the player is unknown.
+    """
+    player_names, rooms, offset = _read_header(packed)
+    if player_name not in player_names:
+        return []
+    # The player's column is every len(player_names)-th byte of the matrix
+    column = packed[offset + player_names.index(player_name)::len(player_names)][first_interval:]
+    runs = []
+    for room in column:
+        if room == NO_ROOM:
+            break
+        if runs and runs[-1][0] == room:
+            runs[-1][1] += 1
+        else:
+            runs.append([room, 1])
+    return [[rooms[room], count] for room, count in runs]
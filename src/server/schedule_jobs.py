@@ -0,0 +1,73 @@
+import json
+import queue
+import threading
+import time
+
+SCHEDULE_JOBS_KEY = 'schedule_jobs'
+
+class ScheduleJobQueue:
+    """
+    Runs room-assignment simulation jobs off the request thread.
+    Jobs are pushed onto a Redis list so any server process can pick them up.
+    If Redis is not used (or a push fails) they go onto an in-process queue instead.
+    Requests queue jobs from the event loop through an asyncio Redis client;
+    the worker threads read them with a regular blocking client.
+    """
+    def __init__(self, redis_client, async_redis_client, handler, backend='redis', num_workers=2):
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.handler = handler  # Called as handler(lobby_code, version) on a worker thread
+        self.backend = backend
+        self.num_workers = num_workers
+        self.local_jobs = queue.Queue()
+        self.started = False
+
+    async def enqueue(self, lobby_code, version):
+        """
+        Queue a simulation job for a lobby.
+        Args:
+            lobby_code (str): The lobby to (re)plan.
+            version (int): The schedule version the job was requested for.
+        """
+        job = {'lobby_code': lobby_code, 'version': version}
+        if self.backend == 'redis':
+            try:
+                await self.async_redis_client.lpush(SCHEDULE_JOBS_KEY, json.dumps(job))
+                return
+            except Exception as e:
+                print(f"Could not queue schedule job in Redis, running it locally: {e}")
+        self.local_jobs.put(job)
+
+    def start(self):
+        """Start the worker threads (once per process)."""
+        if self.started:
+            return
+        self.started = True
+        # Always run a local worker so fallback jobs are drained
+        workers = [self._local_worker_loop]
+        if self.backend == 'redis':
+            workers += [self._redis_worker_loop] * self.num_workers
+        for target in workers:
+            threading.Thread(target=target, daemon=True).start()
+
+    def _local_worker_loop(self):
+        while True:
+            job = self.local_jobs.get()
+            self._run_job(job)
+
+    def _redis_worker_loop(self):
+        while True:
+            try:
+                item = self.redis_client.brpop(SCHEDULE_JOBS_KEY, timeout=5)
+            except Exception as e:
+                print(f"Error reading schedule jobs from Redis: {e}")
+                time.sleep(1)
+                continue
+            if item:
+                self._run_job(json.loads(item[1]))
+
+    def _run_job(self, job):
+        try:
+            self.handler(job['lobby_code'], job['version'])
+        except Exception as e:
+            print(f"Schedule job for lobby {job['lobby_code']} failed: {e}")
@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import redis
+
+import schedule_cache
+import simulation
+
+# Pre-generates schedules for common lobby shapes, e.g. during quiet hours,
+# so games starting later draw a ready schedule from the schedule cache
+# instead of running the simulation while players wait. Schedules are added to
+# the same Redis sets recalculate_room_assignments reads from, and/or written
+# to a JSON lines file that can be loaded into Redis later:
+#   python schedule_pool.py --shape 6:4:10 --shape 8:5:15 --count 20 --workers 4
+#   python schedule_pool.py --shape 6:4:10 --count 20 --output pool.jsonl --no-redis
+#   python schedule_pool.py --load pool.jsonl
+#
+# A shape is players:rooms:duration in minutes. Schedules are played with the
+# server's SERVER_SETTINGS.
+
+def parse_shape(text):
+    players, rooms, duration = (int(part) for part in text.split(':'))
+    return {'players': players, 'rooms': rooms, 'duration': duration}
+
+def generate_one(shape, seed, engine):
+    """
+    Run one simulation for a lobby shape. Top-level so it can be sent to a worker process.
+    Returns:
+        dict or None: The anonymized schedule, or None if the simulation found none.
+    """
+    rng = random.Random(seed)
+    roles = ['impostor'] + ['crew'] * (shape['players'] - 1)
+    rng.shuffle(roles)
+    players = [simulation.Player(name=f"Player{idx + 1}", role=role) for idx, role in enumerate(roles)]
+    settings = simulation.SERVER_SETTINGS
+    # The simulation prints when it gives up; the failures are counted in the report instead
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            result = simulation.run_simulation(
+                players=players,
+                num_rooms=shape['rooms'],
+                simulation_time=shape['duration'] * 60,
+                assignment_interval=settings['assignment_interval'],
+                min_time_in_room_minutes=settings['min_time_in_room_minutes'],
+                difficulty_ratio=simulation.get_difficulty_ratio(settings['difficulty_level']),
+                min_time_per_kill=settings['min_time_per_kill'],
+                require_same_room=settings['require_same_room'],
+                min_seconds_until_discovery=settings['min_seconds_until_discovery'],
+                max_seconds_until_discovery=settings['max_seconds_until_discovery'],
+                engine=engine,
+                seed=seed
+            )
+        except simulation.InfeasibleScheduleError:
+            return None
+    if result is None:
+        return None
+    return schedule_cache.anonymize(players, result)
+
+def shape_key(shape, engine):
+    return schedule_cache.server_shape_key(shape['players'], shape['rooms'], shape['duration'] * 60, engine)
+
+def generate_pool(shapes, count, workers=1, engine='planner', redis_client=None, output=None,
+                  max_tries_per_schedule=3):
+    """
+    Generate schedules for several lobby shapes in parallel.
+    Schedules are stored as they come in, so an interrupted run keeps what it made.
+    Args:
+        shapes (list): Shape dicts with players, rooms and duration (minutes).
+        count (int): Schedules wanted per shape.
+        workers (int): Worker processes.
+        engine (str): Simulation engine.
+        redis_client: Redis client to add the schedules to, or None.
+        output: Open file to append JSON lines to, or None.
+        max_tries_per_schedule (int): Simulations allowed per wanted schedule before giving up on a shape.
+    Returns:
+        list: Per-shape stats with stored, failed, full (Redis already had enough) and seconds.
+    """
+    stats = [{'shape': shape, 'stored': 0, 'failed': 0, 'full': False, 'seconds': 0.0} for shape in shapes]
+    tries = [0] * len(shapes)
+    started = [time.perf_counter()] * len(shapes)
+    seed_base = random.getrandbits(32)
+
+    def wants_more(idx):
+        return (not stats[idx]['full'] and stats[idx]['stored'] < count
+                and tries[idx] < count * max_tries_per_schedule)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}  # future -> shape index
+        while True:
+            # Keep a couple of simulations per worker in flight, spread over the shapes
+            for idx, shape in enumerate(shapes):
+                in_flight = sum(1 for shape_idx in pending.values() if shape_idx == idx)
+                while wants_more(idx) and stats[idx]['stored'] + in_flight < count and len(pending) < workers * 2:
+                    seed = seed_base + idx * 1000003 + tries[idx]
+                    pending[pool.submit(generate_one, shape, seed, engine)] = idx
+                    tries[idx] += 1
+                    in_flight += 1
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = pending.pop(future)
+                entry = future.result()
+                if entry is None:
+                    stats[idx]['failed'] += 1
+                    continue
+                if stats[idx]['stored'] >= count:
+                    continue
+                if redis_client is not None:
+                    if not schedule_cache.store_entry(redis_client, shape_key(shapes[idx], engine), entry, max_variants=count):
+                        stats[idx]['full'] = True  # Already holds enough schedules for this shape
+                        continue
+                if output is not None:
+                    output.write(json.dumps({
+                        'shape': shapes[idx], 'engine': engine,
+                        'format_version': schedule_cache.SCHEDULE_FORMAT_VERSION, 'entry': entry
+                    }) + '\n')
+                    output.flush()
+                stats[idx]['stored'] += 1
+                stats[idx]['seconds'] = time.perf_counter() - started[idx]
+    return stats
+
+def load_pool(redis_client, path, max_variants):
+    """
+    Add schedules from a JSON lines file written by generate_pool to Redis.
+    Records of an older schedule format are skipped.
+    Returns:
+        int: Number of schedules added.
+    """
+    added = 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('format_version') != schedule_cache.SCHEDULE_FORMAT_VERSION:
+                continue  # Made by an older engine; the server would no longer read it
+            key = shape_key(record['shape'], record['engine'])
+            if schedule_cache.store_entry(redis_client, key, record['entry'], max_variants):
+                added += 1
+    return added
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-generate schedules for common lobby shapes.')
+    parser.add_argument('--shape', action='append', type=parse_shape, default=[],
+                        help='Lobby shape as players:rooms:duration_minutes; repeat for more shapes')
+    parser.add_argument('--count', type=int, default=20, help='Schedules wanted per shape')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--engine', default=os.environ.get('SIMULATION_ENGINE', 'planner'),
+                        choices=['python', 'numpy', 'planner'])
+    parser.add_argument('--output', help='Append the schedules to this JSON lines file')
+    parser.add_argument('--no-redis', action='store_true', help='Only write the output file')
+    parser.add_argument('--load', help='Add the schedules in this JSON lines file to Redis and exit')
+    parser.add_argument('--redis-url', default=os.environ.get('REDIS_URL', 'redis://localhost:6379'))
+    args = parser.parse_args()
+
+    redis_client = None
+    if not args.no_redis:
+        # Same connection setup as app.py
+        redis_url = args.redis_url
+        if redis_url.startswith('redis://'):
+            redis_url = redis_url.replace('redis://', 'rediss://', 1)
+        redis_client = redis.Redis.from_url(redis_url, ssl_cert_reqs=None)
+
+    if args.load:
+        if redis_client is None:
+            parser.error('--load needs Redis')
+        added = load_pool(redis_client, args.load, max(args.count, schedule_cache.MAX_VARIANTS))
+        print(f"Added {added} schedules from {args.load}")
+        return
+
+    if not args.shape:
+        parser.error('give at least one --shape')
+    if redis_client is None and not args.output:
+        parser.error('--no-redis needs --output')
+
+    output = open(args.output, 'a') if args.output else None
+    start = time.perf_counter()
+    try:
+        stats = generate_pool(args.shape, args.count, args.workers, args.engine, redis_client, output)
+    finally:
+        if output is not None:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{'shape':<12} {'stored':>7} {'failed':>7} {'seconds':>8} {'per sec':>8}")
+    for entry in stats:
+        shape = entry['shape']
+        name = f"{shape['players']}:{shape['rooms']}:{shape['duration']}"
+        rate = entry['stored'] / entry['seconds'] if entry['seconds'] else 0
+        note = ' (already full)' if entry['full'] else ''
+        print(f"{name:<12} {entry['stored']:>7} {entry['failed']:>7} {entry['seconds']:>8.2f} {rate:>8.1f}{note}")
+    total = sum(entry['stored'] for entry in stats)
+    print(f"{total} schedules in {elapsed:.2f}s ({total / elapsed:.1f} per second, {args.workers} workers)")
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,146 @@
+import itertools
+import multiprocessing
 import random
 import math
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Player statuses are stored as small integers; Player.status still reads and
+# writes the names
+STATUS_ALIVE = 0
+STATUS_DEAD = 1
+STATUS_NAMES = ['alive', 'dead']
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+# Settings the server plays every lobby with
+SERVER_SETTINGS = {
+    'assignment_interval': 10,  # Room assignments change every 10 seconds
+    'min_time_in_room_minutes': 2,  # Players must stay in the same room for at least 2 minutes
+    'difficulty_level': 'medium',
+    'min_time_per_kill': 30,  # Kill opportunity must persist for at least 30 seconds
+    'require_same_room': True,
+    'min_seconds_until_discovery': 240,
+    'max_seconds_until_discovery': 1000
+}
+
+class InfeasibleScheduleError(ValueError):
+    """The game settings can never produce the kill opportunities they require."""
 
 class Player:
+    __slots__ = ('name', 'role', 'status_code')
+
     def __init__(self, name, role='crew'):
         self.name = name
         self.role = role  # 'impostor' or 'crew'
-        self.status = 'alive'
+        self.status_code = STATUS_ALIVE
+
+    @property
+    def status(self):
+        return STATUS_NAMES[self.status_code]
+
+    @status.setter
+    def status(self, status):
+        self.status_code = STATUS_CODES[status]
+
+class AssignmentRows:
+    """
+    Read-only list of {player_name: room} dicts backed by a simulation's output matrix.
+    Dicts are only built for the rows that are read, so failed attempts never build any.
+    """
+    __slots__ = ('names', 'matrix', 'length')
+
+    def __init__(self, names, matrix, length):
+        self.names = names
+        self.matrix = matrix  # length rows of len(names) room numbers
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, interval):
+        if isinstance(interval, slice):
+            return [self[idx] for idx in range(*interval.indices(self.length))]
+        if interval < 0:
+            interval += self.length
+        if not 0 <= interval < self.length:
+            raise IndexError('interval out of range')
+        row_start = interval * len(self.names)
+        return dict(zip(self.names, self.matrix[row_start:row_start + len(self.names)]))
+
+    def __iter__(self):
+        for interval in range(self.length):
+            yield self[interval]
+
+class SimulationState:
+    """
+    Indexed view of the players for one simulation run.
+    Players are referred to by their position in the players list, so status,
+    role and room lookups are list indexing instead of scans over the players.
+    The buffers are reused when the same state is reset for the next attempt.
+    """
+    __slots__ = ('players', 'names', 'index', 'status', 'impostor', 'rooms', 'occupants', 'last_reassignment')
+
+    def __init__(self):
+        self.players = []
+        self.names = []
+        self.index = {}
+        self.status = bytearray()
+        self.impostor = None
+        self.rooms = array('B')
+        self.occupants = []
+        self.last_reassignment = []
+
+    def reset(self, players, num_rooms, room_assignment):
+        self.players = players
+        names = [player.name for player in players]
+        if names != self.names:
+            self.names = names
+            self.index = {name: idx for idx, name in enumerate(names)}
+            self.status = bytearray(len(names))
+            self.last_reassignment = [0] * len(names)
+        for idx, player in enumerate(players):
+            self.status[idx] = player.status_code
+            self.last_reassignment[idx] = 0
+        self.impostor = next((idx for idx, player in enumerate(players) if player.role == 'impostor'), None)
+
+        # One byte per room number unless there are too many rooms for that
+        typecode = 'B' if num_rooms <= 256 else 'H'
+        if self.rooms.typecode != typecode or len(self.rooms) != len(names):
+            self.rooms = array(typecode, bytes(array(typecode).itemsize * len(names)))
+        # Players (alive or dead) in each room, kept up to date by move()
+        del self.occupants[num_rooms:]
+        for occupants in self.occupants:
+            occupants.clear()
+        while len(self.occupants) < num_rooms:
+            self.occupants.append(set())
+        for idx, name in enumerate(names):
+            room = room_assignment[name]
+            self.rooms[idx] = room
+            self.occupants[room].add(idx)
+
+    def move(self, idx, room):
+        self.occupants[self.rooms[idx]].discard(idx)
+        self.occupants[room].add(idx)
+        self.rooms[idx] = room
+
+    def is_alive(self, idx):
+        return self.status[idx] == STATUS_ALIVE
+
+    def mark_dead(self, name):
+        idx = self.index.get(name)
+        if idx is not None and self.status[idx] == STATUS_ALIVE:
+            self.status[idx] = STATUS_DEAD
+            self.players[idx].status_code = STATUS_DEAD
+
+    def impostor_alive(self):
+        return self.impostor is not None and self.status[self.impostor] == STATUS_ALIVE
 
 def simulate_game_with_constraints(
     players, num_rooms, simulation_time, assignment_interval, min_time_in_room_intervals, difficulty_ratio,
     min_time_per_kill, require_same_room, min_seconds_until_discovery,
-    max_seconds_until_discovery, initial_room_assignment=None, kill_rooms=None
+    max_seconds_until_discovery, initial_room_assignment=None, kill_rooms=None, state=None,
+    min_kill_opportunities=None
 ):
     # Convert min_time_per_kill to intervals
     min_kill_intervals = math.ceil(min_time_per_kill / assignment_interval)
@@ -21,23 +151,31 @@ def simulate_game_with_constraints(
         required_kill_opportunities = 1
 
     # Initialize variables
-    assignments_per_interval = []
     kill_opportunities_same_room = 0
     kill_rooms = {} if kill_rooms is None else kill_rooms.copy()
-    total_intervals = simulation_time // assignment_interval
-
-    # Initialize last reassignment intervals
-    last_reassignment_interval = {player.name: 0 for player in players}
+    total_intervals = int(simulation_time // assignment_interval)
+    all_rooms = list(range(num_rooms))
+    # Where to send someone found in the impostor's room, per impostor room
+    rooms_other_than = [[r for r in all_rooms if r != room] for room in all_rooms]
+    possible_rooms = []  # Rooms open to players being reassigned, rebuilt only when kill rooms change
 
     # Initialize current room assignment
     if initial_room_assignment is not None:
-        current_room_assignment = initial_room_assignment.copy()
+        current_room_assignment = initial_room_assignment
     else:
         # Random initial assignment
-        available_rooms = list(range(num_rooms))
         current_room_assignment = {}
         for player in players:
-            current_room_assignment[player.name] = random.choice(available_rooms)
+            current_room_assignment[player.name] = random.choice(all_rooms)
+    # A state passed in by the caller is reused, so repeated attempts don't reallocate it
+    if state is None:
+        state = SimulationState()
+    state.reset(players, num_rooms, current_room_assignment)
+    impostor = state.impostor
+    rooms = state.rooms
+    occupants_per_room = state.occupants
+    last_reassignment_interval = state.last_reassignment
+    num_players = len(players)
 
     # Schedule kill opportunities
     kill_intervals = []
@@ -57,6 +195,12 @@ def simulate_game_with_constraints(
     if len(kill_intervals) < required_kill_opportunities:
         required_kill_opportunities = len(kill_intervals)
 
+    # Every kill opportunity comes from one of these windows, so the outcome is known
+    # already: skip the intervals if the attempt can't reach the caller's minimum
+    if min_kill_opportunities is not None:
+        if count_completed_windows(kill_intervals, min_kill_intervals, total_intervals) < min_kill_opportunities:
+            total_intervals = 0
+
     crew_members_alive = [p.name for p in players if p.role == 'crew']
     random.shuffle(crew_members_alive)
 
@@ -70,50 +214,53 @@ def simulate_game_with_constraints(
             crew_member_to_kill = random.choice(crew_members_alive)
             kill_schedule[interval] = crew_member_to_kill
 
-    # Initialize variables for kill tracking
-    kill_opportunity_per_interval_same_room = []
-    has_kill_opportunity_per_interval_same_room = []
-    kill_opportunity_duration_per_interval_same_room = []
+    # All output is written in place: one row of room numbers per interval in a
+    # single matrix, plus preallocated per-interval kill tracking
+    room_matrix = array(rooms.typecode, bytes(rooms.itemsize * total_intervals * num_players))
+    kill_opportunity_per_interval_same_room = [False] * total_intervals
+    has_kill_opportunity_per_interval_same_room = [False] * total_intervals
+    kill_opportunity_duration_per_interval_same_room = [0] * total_intervals
+    intervals_run = 0
 
     current_kill_duration = 0
-    current_crew_member = None
+    current_crew_member = None  # Index of the crew member in the current kill opportunity
     current_room_number = None
 
     # Start the simulation loop
     for interval in range(total_intervals):
         # Update time since kill for each room
-        for room_number in list(kill_rooms.keys()):
-            kill_rooms[room_number]['time_since_kill'] += assignment_interval
-            # Remove rooms where discovery time has passed
-            if kill_rooms[room_number]['time_since_kill'] >= max_seconds_until_discovery:
-                del kill_rooms[room_number]
-
-        # Update player statuses if any kills occurred
-        for room_info in kill_rooms.values():
-            killed_player_name = room_info['killed_player']
-            killed_player = next((p for p in players if p.name == killed_player_name), None)
-            if killed_player and killed_player.status != 'dead':
-                killed_player.status = 'dead'
-
-        # Prepare list of alive players
-        alive_players = [p for p in players if p.status == 'alive']
-        impostor = next((p for p in alive_players if p.role == 'impostor'), None)
-        if not impostor:
+        kill_rooms_changed = interval == 0
+        if kill_rooms:
+            for room_number in list(kill_rooms.keys()):
+                room_info = kill_rooms[room_number]
+                room_info['time_since_kill'] += assignment_interval
+                # Remove rooms where discovery time has passed
+                if room_info['time_since_kill'] >= max_seconds_until_discovery:
+                    del kill_rooms[room_number]
+                    kill_rooms_changed = True
+                elif room_info['time_since_kill'] - assignment_interval < min_seconds_until_discovery <= room_info['time_since_kill']:
+                    kill_rooms_changed = True  # Just became discoverable
+
+            # Update player statuses if any kills occurred
+            for room_info in kill_rooms.values():
+                state.mark_dead(room_info['killed_player'])
+
+        if not state.impostor_alive():
             break  # Game ends if impostor is dead
 
-        # Initialize room_assignment as a copy of current_room_assignment
-        room_assignment = current_room_assignment.copy()
+        # A player killed during this interval still takes their turn below
+        killed_this_interval = None
 
         # Handle kill opportunities
         if interval in kill_schedule:
             # Start a new kill opportunity
-            crew_member_to_kill = kill_schedule[interval]
-            room_number = random.choice(list(range(num_rooms)))
-            current_room_assignment[impostor.name] = room_number
-            current_room_assignment[crew_member_to_kill] = room_number
+            crew_member_to_kill = state.index[kill_schedule[interval]]
+            room_number = random.choice(all_rooms)
+            state.move(impostor, room_number)
+            state.move(crew_member_to_kill, room_number)
 
             # Update last reassignment interval
-            last_reassignment_interval[impostor.name] = interval
+            last_reassignment_interval[impostor] = interval
             last_reassignment_interval[crew_member_to_kill] = interval
 
             # Initialize kill tracking variables
@@ -121,7 +268,7 @@ def simulate_game_with_constraints(
             current_crew_member = crew_member_to_kill
             current_room_number = room_number
 
-        elif current_kill_duration > 0 and current_crew_member:
+        elif current_kill_duration > 0 and current_crew_member is not None:
             # Continue the existing kill opportunity
             current_kill_duration += assignment_interval
 
@@ -131,81 +278,85 @@ def simulate_game_with_constraints(
                 # Record the kill room and reset its timer
                 kill_rooms[current_room_number] = {
                     'time_since_kill': 0,
-                    'killed_player': current_crew_member
+                    'killed_player': state.names[current_crew_member]
                 }
+                kill_rooms_changed = True
                 # Mark the killed player as dead
-                killed_player = next((p for p in players if p.name == current_crew_member), None)
-                if killed_player:
-                    killed_player.status = 'dead'
+                if state.is_alive(current_crew_member):
+                    killed_this_interval = current_crew_member
+                state.mark_dead(state.names[current_crew_member])
 
                 # Reset kill opportunity tracking
                 current_kill_duration = 0
                 current_crew_member = None
                 current_room_number = None
 
+        # The rooms open to reassigned players only change with the kill rooms
+        if kill_rooms_changed:
+            possible_rooms[:] = [
+                r for r in all_rooms
+                if r not in kill_rooms or kill_rooms[r]['time_since_kill'] >= min_seconds_until_discovery
+            ]
+
         # Now handle other players
-        for player in alive_players:
-            if player.name in [impostor.name, current_crew_member]:
+        for idx in range(num_players):
+            if not state.is_alive(idx) and idx != killed_this_interval:
+                continue
+            if idx == impostor or idx == current_crew_member:
                 continue  # Already handled
 
-            time_in_room = interval - last_reassignment_interval[player.name]
+            time_in_room = interval - last_reassignment_interval[idx]
             if time_in_room >= min_time_in_room_intervals:
                 # Reassign player
-                forbidden_rooms = [
-                    room_number for room_number, room_info in kill_rooms.items()
-                    if room_info['time_since_kill'] < min_seconds_until_discovery
-                ]
-                possible_rooms = [r for r in range(num_rooms) if r not in forbidden_rooms]
                 if possible_rooms:
-                    new_room = random.choice(possible_rooms)
-                    current_room_assignment[player.name] = new_room
-                    last_reassignment_interval[player.name] = interval
+                    state.move(idx, random.choice(possible_rooms))
+                    last_reassignment_interval[idx] = interval
                 else:
                     # No rooms available, keep the player in the current room
                     pass
-            else:
-                # Keep the player in the same room
-                pass  # No action needed
 
         # Ensure no unintended kill opportunities occur
         has_kill_opportunity = False
         kill_opportunity_in_interval = False
         duration = current_kill_duration
 
-        # Check for unintended kill opportunities
-        impostor_room = current_room_assignment.get(impostor.name)
-        for player_name in current_room_assignment:
-            if player_name != impostor.name and current_room_assignment[player_name] == impostor_room:
-                # Check if this is the intended kill opportunity
-                if current_crew_member and player_name == current_crew_member:
-                    has_kill_opportunity = True
-                    kill_opportunity_in_interval = True
-                else:
-                    # Unintended kill opportunity, adjust assignment
-                    other_rooms = [r for r in range(num_rooms) if r != impostor_room]
-                    if other_rooms:
-                        current_room_assignment[player_name] = random.choice(other_rooms)
-                    else:
-                        # If no other rooms, swap with another player
-                        for other_player_name in current_room_assignment:
-                            if other_player_name != impostor.name and other_player_name != player_name:
-                                temp_room = current_room_assignment[other_player_name]
-                                current_room_assignment[other_player_name] = current_room_assignment[player_name]
-                                current_room_assignment[player_name] = temp_room
-                                break
+        # Check for unintended kill opportunities; only the impostor's room needs looking at
+        impostor_room = rooms[impostor]
+        occupants = occupants_per_room[impostor_room]
+        if current_crew_member is not None and current_crew_member in occupants:
+            # The intended kill opportunity
+            has_kill_opportunity = True
+            kill_opportunity_in_interval = True
+        if len(occupants) > (2 if has_kill_opportunity else 1):
+            # Unintended kill opportunity, adjust assignment. Players are moved in list
+            # order so a seeded run always makes the same choices.
+            other_rooms = rooms_other_than[impostor_room]
+            intruders = sorted(idx for idx in occupants if idx != impostor and idx != current_crew_member)
+            for idx in intruders:
+                if other_rooms:
+                    state.move(idx, random.choice(other_rooms))
+                # With a single room there is nowhere else to put them
 
         # Record the room assignment
-        room_assignment = current_room_assignment.copy()
-        assignments_per_interval.append(room_assignment)
+        row_start = interval * num_players
+        room_matrix[row_start:row_start + num_players] = rooms
+        intervals_run = interval + 1
 
         # Track kill opportunity per interval
-        has_kill_opportunity_per_interval_same_room.append(has_kill_opportunity)
-        kill_opportunity_per_interval_same_room.append(kill_opportunity_in_interval)
-        kill_opportunity_duration_per_interval_same_room.append(duration)
+        has_kill_opportunity_per_interval_same_room[interval] = has_kill_opportunity
+        kill_opportunity_per_interval_same_room[interval] = kill_opportunity_in_interval
+        kill_opportunity_duration_per_interval_same_room[interval] = duration
+
+    if intervals_run < total_intervals:
+        # The game ended early
+        del room_matrix[intervals_run * num_players:]
+        del has_kill_opportunity_per_interval_same_room[intervals_run:]
+        del kill_opportunity_per_interval_same_room[intervals_run:]
+        del kill_opportunity_duration_per_interval_same_room[intervals_run:]
 
     # Prepare result
     result = {
-        'assignments_per_interval': assignments_per_interval,
+        'assignments_per_interval': AssignmentRows(state.names, room_matrix, intervals_run),
         'total_kill_opportunities_same_room': kill_opportunities_same_room,
         'players': players,
         'kill_rooms': kill_rooms,
@@ -216,10 +367,161 @@ def simulate_game_with_constraints(
     }
     return result
 
+def count_completed_windows(kill_intervals, min_kill_intervals, total_intervals):
+    # A window starting at interval s is counted max(1, min_kill_intervals - 1) intervals later
+    return sum(1 for start in kill_intervals if start + max(1, min_kill_intervals - 1) < total_intervals)
+
+def max_kill_opportunities(total_intervals, min_kill_intervals, engine='python'):
+    """
+    The most kill opportunities a game of this length can hold, however the random choices fall.
+    Args:
+        total_intervals (int): Number of intervals in the game.
+        min_kill_intervals (int): Intervals a kill opportunity has to last.
+        engine (str): Simulation engine; the planner packs its windows tighter.
+    Returns:
+        int: Upper bound on the kill opportunities.
+    """
+    if engine == 'planner':
+        return max(0, total_intervals - 1) // max(1, min_kill_intervals)
+    # The search engines open the first window at interval 2 at the earliest and
+    # wait at least one interval between windows
+    needed = max(min_kill_intervals, 2)
+    if total_intervals < 2 + needed:
+        return 0
+    return (total_intervals - 2 - needed) // (min_kill_intervals + 1) + 1
+
+def check_feasibility(
+    num_players, num_rooms, simulation_time, assignment_interval, min_time_per_kill, difficulty_ratio,
+    engine='python'
+):
+    """
+    Reject settings no simulation attempt could succeed with, without running any.
+    Raises:
+        InfeasibleScheduleError: Saying what is wrong with the settings.
+    """
+    if num_players < 2:
+        raise InfeasibleScheduleError("A game needs an impostor and at least one crew member.")
+    if num_rooms < (2 if engine == 'planner' else 1):
+        raise InfeasibleScheduleError(f"A game needs at least {2 if engine == 'planner' else 1} rooms.")
+
+    required_kill_opportunities = max(1, int(difficulty_ratio * (num_players - 2)))
+    total_intervals = int(simulation_time // assignment_interval)
+    min_kill_intervals = math.ceil(min_time_per_kill / assignment_interval)
+    most = max_kill_opportunities(total_intervals, min_kill_intervals, engine)
+    if required_kill_opportunities > most:
+        raise InfeasibleScheduleError(
+            f"Only {most} kill opportunities of {min_time_per_kill}s fit in {simulation_time:g}s, "
+            f"but {num_players} players need {required_kill_opportunities}. "
+            f"Make the game longer or use fewer players."
+        )
+
+def get_engine(engine):
+    # Pick the simulation engine: 'python' (this module), 'numpy' (simulation_np)
+    # or 'planner' (simulation_planner)
+    if engine == 'numpy':
+        import simulation_np
+        return simulation_np.simulate_game_with_constraints
+    if engine == 'planner':
+        import simulation_planner
+        return simulation_planner.simulate_game_with_constraints
+    return simulate_game_with_constraints
+
+def attempt_seed(seed, attempt_index):
+    # Every attempt gets its own seed so results don't depend on the worker count
+    return seed * 1000003 + attempt_index
+
+def run_attempt(
+    engine, seed, players, simulation_args, initial_room_assignment, state=None, min_kill_opportunities=None
+):
+    # Run a single attempt. Top-level so it can be sent to a worker process.
+    if seed is not None:
+        random.seed(seed)
+    for player in players:
+        player.status_code = STATUS_ALIVE
+    options = {'initial_room_assignment': initial_room_assignment}
+    if engine != 'planner':
+        # The search engines give up early on attempts that can't succeed
+        options['min_kill_opportunities'] = min_kill_opportunities
+    if state is not None:
+        # Only the pure Python engine takes a reusable state
+        options['state'] = state
+    return get_engine(engine)(*simulation_args, **options)
+
+# Worker processes are started once and reused across searches. The server asks
+# for the pool from several threads, and forking a process that runs threads can
+# hand the workers locks that are held forever, so they are started with
+# forkserver (spawn where that isn't available) instead of the fork default.
+_process_pool = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+def get_process_pool(workers):
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(POOL_START_METHOD)
+            )
+            _process_pool_workers = workers
+        return _process_pool
+
+def run_parallel_attempts(
+    engine, seed, players, simulation_args, initial_room_assignment, required_kill_opportunities, total_attempts,
+    workers
+):
+    pool = get_process_pool(workers)
+    pending = {}  # future -> attempt index
+    finished = {}  # attempt index -> result or None
+    next_attempt = 0
+    best_attempt = None
+
+    while True:
+        # Keep a couple of attempts per worker in flight, but never go past a known success
+        limit = total_attempts if best_attempt is None else best_attempt
+        while next_attempt < limit and len(pending) < workers * 2:
+            future = pool.submit(
+                run_attempt, engine, attempt_seed(seed, next_attempt), players, simulation_args,
+                initial_room_assignment, None, required_kill_opportunities
+            )
+            pending[future] = next_attempt
+            next_attempt += 1
+        if not pending:
+            break
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            attempt_index = pending.pop(future)
+            result = future.result()
+            if result['total_kill_opportunities_same_room'] >= required_kill_opportunities:
+                finished[attempt_index] = result
+                if best_attempt is None or attempt_index < best_attempt:
+                    best_attempt = attempt_index
+            else:
+                finished[attempt_index] = None
+
+        if best_attempt is not None:
+            # Cancel everything after the success; earlier attempts still have to
+            # finish so the lowest successful attempt wins, as it would sequentially
+            for future, attempt_index in list(pending.items()):
+                if attempt_index > best_attempt and future.cancel():
+                    del pending[future]
+            if all(attempt_index in finished for attempt_index in range(best_attempt)):
+                for future in pending:
+                    future.cancel()
+                result = finished[best_attempt]
+                result['attempts'] = best_attempt + 1
+                return result
+
+    return None
+
 def run_simulation(
     players, num_rooms, simulation_time, assignment_interval, min_time_in_room_minutes, difficulty_ratio,
     min_time_per_kill, require_same_room, min_seconds_until_discovery, max_seconds_until_discovery,
-    num_initial_assignments=10, max_attempts_per_assignment=10
+    num_initial_assignments=10, max_attempts_per_assignment=10, initial_room_assignment=None, engine='python',
+    workers=1, seed=None
 ):
     # Convert min_time_in_room_minutes to seconds and intervals
     min_time_in_room_seconds = min_time_in_room_minutes * 60
@@ -230,22 +532,56 @@ def run_simulation(
     if required_kill_opportunities < 1:
         required_kill_opportunities = 1
 
+    # Fail fast on settings that no attempt could succeed with
+    roles = [player.role for player in players]
+    if 'impostor' not in roles or 'crew' not in roles:
+        raise InfeasibleScheduleError("A game needs an impostor and at least one crew member.")
+    check_feasibility(
+        len(players), num_rooms, simulation_time, assignment_interval, min_time_per_kill, difficulty_ratio, engine
+    )
+
+    simulation_args = (
+        players, num_rooms, simulation_time, assignment_interval, min_time_in_room_intervals, difficulty_ratio,
+        min_time_per_kill, require_same_room, min_seconds_until_discovery, max_seconds_until_discovery
+    )
+
+    # The planner builds its schedule in one pass, so there is nothing to retry
+    if engine == 'planner':
+        num_initial_assignments = 1
+        max_attempts_per_assignment = 1
+        workers = 1
+
+    # Fan the attempts out over worker processes and stop at the first success
+    if workers > 1:
+        if seed is None:
+            seed = random.getrandbits(32)
+        total_attempts = num_initial_assignments * max_attempts_per_assignment
+        result = run_parallel_attempts(
+            engine, seed, players, simulation_args, initial_room_assignment, required_kill_opportunities,
+            total_attempts, workers
+        )
+        if result is None:
+            print(f"No suitable assignment found after {total_attempts} attempts")
+        return result
+
+    # Attempts in this thread share one set of simulation buffers
+    state = SimulationState() if engine == 'python' else None
+
     # Loop over the number of initial assignments
     for initial_assignment_index in range(num_initial_assignments):
         # Try up to max_attempts_per_assignment for each initial assignment
         for attempt in range(max_attempts_per_assignment):
-            for player in players:
-                player.status = 'alive'
-
-            # Simulate the game
-            result = simulate_game_with_constraints(
-                players, num_rooms, simulation_time, assignment_interval, min_time_in_room_intervals, difficulty_ratio,
-                min_time_per_kill, require_same_room, min_seconds_until_discovery,
-                max_seconds_until_discovery
+            attempt_index = initial_assignment_index * max_attempts_per_assignment + attempt
+
+            # Simulate the game, resuming from the given room assignment if there is one
+            result = run_attempt(
+                engine, None if seed is None else attempt_seed(seed, attempt_index), players, simulation_args,
+                initial_room_assignment, state, required_kill_opportunities
             )
 
             # Check if the required kill opportunities were achieved
             if result['total_kill_opportunities_same_room'] >= required_kill_opportunities:
+                result['attempts'] = attempt_index + 1  # Attempts it took, for benchmarking
                 return result  # Successful simulation
 
         # If no suitable assignment found for this initial assignment, continue to next
@@ -254,6 +590,39 @@ def run_simulation(
     # If no suitable assignment found after all initial assignments
     return None
 
+def stream_simulation(
+    players, num_rooms, simulation_time, assignment_interval, min_time_in_room_minutes, difficulty_ratio,
+    min_time_per_kill, require_same_room, min_seconds_until_discovery, max_seconds_until_discovery,
+    initial_room_assignment=None, seed=None
+):
+    """
+    Plan a schedule lazily with the planner engine, so the first intervals are ready
+    without planning the whole game. Read it with next_intervals.
+    Only the planner can stream: the random search engines only know whether an
+    attempt worked once it has run to the end.
+    Returns:
+        dict: The stream, see simulation_planner.stream_game.
+    """
+    import simulation_planner
+    if seed is not None:
+        random.seed(seed)
+    for player in players:
+        player.status_code = STATUS_ALIVE
+    min_time_in_room_intervals = min_time_in_room_minutes * 60 / assignment_interval
+    return simulation_planner.stream_game(
+        players, num_rooms, simulation_time, assignment_interval, min_time_in_room_intervals, difficulty_ratio,
+        min_time_per_kill, require_same_room, min_seconds_until_discovery, max_seconds_until_discovery,
+        initial_room_assignment=initial_room_assignment
+    )
+
+def next_intervals(stream, count):
+    """
+    Plan the next intervals of a stream.
+    Returns:
+        list: Up to count interval dicts; fewer at the end of the game and none after it.
+    """
+    return list(itertools.islice(stream['intervals'], count))
+
 def get_difficulty_ratio(level):
     difficulty_levels = {
         'easy': 3,
@@ -262,6 +631,12 @@ def get_difficulty_ratio(level):
     }
     return difficulty_levels.get(level, 2)  # Default to medium if not found
 
+def make_players(num_players):
+    # One impostor and the rest crew, in random order
+    roles = ['impostor'] + ['crew'] * (num_players - 1)
+    random.shuffle(roles)
+    return [Player(name=f"Player{idx + 1}", role=role) for idx, role in enumerate(roles)]
+
 def main():
     num_players = 6  # Adjust as needed
     num_rooms = 4    # Adjust as needed
@@ -282,7 +657,7 @@ def main():
 
     # Run the simulation
     result = run_simulation(
-        num_players=num_players,
+        players=make_players(num_players),
         num_rooms=num_rooms,
         simulation_time=simulation_time,
         assignment_interval=assignment_interval,
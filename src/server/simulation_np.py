@@ -0,0 +1,190 @@
+import random
+import math
+import numpy as np
+
+import simulation
+
+# Array-backed version of simulation.simulate_game_with_constraints.
+# Players are integer indices, rooms are int8 and the whole schedule is one
+# (intervals x players) matrix. Per-player work inside an interval is batched.
+# Returns the same result dict as the pure Python engine.
+
+def simulate_game_with_constraints(
+    players, num_rooms, simulation_time, assignment_interval, min_time_in_room_intervals, difficulty_ratio,
+    min_time_per_kill, require_same_room, min_seconds_until_discovery,
+    max_seconds_until_discovery, initial_room_assignment=None, kill_rooms=None, min_kill_opportunities=None
+):
+    # Seed numpy from the random module so random.seed() still controls the run
+    rng = np.random.default_rng(random.getrandbits(64))
+
+    # Convert min_time_per_kill to intervals
+    min_kill_intervals = math.ceil(min_time_per_kill / assignment_interval)
+
+    # Calculate required kill opportunities
+    required_kill_opportunities = int(difficulty_ratio * (len(players) - 2))
+    if required_kill_opportunities < 1:
+        required_kill_opportunities = 1
+
+    kill_opportunities_same_room = 0
+    kill_rooms = {} if kill_rooms is None else kill_rooms.copy()
+    total_intervals = int(simulation_time // assignment_interval)
+
+    # Index the players once
+    names = [player.name for player in players]
+    player_index = {name: idx for idx, name in enumerate(names)}
+    num_players = len(players)
+    alive = np.array([player.status == 'alive' for player in players], dtype=bool)
+    impostor_idx = next((idx for idx, player in enumerate(players) if player.role == 'impostor'), None)
+
+    # Initialize current room assignment
+    if initial_room_assignment is not None:
+        current_rooms = np.array([initial_room_assignment[name] for name in names], dtype=np.int8)
+    else:
+        current_rooms = rng.integers(0, num_rooms, size=num_players).astype(np.int8)
+    last_reassignment_interval = np.zeros(num_players, dtype=np.int64)
+
+    # Schedule kill opportunities
+    kill_intervals = []
+    current_interval = 1
+    while len(kill_intervals) < required_kill_opportunities and current_interval < total_intervals:
+        current_interval += int(rng.integers(1, 6))
+        if current_interval + min_kill_intervals <= total_intervals:
+            kill_intervals.append(current_interval)
+            current_interval += min_kill_intervals
+        else:
+            break
+
+    if len(kill_intervals) < required_kill_opportunities:
+        required_kill_opportunities = len(kill_intervals)
+
+    # Every kill opportunity comes from one of these windows; skip the intervals
+    # if the attempt can't reach the caller's minimum
+    if min_kill_opportunities is not None:
+        if simulation.count_completed_windows(kill_intervals, min_kill_intervals, total_intervals) < min_kill_opportunities:
+            total_intervals = 0
+
+    crew_members_alive = [idx for idx, player in enumerate(players) if player.role == 'crew']
+    rng.shuffle(crew_members_alive)
+
+    # Assign a crew member to be killed at each kill opportunity
+    kill_schedule = {}
+    for idx, interval in enumerate(kill_intervals):
+        if idx < len(crew_members_alive):
+            kill_schedule[interval] = crew_members_alive[idx]
+        else:
+            kill_schedule[interval] = crew_members_alive[int(rng.integers(len(crew_members_alive)))]
+
+    # Output matrix and per-interval kill tracking
+    assignment_matrix = np.empty((total_intervals, num_players), dtype=np.int8)
+    has_kill_opportunity_per_interval_same_room = []
+    kill_opportunity_per_interval_same_room = []
+    kill_opportunity_duration_per_interval_same_room = []
+
+    current_kill_duration = 0
+    current_crew_member = None
+    current_room_number = None
+    all_rooms = np.arange(num_rooms, dtype=np.int8)
+
+    intervals_run = 0
+    for interval in range(total_intervals):
+        # Update time since kill for each room and drop discovered bodies
+        for room_number in list(kill_rooms.keys()):
+            kill_rooms[room_number]['time_since_kill'] += assignment_interval
+            if kill_rooms[room_number]['time_since_kill'] >= max_seconds_until_discovery:
+                del kill_rooms[room_number]
+
+        # Update player statuses if any kills occurred
+        for room_info in kill_rooms.values():
+            killed_idx = player_index.get(room_info['killed_player'])
+            if killed_idx is not None:
+                alive[killed_idx] = False
+
+        # Players alive at the start of the interval
+        alive_at_start = alive.copy()
+        if impostor_idx is None or not alive_at_start[impostor_idx]:
+            break  # Game ends if impostor is dead
+
+        # Handle kill opportunities
+        if interval in kill_schedule:
+            crew_member_to_kill = kill_schedule[interval]
+            room_number = int(rng.integers(num_rooms))
+            current_rooms[impostor_idx] = room_number
+            current_rooms[crew_member_to_kill] = room_number
+            last_reassignment_interval[impostor_idx] = interval
+            last_reassignment_interval[crew_member_to_kill] = interval
+
+            current_kill_duration = assignment_interval
+            current_crew_member = crew_member_to_kill
+            current_room_number = room_number
+
+        elif current_kill_duration > 0 and current_crew_member is not None:
+            current_kill_duration += assignment_interval
+            if current_kill_duration >= min_time_per_kill:
+                kill_opportunities_same_room += 1
+                kill_rooms[current_room_number] = {
+                    'time_since_kill': 0,
+                    'killed_player': names[current_crew_member]
+                }
+                alive[current_crew_member] = False
+
+                current_kill_duration = 0
+                current_crew_member = None
+                current_room_number = None
+
+        # Reassign every other alive player whose minimum stay is over, in one batch
+        movers = alive_at_start & (interval - last_reassignment_interval >= min_time_in_room_intervals)
+        movers[impostor_idx] = False
+        if current_crew_member is not None:
+            movers[current_crew_member] = False
+        num_movers = np.count_nonzero(movers)
+        if num_movers:
+            open_rooms = np.ones(num_rooms, dtype=bool)
+            for room_number, room_info in kill_rooms.items():
+                if room_info['time_since_kill'] < min_seconds_until_discovery:
+                    open_rooms[room_number] = False
+            possible_rooms = all_rooms[open_rooms]
+            if possible_rooms.size:
+                current_rooms[movers] = rng.choice(possible_rooms, size=num_movers)
+                last_reassignment_interval[movers] = interval
+
+        # Ensure no unintended kill opportunities occur
+        duration = current_kill_duration
+        impostor_room = current_rooms[impostor_idx]
+        collisions = current_rooms == impostor_room
+        collisions[impostor_idx] = False
+        has_kill_opportunity = False
+        if current_crew_member is not None and collisions[current_crew_member]:
+            has_kill_opportunity = True
+            collisions[current_crew_member] = False
+        num_collisions = np.count_nonzero(collisions)
+        if num_collisions and num_rooms > 1:
+            # Move everyone else out to a random room other than the impostor's
+            new_rooms = rng.integers(0, num_rooms - 1, size=num_collisions)
+            new_rooms += new_rooms >= impostor_room
+            current_rooms[collisions] = new_rooms
+
+        # Record the room assignment
+        assignment_matrix[interval] = current_rooms
+        intervals_run = interval + 1
+
+        has_kill_opportunity_per_interval_same_room.append(has_kill_opportunity)
+        kill_opportunity_per_interval_same_room.append(has_kill_opportunity)
+        kill_opportunity_duration_per_interval_same_room.append(duration)
+
+    # Write statuses back to the Player objects
+    for idx, player in enumerate(players):
+        player.status = 'alive' if alive[idx] else 'dead'
+
+    assignments_per_interval = [dict(zip(names, row)) for row in assignment_matrix[:intervals_run].tolist()]
+
+    result = {
+        'assignments_per_interval': assignments_per_interval,
+        'total_kill_opportunities_same_room': kill_opportunities_same_room,
+        'players': players,
+        'kill_rooms': kill_rooms,
+        'has_kill_opportunity_per_interval_same_room': has_kill_opportunity_per_interval_same_room,
+        'kill_opportunity_per_interval_same_room': kill_opportunity_per_interval_same_room,
+        'kill_opportunity_duration_per_interval_same_room': kill_opportunity_duration_per_interval_same_room,
+        'required_kill_opportunities': required_kill_opportunities
+    }
+    return result
@@ -0,0 +1,255 @@
+import random
+import math
+from collections import Counter
+
+# Constructive version of simulation.simulate_game_with_constraints.
+# Instead of moving everyone at random and hoping enough kill opportunities
+# happen, it places the kill windows first and then builds the movement
+# around them in a single pass:
+#   - the impostor is only ever in a room with no crew, or with the victim of
+#     the current kill window, so there are no unintended kill opportunities
+#   - at each window the impostor joins a crew member who is alone, or a
+#     crew member who is free to move walks into the impostor's empty room
+#   - everyone else moves only after min_time_in_room_intervals and never
+#     into the impostor's room or an undiscovered kill room
+# Players are not killed off in the plan: a kill opportunity may not be taken,
+# and the server re-plans from the current rooms whenever someone does die.
+# simulate_game_with_constraints returns the same result dict as the pure
+# Python engine. stream_game plans the same game lazily, one interval at a
+# time, so a caller can take the first few intervals without planning the rest.
+
+def place_kill_windows(total_intervals, min_kill_intervals, count):
+    """
+    Pick the start intervals of the kill windows.
+    Windows may run back to back; the spare intervals are spread between them at random.
+    Args:
+        total_intervals (int): Number of intervals in the game.
+        min_kill_intervals (int): Length of each window.
+        count (int): Number of windows wanted.
+    Returns:
+        list: Sorted start intervals. Shorter than count if the game is too short to fit them all.
+    """
+    # The first interval is spent walking to the starting rooms
+    available = total_intervals - 1
+    count = min(count, available // min_kill_intervals)
+    if count <= 0:
+        return []
+    spare = available - count * min_kill_intervals
+    positions = sorted(random.sample(range(spare + count), count))
+    return [1 + position - idx + idx * min_kill_intervals for idx, position in enumerate(positions)]
+
+def stream_game(
+    players, num_rooms, simulation_time, assignment_interval, min_time_in_room_intervals, difficulty_ratio,
+    min_time_per_kill, require_same_room, min_seconds_until_discovery,
+    max_seconds_until_discovery, initial_room_assignment=None, kill_rooms=None
+):
+    """
+    Plan a game lazily. The kill windows and starting rooms are placed up front;
+    the intervals are only planned as they are read.
+    Returns:
+        dict: required_kill_opportunities, total_intervals, kill_rooms (kept up to date
+            while reading) and intervals, a generator of one dict per interval with the
+            assignment ({player_name: room_number}), has_kill_opportunity,
+            kill_opportunity and duration.
+    """
+    # Convert min_time_per_kill to intervals
+    min_kill_intervals = max(1, math.ceil(min_time_per_kill / assignment_interval))
+
+    # Calculate required kill opportunities
+    required_kill_opportunities = int(difficulty_ratio * (len(players) - 2))
+    if required_kill_opportunities < 1:
+        required_kill_opportunities = 1
+
+    kill_rooms = {} if kill_rooms is None else {room: dict(info) for room, info in kill_rooms.items()}
+    total_intervals = int(simulation_time // assignment_interval)
+
+    impostor = next((p.name for p in players if p.role == 'impostor'), None)
+    crew = [p.name for p in players if p.role != 'impostor']
+
+    # Place the kill windows first; everything else is built around them
+    if impostor is not None and crew and num_rooms > 1:
+        kill_starts = set(place_kill_windows(total_intervals, min_kill_intervals, required_kill_opportunities))
+    else:
+        kill_starts = set()
+    if len(kill_starts) < required_kill_opportunities:
+        required_kill_opportunities = len(kill_starts)
+
+    # Starting rooms: resume from the given assignment, otherwise lay them out so the first
+    # windows have someone alone to pair with and a spare empty room for the impostor
+    current_room_assignment = {}
+    if initial_room_assignment is not None:
+        current_room_assignment.update(initial_room_assignment)
+    if impostor is not None and impostor not in current_room_assignment:
+        current_room_assignment[impostor] = random.randrange(num_rooms)
+    other_rooms = [room for room in range(num_rooms) if room != current_room_assignment.get(impostor)] or [0]
+    random.shuffle(other_rooms)
+    crew_rooms = other_rooms[1:] if len(other_rooms) > 2 else other_rooms
+    unplaced = [name for name in crew if name not in current_room_assignment]
+    random.shuffle(unplaced)
+    for idx, name in enumerate(unplaced):
+        if idx == 0 or len(crew_rooms) == 1:
+            current_room_assignment[name] = crew_rooms[0]
+        else:
+            current_room_assignment[name] = random.choice(crew_rooms[1:])
+    crew_per_room = Counter(current_room_assignment[name] for name in crew)
+
+    def move(name, room):
+        if name != impostor:
+            crew_per_room[current_room_assignment[name]] -= 1
+            crew_per_room[room] += 1
+        current_room_assignment[name] = room
+
+    def empty_rooms(forbidden):
+        # Crew-free rooms other than the impostor's, undiscovered kill rooms last
+        rooms = [
+            room for room in range(num_rooms)
+            if crew_per_room[room] == 0 and room != current_room_assignment.get(impostor)
+        ]
+        random.shuffle(rooms)
+        return sorted(rooms, key=lambda room: room in forbidden)
+
+    last_reassignment_interval = {name: 0 for name in crew}
+    windows_per_crew_member = {name: 0 for name in crew}
+
+    def intervals():
+        victim = None
+        window_start = None
+        for interval in range(total_intervals):
+            # Update time since kill for each room
+            for room_number in list(kill_rooms.keys()):
+                kill_rooms[room_number]['time_since_kill'] += assignment_interval
+                # Remove rooms where discovery time has passed
+                if kill_rooms[room_number]['time_since_kill'] >= max_seconds_until_discovery:
+                    del kill_rooms[room_number]
+            forbidden_rooms = {
+                room_number for room_number, room_info in kill_rooms.items()
+                if room_info['time_since_kill'] < min_seconds_until_discovery
+            }
+
+            if interval in kill_starts:
+                # Pick the victim: someone already alone, or someone free to walk into an empty
+                # room, favouring crew members who have had the fewest kill windows so far
+                impostor_room = current_room_assignment[impostor]
+                free_rooms = empty_rooms(forbidden_rooms)
+                if crew_per_room[impostor_room] == 0:
+                    free_rooms.insert(0, impostor_room)
+                options = []
+                for name in crew:
+                    room = current_room_assignment[name]
+                    if crew_per_room[room] == 1:
+                        # The impostor joins them, leaving the impostor's own room free for afterwards
+                        stranded = len(free_rooms) == 0
+                        options.append((False, stranded, windows_per_crew_member[name], random.random(), name, room))
+                    elif free_rooms:
+                        # Walking in early breaks the minimum time in a room, so it is the last resort.
+                        # Taking the only free room leaves the impostor nowhere to go after the window.
+                        forced = interval - last_reassignment_interval[name] < min_time_in_room_intervals
+                        stranded = len(free_rooms) == 1
+                        options.append((forced, stranded, windows_per_crew_member[name], random.random(), name, free_rooms[0]))
+                if options:
+                    _, _, _, _, victim, kill_room = min(options)
+                    if current_room_assignment[victim] != kill_room:
+                        move(victim, kill_room)
+                        last_reassignment_interval[victim] = interval
+                    move(impostor, kill_room)
+                    windows_per_crew_member[victim] += 1
+                    window_start = interval
+            elif victim is None and impostor is not None and crew_per_room[current_room_assignment[impostor]] > 0:
+                # A window just ended: the impostor slips away to an empty room, or failing
+                # that the crew still with the impostor have to leave
+                free_rooms = empty_rooms(forbidden_rooms)
+                if free_rooms:
+                    move(impostor, free_rooms[0])
+                else:
+                    impostor_room = current_room_assignment[impostor]
+                    other_rooms = [room for room in range(num_rooms) if room != impostor_room]
+                    other_rooms = [room for room in other_rooms if room not in forbidden_rooms] or other_rooms
+                    for name in crew:
+                        if current_room_assignment[name] == impostor_room and other_rooms:
+                            move(name, random.choice(other_rooms))
+                            last_reassignment_interval[name] = interval
+
+            # Now move everyone who has stayed long enough
+            impostor_room = current_room_assignment.get(impostor)
+            for name in crew:
+                if name == victim:
+                    continue
+                time_in_room = interval - last_reassignment_interval[name]
+                if time_in_room < min_time_in_room_intervals:
+                    continue
+                possible_rooms = [
+                    room for room in range(num_rooms) if room != impostor_room and room not in forbidden_rooms
+                ]
+                # Leave one empty room for the impostor to move into after the next window
+                spare_rooms = empty_rooms(forbidden_rooms)
+                if len(spare_rooms) == 1 and crew_per_room[current_room_assignment[name]] > 1:
+                    if len(possible_rooms) > 1 and spare_rooms[0] in possible_rooms:
+                        possible_rooms.remove(spare_rooms[0])
+                # Keep people moving when there is somewhere else to go
+                new_rooms = [room for room in possible_rooms if room != current_room_assignment[name]]
+                if new_rooms:
+                    move(name, random.choice(new_rooms))
+                    last_reassignment_interval[name] = interval
+
+            # Track the kill window
+            has_kill_opportunity = victim is not None
+            kill_opportunity_in_interval = False
+            duration = 0
+            if victim is not None:
+                duration = (interval - window_start + 1) * assignment_interval
+                if duration >= min_time_per_kill:
+                    kill_opportunity_in_interval = True
+                    # Record the kill room so nobody walks in before the body could be found
+                    kill_rooms[current_room_assignment[victim]] = {'time_since_kill': 0, 'killed_player': victim}
+                    victim = None
+
+            yield {
+                'assignment': current_room_assignment.copy(),
+                'has_kill_opportunity': has_kill_opportunity,
+                'kill_opportunity': kill_opportunity_in_interval,
+                'duration': duration
+            }
+
+    return {
+        'required_kill_opportunities': required_kill_opportunities,
+        'total_intervals': total_intervals,
+        'kill_rooms': kill_rooms,
+        'intervals': intervals()
+    }
+
+def simulate_game_with_constraints(
+    players, num_rooms, simulation_time, assignment_interval, min_time_in_room_intervals, difficulty_ratio,
+    min_time_per_kill, require_same_room, min_seconds_until_discovery,
+    max_seconds_until_discovery, initial_room_assignment=None, kill_rooms=None
+):
+    stream = stream_game(
+        players, num_rooms, simulation_time, assignment_interval, min_time_in_room_intervals, difficulty_ratio,
+        min_time_per_kill, require_same_room, min_seconds_until_discovery, max_seconds_until_discovery,
+        initial_room_assignment=initial_room_assignment, kill_rooms=kill_rooms
+    )
+    kill_opportunities_same_room = 0
+    kill_opportunity_per_interval_same_room = []
+    has_kill_opportunity_per_interval_same_room = []
+    kill_opportunity_duration_per_interval_same_room = []
+    assignments_per_interval = []
+    for row in stream['intervals']:
+        if row['kill_opportunity']:
+            kill_opportunities_same_room += 1
+        # Record the room assignment
+        assignments_per_interval.append(row['assignment'])
+        has_kill_opportunity_per_interval_same_room.append(row['has_kill_opportunity'])
+        kill_opportunity_per_interval_same_room.append(row['kill_opportunity'])
+        kill_opportunity_duration_per_interval_same_room.append(row['duration'])
+
+    # Prepare result
+    result = {
+        'assignments_per_interval': assignments_per_interval,
+        'total_kill_opportunities_same_room': kill_opportunities_same_room,
+        'players': players,
+        'kill_rooms': stream['kill_rooms'],
+        'has_kill_opportunity_per_interval_same_room': has_kill_opportunity_per_interval_same_room,
+        'kill_opportunity_per_interval_same_room': kill_opportunity_per_interval_same_room,
+        'kill_opportunity_duration_per_interval_same_room': kill_opportunity_duration_per_interval_same_room,
+        'required_kill_opportunities': stream['required_kill_opportunities']
+    }
+    return result
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+import time
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis
+import redis.asyncio
+
+# The server modules are imported by name, as app.py does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'server'))
+
+# Run simulation jobs in-process and point both Redis clients of app.py at one
+# in-memory server (fakeredis runs the Lua scripts through lupa)
+os.environ.setdefault('SCHEDULE_JOB_BACKEND', 'local')
+FAKE_SERVER = fakeredis.FakeServer()
+
+def _sync_pool(cls, url, **kwargs):
+    return redis.BlockingConnectionPool(
+        connection_class=fakeredis.FakeRedisConnection, server=FAKE_SERVER, max_connections=kwargs['max_connections']
+    )
+
+def _async_pool(cls, url, **kwargs):
+    return redis.asyncio.BlockingConnectionPool(
+        connection_class=fakeredis.aioredis.FakeAsyncRedisConnection, server=FAKE_SERVER,
+        max_connections=kwargs['max_connections']
+    )
+
+redis.BlockingConnectionPool.from_url = classmethod(_sync_pool)
+redis.asyncio.BlockingConnectionPool.from_url = classmethod(_async_pool)
+
+@pytest.fixture(scope='session')
+def loop():
+    # The asyncio Redis client keeps its connections, so every test shares one event loop
+    event_loop = asyncio.new_event_loop()
+    yield event_loop
+    event_loop.close()
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    return app
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+@pytest.fixture
+def run(loop):
+    """Run a coroutine on the shared event loop."""
+    return loop.run_until_complete
+
+async def create_lobby(client, players, duration=10, rooms=('a', 'b', 'c', 'd', 'e')):
+    """Create a lobby as player p0 and return its code."""
+    response = await client.post('/create', json={
+        'rooms': list(rooms), 'players': players, 'player_name': 'p0', 'duration': duration
+    })
+    assert response.status_code == 200, await response.get_json()
+    return (await response.get_json())['lobby_code']
+
+async def start_game(client, players, duration=10, rooms=('a', 'b', 'c', 'd', 'e')):
+    """Create a lobby, fill it with players p0..p{n-1} and ready everyone up."""
+    lobby_code = await create_lobby(client, players, duration, rooms)
+    for idx in range(1, players):
+        response = await client.post('/join', json={'code': lobby_code, 'player_name': f"p{idx}"})
+        assert response.status_code == 200
+    for idx in range(players):
+        await client.post(f"/ready/{lobby_code}", json={'player_name': f"p{idx}"})
+    return lobby_code
+
+async def wait_for(condition, timeout=10):
+    """Poll an async condition until it holds."""
+    deadline = time.monotonic() + timeout
+    while not await condition():
+        assert time.monotonic() < deadline, 'timed out'
+        await asyncio.sleep(0.05)
@@ -0,0 +1,129 @@
+import asyncio
+import collections
+
+import lobby_store
+from conftest import create_lobby, start_game, wait_for
+
+def test_concurrent_joins_fill_the_lobby_exactly(app_module, client, run):
+    ar = app_module.ar
+
+    async def scenario():
+        lobby_code = await create_lobby(client, 40, duration=60, rooms='abcdefghij')
+        # 300 joins for 39 free seats; 20 names try to join twice
+        names = [f"j{idx}" for idx in range(280)] + [f"j{idx}" for idx in range(20)]
+        responses = await asyncio.gather(*[
+            client.post('/join', json={'code': lobby_code, 'player_name': name}) for name in names
+        ])
+        joined = [name for name, response in zip(names, responses) if response.status_code == 200]
+        refused = [(await response.get_json())['error'] for response in responses if response.status_code != 200]
+        lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['player_names', 'ready_statuses', 'max_players'])
+        return joined, refused, lobby_data
+
+    joined, refused, lobby_data = run(scenario())
+    assert len(joined) == 39
+    assert refused == ['Lobby is full'] * 261
+    assert collections.Counter(lobby_data['player_names']) == collections.Counter(['p0'] + joined)
+    assert len(lobby_data['player_names']) == lobby_data['max_players']
+    assert lobby_data['ready_statuses'] == [False] * 40
+
+def test_concurrent_votes_are_counted_once(app_module, client, run):
+    ar = app_module.ar
+
+    async def scenario():
+        lobby_code = await start_game(client, 10, duration=20)
+
+        async def schedule_ready():
+            return not (await lobby_store.load_lobby(ar, lobby_code, ['schedule_pending'])).get('schedule_pending')
+        await wait_for(schedule_ready)
+        players = sorted((await lobby_store.load_lobby(ar, lobby_code, ['roles']))['roles'])
+        holdout = players[-1]
+
+        response = await client.post(f"/call_meeting/{lobby_code}", json={'player_name': players[0]})
+        assert response.status_code == 200
+
+        # Every player but the holdout fires 30 votes at once, for different candidates
+        ballots = [
+            (voter, players[(idx + attempt) % len(players)])
+            for idx, voter in enumerate(players[:-1]) for attempt in range(30)
+        ]
+        responses = await asyncio.gather(*[
+            client.post(f"/submit_vote/{lobby_code}", json={'player_name': voter, 'voted_player': candidate})
+            for voter, candidate in ballots
+        ])
+        accepted = collections.Counter(
+            voter for (voter, _), response in zip(ballots, responses) if response.status_code == 200
+        )
+        refused = collections.Counter([
+            (await response.get_json())['error'] for response in responses if response.status_code != 200
+        ])
+        open_meeting = await lobby_store.load_lobby(ar, lobby_code, [
+            'meeting_active', 'votes', 'has_voted', 'pending_voters'
+        ] + app_module.VOTE_TALLY_FIELDS)
+
+        # The holdout's burst closes the meeting, exactly once
+        responses = await asyncio.gather(*[
+            client.post(f"/skip_vote/{lobby_code}", json={'player_name': holdout}) for _ in range(50)
+        ])
+        closing = collections.Counter(response.status_code for response in responses)
+        closed_meeting = await lobby_store.load_lobby(ar, lobby_code, [
+            'meeting_active', 'meeting_start_time', 'activity_log', 'player_statuses'
+        ])
+        return players, accepted, refused, open_meeting, closing, closed_meeting
+
+    players, accepted, refused, open_meeting, closing, closed_meeting = run(scenario())
+    voters = players[:-1]
+    assert accepted == {voter: 1 for voter in voters}
+    assert refused == {'Player has already voted': 30 * len(voters) - len(voters)}
+
+    assert open_meeting['meeting_active']
+    assert set(open_meeting['votes']) == set(voters)
+    assert open_meeting['has_voted'] == {player: player in voters for player in players}
+    assert open_meeting['pending_voters'] == [players[-1]]
+    counts = collections.Counter(open_meeting['votes'].values())
+    assert {player: votes for player, votes in open_meeting['vote_counts'].items() if votes} == counts
+    assert open_meeting['meeting_voters'] == len(players)
+    top = max(counts.values())
+    assert open_meeting['vote_leader_votes'] == top
+    assert open_meeting['vote_leader_tied'] == (list(counts.values()).count(top) > 1)
+    if not open_meeting['vote_leader_tied']:
+        assert counts[open_meeting['vote_leader']] == top
+
+    assert closing == {200: 1, 400: 49}
+    assert not closed_meeting['meeting_active']
+    assert closed_meeting.get('meeting_start_time') is None
+    results = [
+        entry['message'] for entry in closed_meeting['activity_log']
+        if entry['message'].endswith('eliminated.') or entry['message'] == 'No votes were cast.'
+    ]
+    assert len(results) == 1
+
+def test_concurrent_kills_and_body_reports_are_all_kept(app_module, client, run):
+    ar = app_module.ar
+
+    async def scenario():
+        lobby_code = await start_game(client, 8, duration=20)
+        roles = (await lobby_store.load_lobby(ar, lobby_code, ['roles']))['roles']
+        crew = sorted(player for player, role in roles.items() if role != 'impostor')
+        body, victims = crew[0], crew[1:]
+        # A body is reported while every other crew member is marked dead at once;
+        # the impostor can only kill once per 30 seconds, so one kill goes through
+        responses = await asyncio.gather(
+            client.post(f"/call_meeting/{lobby_code}", json={
+                'player_name': victims[0], 'body_found': True, 'dead_player': body, 'room_found': 'a'
+            }),
+            *[client.post(f"/mark_dead/{lobby_code}", json={'player_name': victim}) for victim in victims]
+        )
+        killed = [victim for victim, response in zip(victims, responses[1:]) if response.status_code == 200]
+        refused = collections.Counter([
+            (await response.get_json())['error'] for response in responses[1:] if response.status_code != 200
+        ])
+        statuses = (await lobby_store.load_lobby(ar, lobby_code, ['player_statuses']))['player_statuses']
+        return responses[0].status_code, body, killed, refused, statuses
+
+    meeting_status, body, killed, refused, statuses = run(scenario())
+    assert meeting_status == 200
+    assert len(killed) == 1
+    assert sum(refused.values()) == 5 and set(refused) == {
+        'Impostor has recently killed someone and cannot kill you. Quickly call a meeting to expose the impostor!'
+    }
+    assert {player for player, status in statuses.items() if status == 'dead'} == {body, killed[0]}
@@ -0,0 +1,130 @@
+import json
+
+import lobby_deadlines
+import lobby_events
+import lobby_store
+from conftest import start_game, wait_for
+
+def test_timed_out_meeting_eliminates_and_replans(app_module, client, run):
+    ar = app_module.ar
+
+    async def scenario():
+        lobby_code = await start_game(client, 6)
+
+        async def schedule_ready():
+            lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['schedule_pending'])
+            return not lobby_data.get('schedule_pending')
+        await wait_for(schedule_ready)
+
+        roles = (await lobby_store.load_lobby(ar, lobby_code, ['roles']))['roles']
+        crew = sorted(player for player, role in roles.items() if role != 'impostor')
+        target = crew[1]
+        version = (await lobby_store.load_lobby(ar, lobby_code, ['schedule_version']))['schedule_version']
+
+        pubsub = app_module.r.pubsub()
+        pubsub.subscribe(lobby_events.channel(lobby_code))
+
+        response = await client.post(f"/call_meeting/{lobby_code}", json={'player_name': crew[0]})
+        assert response.status_code == 200
+        # 4 of 6 vote for the target: a majority, but two voters are missing so the meeting stays open
+        for voter in [player for player in sorted(roles) if player != target][:4]:
+            response = await client.post(
+                f"/submit_vote/{lobby_code}", json={'player_name': voter, 'voted_player': target}
+            )
+            assert response.status_code == 200
+        assert (await lobby_store.load_lobby(ar, lobby_code, ['meeting_active']))['meeting_active']
+
+        # The meeting's time is up; only the scheduler closes it
+        await lobby_deadlines.schedule(ar, lobby_code, 'meeting', 0)
+        scheduler = lobby_deadlines.DeadlineScheduler(
+            ar, {'meeting': app_module.expire_meeting, 'game': app_module.expire_game}, interval=0.05
+        )
+        scheduler.start()
+        try:
+            async def meeting_processed():
+                lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['meeting_active', 'meeting_start_time'])
+                return not lobby_data['meeting_active'] and lobby_data.get('meeting_start_time') is None
+            await wait_for(meeting_processed)
+        finally:
+            scheduler.task.cancel()
+
+        lobby_data = await lobby_store.load_lobby(
+            ar, lobby_code, ['player_statuses', 'schedule_version', 'game_over', 'activity_log']
+        )
+        assert lobby_data['player_statuses'][target] == 'dead'
+        assert not lobby_data['game_over']
+        assert f"Player {target} has been eliminated." in [entry['message'] for entry in lobby_data['activity_log']]
+        assert lobby_data['schedule_version'] == version + 1
+
+        # The replan was queued and lands
+        await wait_for(schedule_ready)
+        lobby_data = await lobby_store.load_lobby(
+            ar, lobby_code, ['schedule_version', 'assignments_per_interval', 'assignment_start_time']
+        )
+        assert lobby_data['schedule_version'] == version + 1
+        assert lobby_data['assignments_per_interval']
+
+        messages = []
+        while True:
+            message = pubsub.get_message(timeout=0.1)
+            if message is None:
+                break
+            if message['type'] == 'message':
+                messages.append(json.loads(message['data']))
+        pubsub.close()
+        return target, version, messages
+
+    target, version, messages = run(scenario())
+    lobby_updates = [message['data'] for message in messages if message['event'] == 'lobby']
+    assert any(
+        update.get('meeting_active') is False and update.get('player_statuses', {}).get(target) == 'dead'
+        for update in lobby_updates
+    )
+    timeline_versions = [message['data']['version'] for message in messages if message['event'] == 'timeline']
+    pending_version = app_module.get_timeline_version({'schedule_version': version + 1, 'schedule_pending': True})
+    assert pending_version in timeline_versions
+
+def test_game_deadline_during_a_meeting_waits_for_it(app_module, client, run):
+    ar = app_module.ar
+
+    async def scenario():
+        lobby_code = await start_game(client, 6)
+        roles = (await lobby_store.load_lobby(ar, lobby_code, ['roles']))['roles']
+        crew = sorted(player for player, role in roles.items() if role != 'impostor')
+        response = await client.post(f"/call_meeting/{lobby_code}", json={'player_name': crew[0]})
+        assert response.status_code == 200
+
+        member = lobby_deadlines.member(lobby_code, 'game')
+        scheduler = lobby_deadlines.DeadlineScheduler(
+            ar, {'meeting': app_module.expire_meeting, 'game': app_module.expire_game}, interval=0.05
+        )
+        # The game clock runs out mid-meeting: the deadline moves past the meeting instead of being dropped
+        await lobby_deadlines.schedule(ar, lobby_code, 'game', 0)
+        scheduler.start()
+        try:
+            async def game_deadline_moved():
+                return (await ar.zscore(lobby_deadlines.DEADLINES_KEY, member) or 0) > 0
+            await wait_for(game_deadline_moved)
+            lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['game_over', 'meeting_active'])
+            assert not lobby_data.get('game_over') and lobby_data['meeting_active']
+            lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['game_start_time', 'duration'])
+            pushed = await ar.zscore(lobby_deadlines.DEADLINES_KEY, member)
+            assert pushed == app_module.get_game_end_time(lobby_data) + app_module.MEETING_DURATION_SECONDS * 1000
+
+            # Closing the meeting early brings the game deadline back to the real end of the game
+            await lobby_deadlines.schedule(ar, lobby_code, 'meeting', 0)
+            async def meeting_processed():
+                lobby_data = await lobby_store.load_lobby(ar, lobby_code, ['meeting_start_time'])
+                return lobby_data.get('meeting_start_time') is None
+            await wait_for(meeting_processed)
+        finally:
+            scheduler.task.cancel()
+
+        lobby_data = await lobby_store.load_lobby(
+            ar, lobby_code, ['game_start_time', 'duration', 'time_in_meetings_ms', 'game_over']
+        )
+        assert not lobby_data.get('game_over')
+        assert await ar.zscore(lobby_deadlines.DEADLINES_KEY, member) == app_module.get_game_end_time(lobby_data)
+        assert app_module.get_game_end_time(lobby_data) < pushed
+
+    run(scenario())
@@ -0,0 +1,49 @@
+import asyncio
+
+import redis
+
+import lobby_events
+
+class DroppingClient:
+    """Hands the hub a pub/sub connection that drops after its first event, then working ones."""
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.dropped = False
+
+    def pubsub(self, **kwargs):
+        pubsub = self.redis_client.pubsub(**kwargs)
+        if self.dropped:
+            return pubsub
+        self.dropped = True
+        listen = pubsub.listen
+
+        async def listen_then_drop():
+            async for message in listen():
+                yield message
+                if message['type'] == 'pmessage':
+                    raise redis.ConnectionError('connection lost')
+        pubsub.listen = listen_then_drop
+        return pubsub
+
+def test_hub_delivers_from_subscription_and_resyncs_after_reconnect(app_module, run):
+    ar = app_module.ar
+
+    async def scenario():
+        hub = lobby_events.LobbyEventHub(DroppingClient(ar))
+        events = hub.listen('abc123')
+        # Once subscribed, an event published straight away reaches the stream
+        await asyncio.wait_for(hub.wait_subscribed(), 5)
+        await lobby_events.publish(ar, 'abc123', 'log', [{'id': 1}])
+        received = [await asyncio.wait_for(events.get(), 5)]
+        # The connection then drops; the hub subscribes again and tells the stream to reload
+        received.append(await asyncio.wait_for(events.get(), 5))
+        await lobby_events.publish(ar, 'abc123', 'log', [{'id': 2}])
+        received.append(await asyncio.wait_for(events.get(), 5))
+        hub.task.cancel()
+        return received
+
+    assert run(scenario()) == [
+        {'event': 'log', 'data': [{'id': 1}]},
+        {'event': 'resync', 'data': None},
+        {'event': 'log', 'data': [{'id': 2}]}
+    ]
@@ -0,0 +1,53 @@
+import fakeredis
+
+import lobby_store
+import lobby_sweeper
+
+def test_save_only_extends_the_keys_it_writes():
+    r = fakeredis.FakeRedis()
+    lobby_data = {
+        'player_names': ['p0', 'p1'], 'ready_statuses': [False, False], 'duration': 10, 'game_started': False
+    }
+    lobby_store.save_lobby(r, 'abc123', lobby_data)
+    names_key = lobby_store.part_key('abc123', 'player_names')
+    ready_key = lobby_store.part_key('abc123', 'ready_statuses')
+    r.expire(names_key, 100)
+    r.expire(ready_key, 100)
+
+    lobby_data['duration'] = 15
+    lobby_data['ready_statuses'] = [True, False]
+    lobby_store.save_lobby(r, 'abc123', lobby_data, ['duration', 'ready_statuses'])
+    assert r.ttl(lobby_store.lobby_key('abc123')) > 100
+    assert r.ttl(ready_key) > 100
+    assert r.ttl(names_key) <= 100
+
+    # The sweeper catches the part up with its lobby
+    lobby_sweeper.sweep(r)
+    assert r.ttl(names_key) == r.ttl(lobby_store.lobby_key('abc123'))
+
+    # Ending the game shortens every key
+    lobby_data['game_over'] = True
+    lobby_store.save_lobby(r, 'abc123', lobby_data, ['game_over'])
+    for key in [lobby_store.lobby_key('abc123'), names_key, ready_key]:
+        assert 0 < r.ttl(key) <= lobby_store.FINISHED_LOBBY_TTL_SECONDS
+
+def test_conditional_save_loses_to_a_newer_version(monkeypatch):
+    server = fakeredis.FakeServer()
+    r = fakeredis.FakeRedis(server=server)
+    lobby_store.save_lobby(r, 'abc123', {'schedule_version': 1, 'schedule_pending': True})
+    lobby_data = {'schedule_version': 1, 'schedule_pending': False}
+    assert lobby_store.save_lobby_if(r, 'abc123', lobby_data, ['schedule_pending'], 'schedule_version', 1)
+    assert lobby_store.load_lobby(r, 'abc123', ['schedule_pending'])['schedule_pending'] is False
+
+    # Another client requests a newer schedule after the check, before the write goes through
+    queue_save = lobby_store._queue_save
+    def request_then_queue(pipe, *args, **kwargs):
+        fakeredis.FakeRedis(server=server).hset(
+            lobby_store.lobby_key('abc123'), mapping={'schedule_version': '2', 'schedule_pending': 'true'}
+        )
+        return queue_save(pipe, *args, **kwargs)
+    monkeypatch.setattr(lobby_store, '_queue_save', request_then_queue)
+    assert not lobby_store.save_lobby_if(r, 'abc123', lobby_data, ['schedule_pending'], 'schedule_version', 1)
+    assert lobby_store.load_lobby(r, 'abc123', ['schedule_version', 'schedule_pending']) == {
+        'schedule_version': 2, 'schedule_pending': True
+    }
@@ -0,0 +1,48 @@
+import time
+
+import lobby_store
+import schedule_codec
+from conftest import start_game, wait_for
+
+def test_rooms_stay_on_current_interval_while_replanning(app_module, client, run, monkeypatch):
+    ar = app_module.ar
+
+    async def scenario():
+        lobby_code = await start_game(client, 6, duration=10)
+
+        async def fully_planned():
+            lobby_data = await lobby_store.load_lobby(ar, lobby_code, app_module.ROOM_FIELDS)
+            packed = lobby_data.get('assignments_per_interval')
+            return (not lobby_data.get('schedule_pending') and packed is not None
+                    and schedule_codec.num_intervals(packed) * lobby_data['assignment_interval'] >= 10 * 60)
+        await wait_for(fully_planned)
+
+        # Five minutes into the schedule
+        lobby_data = await lobby_store.load_lobby(ar, lobby_code, app_module.ROOM_FIELDS + ['roles'])
+        lobby_data['assignment_start_time'] = int(round(time.time() * 1000)) - 300 * 1000
+        await lobby_store.save_lobby(ar, lobby_code, lobby_data, ['assignment_start_time'])
+        interval = app_module.get_current_interval(lobby_data)
+        assert interval > 0
+        current_rooms = schedule_codec.assignment_at(lobby_data['assignments_per_interval'], interval)
+
+        # Keep the replan pending so the frozen rooms are what gets served
+        async def hold_job(lobby_code, version):
+            pass
+        monkeypatch.setattr(app_module.schedule_queue, 'enqueue', hold_job)
+
+        victim = next(player for player, role in sorted(lobby_data['roles'].items()) if role != 'impostor')
+        response = await client.post(f"/mark_dead/{lobby_code}", json={'player_name': victim})
+        assert response.status_code == 200
+        assert (await lobby_store.load_lobby(ar, lobby_code, ['schedule_pending']))['schedule_pending']
+
+        served = {}
+        for player in lobby_data['roles']:
+            room = (await (await client.post(f"/get_room/{lobby_code}", json={'player_name': player})).get_json())
+            timeline = await (await client.get(f"/timeline/{lobby_code}/{player}")).get_json()
+            served[player] = (room['room'], timeline['runs'])
+        return current_rooms, served
+
+    current_rooms, served = run(scenario())
+    for player, (room, runs) in served.items():
+        assert room == current_rooms[player]
+        assert runs == [[current_rooms[player], 1]]
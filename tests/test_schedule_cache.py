@@ -0,0 +1,31 @@
+import io
+import json
+
+import fakeredis
+
+import schedule_cache
+import schedule_pool
+
+def test_shape_key_depends_on_engine_and_format(monkeypatch):
+    planner = schedule_cache.server_shape_key(6, 4, 600, 'planner')
+    assert planner == schedule_cache.server_shape_key(6, 4, 600, 'planner')
+    assert planner != schedule_cache.server_shape_key(6, 4, 600, 'python')
+    monkeypatch.setattr(schedule_cache, 'SCHEDULE_FORMAT_VERSION', schedule_cache.SCHEDULE_FORMAT_VERSION + 1)
+    assert planner != schedule_cache.server_shape_key(6, 4, 600, 'planner')
+
+def test_pool_file_loads_under_its_engine(tmp_path):
+    shape = {'players': 6, 'rooms': 4, 'duration': 10}
+    output = io.StringIO()
+    stats = schedule_pool.generate_pool([shape], 2, engine='planner', output=output)
+    assert stats[0]['stored'] == 2
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    # A record from before the format version was recorded
+    stale = dict(records[0])
+    del stale['format_version']
+    path = tmp_path / 'pool.jsonl'
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records + [stale]))
+
+    redis_client = fakeredis.FakeRedis()
+    assert schedule_pool.load_pool(redis_client, str(path), schedule_cache.MAX_VARIANTS) == 2
+    assert redis_client.scard(schedule_cache.server_shape_key(6, 4, 600, 'planner')) == 2
+    assert redis_client.scard(schedule_cache.server_shape_key(6, 4, 600, 'python')) == 0
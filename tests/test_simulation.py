@@ -0,0 +1,87 @@
+import itertools
+import threading
+
+import pytest
+
+import simulation
+
+SETTINGS = simulation.SERVER_SETTINGS
+GRID = [
+    (engine, players, rooms, minutes)
+    for engine, players, rooms, minutes in itertools.product(
+        ['python', 'numpy', 'planner'], [4, 6, 9, 12], [3, 5, 8], [10, 25]
+    )
+]
+
+def plan(engine, num_players, num_rooms, minutes, seed):
+    simulation.random.seed(seed)
+    players = simulation.make_players(num_players)
+    simulation_args = (
+        players, num_rooms, minutes * 60, SETTINGS['assignment_interval'],
+        SETTINGS['min_time_in_room_minutes'] * 60 / SETTINGS['assignment_interval'],
+        simulation.get_difficulty_ratio(SETTINGS['difficulty_level']), SETTINGS['min_time_per_kill'],
+        SETTINGS['require_same_room'], SETTINGS['min_seconds_until_discovery'], SETTINGS['max_seconds_until_discovery']
+    )
+    impostor = next(player.name for player in players if player.role == 'impostor')
+    return impostor, simulation.run_attempt(engine, seed, players, simulation_args, None)
+
+@pytest.mark.parametrize('engine,num_players,num_rooms,minutes', GRID)
+def test_impostor_only_meets_planned_victims(engine, num_players, num_rooms, minutes):
+    interval_seconds = SETTINGS['assignment_interval']
+    min_time_per_kill = SETTINGS['min_time_per_kill']
+    for seed in range(5):
+        impostor, result = plan(engine, num_players, num_rooms, minutes, seed)
+        rows = list(result['assignments_per_interval'])
+        windows = result['has_kill_opportunity_per_interval_same_room']
+        durations = result['kill_opportunity_duration_per_interval_same_room']
+        assert len(windows) == len(durations) == len(rows)
+
+        # Nobody shares the impostor's room, except the victim while a kill window is open
+        company = [
+            {name for name, room in row.items() if room == row[impostor] and name != impostor} for row in rows
+        ]
+        for interval, (others, in_window) in enumerate(zip(company, windows)):
+            assert len(others) == (1 if in_window else 0), (seed, interval, others)
+
+        # Each window keeps the same victim with the impostor, one interval longer each
+        # time, until the kill time is reached or the game ends
+        completed = 0
+        interval = 0
+        while interval < len(rows):
+            if not windows[interval]:
+                interval += 1
+                continue
+            assert durations[interval] == interval_seconds, (seed, interval)
+            start, victim = interval, company[interval]
+            interval += 1
+            while interval < len(rows) and windows[interval]:
+                if durations[interval] != durations[interval - 1] + interval_seconds:
+                    break  # The next window starts straight away
+                assert company[interval] == victim, (seed, interval)
+                interval += 1
+            # The pure Python and numpy engines count the kill in the interval after the window,
+            # once the victim has been moved out; the planner counts it in the window's last interval
+            kill_time = (interval - start) * interval_seconds
+            if interval < len(rows):
+                assert min_time_per_kill in (kill_time, kill_time + interval_seconds), (seed, start)
+                completed += 1
+            elif kill_time >= min_time_per_kill:
+                completed += 1
+        assert completed == result['total_kill_opportunities_same_room']
+
+def test_process_pool_is_shared_across_threads():
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(simulation.get_process_pool(2))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, pools))) == 1
+
+    # The workers give the same schedule as a search in this process
+    simulation.random.seed(1)
+    settings = (simulation.make_players(6), 4, 600, 10, 2, 2, 30, True, 240, 1000)
+    sequential = simulation.run_simulation(*settings, engine='python', workers=1, seed=7)
+    parallel = simulation.run_simulation(*settings, engine='python', workers=2, seed=7)
+    assert parallel['attempts'] == sequential['attempts']
+    assert list(parallel['assignments_per_interval']) == list(sequential['assignments_per_interval'])